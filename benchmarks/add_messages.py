@@ -0,0 +1,230 @@
+"""Benchmark of `AssistantRepository.add_messages`.
+
+Compares the former row-by-row insert (executemany of an INSERT, json.dumps)
+with the bulk insert, for 1, 10 and 100 messages per call, on the database
+of the .env file: typical messages (a few KB), then large tool outputs
+(~100 KB each, written with COPY from 1 MB per call). Each call runs in a
+transaction that is rolled back, so the database is left unchanged. A first
+check runs the COPY as the first write of a unit of work, and verifies that
+its rows are rolled back with it and committed with it.
+
+    poetry run python -m benchmarks.add_messages
+"""
+
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, List, Tuple
+
+import orjson
+from injector import Injector
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.sql import text
+
+from uaissistant.assistant.models import (
+    AssistantMessageItem,
+    AssistantMessageValue,
+)
+from uaissistant.assistant.repository import AssistantRepository
+from uaissistant.assistant.schemas import AssistantMessageType, Role
+from uaissistant.assistant.unit_of_work import UnitOfWork
+from uaissistant.connections import ConfigModule, DbModule
+
+MESSAGE_COUNTS = [1, 10, 100]
+REPEATS = 50
+# a text answer with a markdown table, as the tool-functions return them
+TABLE = "\n".join(
+    f"| feature_{i} | {i * 0.123:.3f} | {i * 4.56:.2f} |" for i in range(40)
+)
+LARGE_TABLE = "\n".join([TABLE] * 80)
+
+
+def make_messages(n: int, large: bool) -> List[AssistantMessageItem]:
+    # a turn: the user message, then text answers and plot references
+    table = LARGE_TABLE if large else TABLE
+    messages = []
+    for i in range(n):
+        if i % 3 == 2:
+            value = AssistantMessageValue(
+                type=AssistantMessageType.Plot,
+                content={
+                    "file_id": f"histogram_{uuid.uuid4()}",
+                    "filename": "histogram.json",
+                    "figure_id": uuid.uuid4().hex * 2,
+                },
+            )
+        else:
+            value = AssistantMessageValue(
+                type=AssistantMessageType.Text,
+                content={"message": f"Here are the statistics:\n{table}"},
+            )
+        messages.append(
+            AssistantMessageItem(
+                id=f"msg_{uuid.uuid4()}",
+                role=Role.User if i == 0 else Role.Assistant,
+                created_at=datetime.now(),
+                value=value,
+            )
+        )
+    return messages
+
+
+async def add_messages_row_by_row(
+    session: AsyncSession,
+    assistant_id: str,
+    thread_id: str,
+    messages: List[AssistantMessageItem],
+) -> None:
+    # the former implementation of AssistantRepository.add_messages
+    query = """
+        INSERT INTO assistant_message (id, assistant_id, thread_id, created_at, role, type, content)
+        VALUES (:id, :assistant_id, :thread_id, :created_at, :role, :type, :content)
+    """
+    values = [
+        {
+            "id": message.id,
+            "assistant_id": assistant_id,
+            "thread_id": thread_id,
+            "created_at": message.created_at,
+            "role": message.role.value,
+            "type": message.value.type.value,
+            "content": json.dumps(message.value.content),
+        }
+        for message in messages
+    ]
+    await session.execute(text(query), values)
+
+
+async def add_messages_bulk(
+    session: AsyncSession,
+    assistant_id: str,
+    thread_id: str,
+    messages: List[AssistantMessageItem],
+) -> None:
+    await AssistantRepository(session).add_messages(
+        assistant_id, thread_id, messages
+    )
+
+
+async def measure(
+    Session: async_sessionmaker[AsyncSession],
+    add: Callable[..., Awaitable[None]],
+    n: int,
+    large: bool,
+) -> float:
+    # median time of one call, in milliseconds
+    durations = []
+    for _ in range(REPEATS):
+        messages = make_messages(n, large)
+        async with Session() as session:
+            # the parents of the messages (foreign keys)
+            await session.execute(
+                text("INSERT INTO assistant (id) VALUES ('benchmark')")
+            )
+            await session.execute(
+                text(
+                    "INSERT INTO assistant_thread (id, assistant_id)"
+                    " VALUES ('benchmark', 'benchmark')"
+                )
+            )
+            start = time.perf_counter()
+            await add(session, "benchmark", "benchmark", messages)
+            durations.append(time.perf_counter() - start)
+            await session.rollback()
+    return statistics.median(durations) * 1000
+
+
+async def check_copy_transaction(
+    Session: async_sessionmaker[AsyncSession],
+) -> None:
+    # the COPY of large outputs follows the unit of work even when it is its
+    # first statement (the messages of a new turn in an existing thread)
+    messages = make_messages(30, large=True)
+    count_query = text(
+        "SELECT count(*) FROM assistant_message WHERE thread_id = 'benchmark'"
+    )
+    async with Session() as session, session.begin():
+        await session.execute(
+            text("INSERT INTO assistant (id) VALUES ('benchmark')")
+        )
+        await session.execute(
+            text(
+                "INSERT INTO assistant_thread (id, assistant_id)"
+                " VALUES ('benchmark', 'benchmark')"
+            )
+        )
+    try:
+        counts = []
+        for fail in (True, False):
+            async with Session() as session:
+                try:
+                    async with UnitOfWork(session).write():
+                        await add_messages_bulk(
+                            session, "benchmark", "benchmark", messages
+                        )
+                        if fail:
+                            raise RuntimeError("rollback of the unit of work")
+                except RuntimeError:
+                    pass
+                counts.append((await session.execute(count_query)).scalar())
+                await session.rollback()
+        print(
+            f"COPY as the first write of a unit of work: {counts[0]} rows"
+            f" after a rollback, {counts[1]} after a commit"
+        )
+        if counts != [0, len(messages)]:
+            raise AssertionError("the COPY is not part of the unit of work")
+    finally:
+        # the thread and the messages go with the assistant (ON DELETE CASCADE)
+        async with Session() as session, session.begin():
+            await session.execute(
+                text("DELETE FROM assistant WHERE id = 'benchmark'")
+            )
+
+
+def measure_encoding(n: int, large: bool) -> Tuple[float, float]:
+    # encoding time of the contents of n messages, in milliseconds
+    contents = [message.value.content for message in make_messages(n, large)]
+    timings = []
+    for dumps in (json.dumps, lambda value: orjson.dumps(value).decode()):
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            for content in contents:
+                dumps(content)
+        timings.append((time.perf_counter() - start) / REPEATS * 1000)
+    return timings[0], timings[1]
+
+
+async def main() -> None:
+    Session = Injector([ConfigModule(), DbModule()]).get(
+        async_sessionmaker[AsyncSession]
+    )
+    await check_copy_transaction(Session)
+
+    # a first round opens the connection and prepares the statements
+    for add in (add_messages_row_by_row, add_messages_bulk):
+        await measure(Session, add, 1, large=True)
+
+    for large in (False, True):
+        print("large tool outputs" if large else "typical messages")
+        print(
+            f"{'messages':>8} {'row by row (ms)':>16} {'bulk (ms)':>10}"
+            f" {'json (ms)':>10} {'orjson (ms)':>12}"
+        )
+        for n in MESSAGE_COUNTS:
+            row_by_row = await measure(
+                Session, add_messages_row_by_row, n, large
+            )
+            bulk = await measure(Session, add_messages_bulk, n, large)
+            json_ms, orjson_ms = measure_encoding(n, large)
+            print(
+                f"{n:>8} {row_by_row:>16.2f} {bulk:>10.2f}"
+                f" {json_ms:>10.3f} {orjson_ms:>12.3f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,206 @@
+"""Latency of `GET /assistants` while a modeling job runs.
+
+Starts the API in a child process for each backend of the tool-function
+calls and measures the latency percentiles of the assistant listing from
+this process, first idle, then while the child runs `modeling` calls
+(`--time-budget` seconds each) one after the other on a table of `--rows`
+rows, created in the database of the .env file and dropped afterwards:
+
+- inline: the call runs on the event loop, as before the tool executor
+- thread: `ToolExecutor`, threads of the API process
+- process: `ProcessToolExecutor`, worker processes (the default)
+
+    poetry run python -m benchmarks.assistants_latency --clients 20 --duration 20
+"""
+
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import time
+
+import numpy as np
+from injector import Injector
+from sqlalchemy import orm
+from sqlalchemy.sql import text
+
+# the tool-functions import the assistant package, which imports them back:
+# it is imported first, as in the app
+import uaissistant.assistant  # noqa: F401
+from benchmarks.http_load import Connection, LoadResult, run_load
+from uaissistant.connections import ConfigModule, DbModule
+from uaissistant.tool_factory.schemas.tool_call import ToolCall
+
+BACKENDS = ["inline", "thread", "process"]
+TABLE = "benchmark_modeling"
+FEATURES = ["x1", "x2", "x3", "x4", "category"]
+CREATE_TABLE_QUERY = f"""
+CREATE TABLE {TABLE} AS
+SELECT
+    x1, x2, x3, x4, category,
+    2 * x1 - x2 + x3 * x4 + (category = 'b')::integer + random() AS y
+FROM (
+    SELECT
+        random() AS x1,
+        random() AS x2,
+        random() AS x3,
+        random() AS x4,
+        (ARRAY['a', 'b', 'c'])[1 + i % 3] AS category
+    FROM generate_series(1, :rows) AS i
+) AS features
+"""
+
+
+def serve(backend: str, port: int, time_budget: float, job, stop) -> None:
+    # child process: the API with the given backend, and the modeling job
+    # between the `job` and `stop` events
+    os.environ["TOOL_EXECUTOR_BACKEND"] = (
+        "thread" if backend == "inline" else backend
+    )
+    import uvicorn
+
+    from uaissistant.main import app, injector
+    from uaissistant.tool_factory.executor import IToolExecutor
+    from uaissistant.tool_factory.service import IToolFactoryService
+
+    async def run_job() -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, job.wait)
+        executor = injector.get(IToolExecutor)
+        tool_factory = injector.get(IToolFactoryService)
+        # a new random_state per call: the fitted-model cache is not used
+        for random_state in itertools.count():
+            if stop.is_set():
+                return
+            call = ToolCall(
+                id=None,
+                name="modeling",
+                args={
+                    "dataset_name": TABLE,
+                    "features": FEATURES,
+                    "target": "y",
+                    "random_state": random_state,
+                    "time_budget": time_budget,
+                },
+            )
+            if backend == "inline":
+                tool_factory.call_tool_function(call.name, call.args)
+                # the requests queued during the call are served before the
+                # next one
+                await asyncio.sleep(0)
+            else:
+                async for _ in executor.run([call]):
+                    pass
+
+    async def main() -> None:
+        server = uvicorn.Server(
+            uvicorn.Config(app, port=port, log_level="warning")
+        )
+        job_task = asyncio.create_task(run_job())
+        await server.serve()
+        job_task.cancel()
+
+    asyncio.run(main())
+
+
+async def wait_ready(base_url: str, timeout: float = 60) -> None:
+    deadline = time.perf_counter() + timeout
+    while True:
+        connection = Connection(base_url)
+        try:
+            status, _ = await connection.get("/assistants")
+            if status == 200:
+                return
+        except OSError:
+            pass
+        finally:
+            connection.close()
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"the API is not up at {base_url}")
+        await asyncio.sleep(0.5)
+
+
+def report(backend: str, phase: str, result: LoadResult) -> None:
+    latencies = np.array(result.latencies) * 1000
+    p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (0, 0)
+    print(
+        f"{backend:>8} {phase:>6} {result.requests_per_second:>11.1f}"
+        f" {p50:>9.1f} {p99:>9.1f} {latencies.max(initial=0):>9.1f}"
+        f" {result.errors:>7}"
+    )
+
+
+def main(args: argparse.Namespace) -> None:
+    Session = Injector([ConfigModule(), DbModule()]).get(
+        orm.sessionmaker[orm.Session]
+    )
+    with Session() as session:
+        session.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        session.execute(text(CREATE_TABLE_QUERY), {"rows": args.rows})
+        session.commit()
+
+    context = multiprocessing.get_context("spawn")
+    base_url = f"http://127.0.0.1:{args.port}"
+    print(
+        f"{'backend':>8} {'phase':>6} {'requests/s':>11} {'p50 (ms)':>9}"
+        f" {'p99 (ms)':>9} {'max (ms)':>9} {'errors':>7}"
+    )
+    try:
+        for backend in args.backends:
+            job, stop = context.Event(), context.Event()
+            server = context.Process(
+                target=serve,
+                args=(backend, args.port, args.time_budget, job, stop),
+            )
+            server.start()
+            try:
+                asyncio.run(wait_ready(base_url))
+                for phase in ["idle", "job"]:
+                    if phase == "job":
+                        job.set()
+                        # the first call loads the dataset and starts fitting
+                        time.sleep(args.job_warmup)
+                    result = asyncio.run(
+                        run_load(
+                            base_url, "/assistants", args.clients, args.duration
+                        )
+                    )
+                    report(backend, phase, result)
+            finally:
+                stop.set()
+                server.terminate()
+                # the shutdown waits for the running call (on the event loop
+                # for inline)
+                server.join(args.time_budget * 4)
+                if server.is_alive():
+                    server.kill()
+                    server.join()
+    finally:
+        with Session() as session:
+            session.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+            session.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument(
+        "--job-warmup",
+        type=float,
+        default=3,
+        help="seconds between the start of the job and of the measure",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=5,
+        help="time budget of a modeling call (seconds)",
+    )
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument(
+        "--backends", nargs="+", choices=BACKENDS, default=BACKENDS
+    )
+    main(parser.parse_args())
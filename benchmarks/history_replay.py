@@ -0,0 +1,178 @@
+"""Replay of a long thread through `HistoryManager`.
+
+Replays a generated conversation of 200 turns (a user question and an
+answer with a table of results) the way the Anthropic and Gemini providers
+read their history, and prints the estimated tokens of the whole history
+next to the tokens of the window sent to the model, per turn and in total
+(`HistoryMetrics`, as served at `GET /metrics`). The thread and its summary
+are kept in memory and the summaries are made offline (a truncated
+transcript of the summary size), so the run needs neither a database nor
+an API key.
+
+    poetry run python -m benchmarks.history_replay --turns 200 --every 20
+"""
+
+import argparse
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Awaitable, Callable, Dict, List
+
+# the tool-functions import the assistant package, which imports them back:
+# it is imported first, as in the app
+import uaissistant.assistant  # noqa: F401
+from uaissistant.assistant.pagination import Cursor
+from uaissistant.assistant.schemas import (
+    AssistantMessageEntity,
+    AssistantMessageType,
+    Role,
+)
+from uaissistant.llms.history.manager import HistoryManager, HistoryMetrics
+from uaissistant.llms.history.schemas import ThreadSummaryEntity
+
+THREAD_ID = "benchmark"
+# characters of the stand-in summaries (~500 tokens)
+SUMMARY_CHARS = 2000
+TABLE = "\n".join(
+    ["| column | count | mean | std | min | max |", "|---|---|---|---|---|---|"]
+    + [
+        f"| feature_{i} | 10000 | {i * 1.5:.2f} | {i * 0.3:.2f} | 0.00 | {i * 9.1:.2f} |"
+        for i in range(12)
+    ]
+)
+
+
+class InMemoryHistoryRepository:
+    def __init__(self) -> None:
+        self.summaries: Dict[str, ThreadSummaryEntity] = {}
+
+    async def get_summary(self, thread_id: str) -> ThreadSummaryEntity | None:
+        return self.summaries.get(thread_id)
+
+    async def save_summary(self, summary: ThreadSummaryEntity) -> None:
+        self.summaries[summary.thread_id] = summary
+
+
+class InMemoryUnitOfWork:
+    # no transaction: the deferred writes (the summary) run with the write
+    # of the turn, as in the service
+    def __init__(self) -> None:
+        self._deferred: List[Callable[[], Awaitable[None]]] = []
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[None]:
+        yield
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[None]:
+        deferred, self._deferred = self._deferred, []
+        for write in deferred:
+            await write()
+        yield
+
+    def defer(self, write: Callable[[], Awaitable[None]]) -> None:
+        self._deferred.append(write)
+
+
+class Thread:
+    def __init__(self) -> None:
+        self.messages: List[AssistantMessageEntity] = []
+        self.start = datetime(2024, 1, 1)
+        # messages read by the manager, to show the cursor at work
+        self.loaded = 0
+
+    def add(self, role: Role, message: str) -> None:
+        self.messages.append(
+            AssistantMessageEntity(
+                id=f"msg_{uuid.uuid4()}",
+                assistant_id="benchmark",
+                thread_id=THREAD_ID,
+                created_at=self.start + timedelta(seconds=len(self.messages)),
+                # as read from the database
+                role=role.value,
+                type=AssistantMessageType.Text.value,
+                content={"message": message},
+            )
+        )
+
+    async def list_messages(
+        self, thread_id: str, after: Cursor | None = None
+    ) -> List[AssistantMessageEntity]:
+        messages = [
+            m
+            for m in self.messages
+            if after is None
+            or (m.created_at, m.id) > (after.created_at, after.id)
+        ]
+        self.loaded = len(messages)
+        return messages
+
+
+async def summarize(prompt: str) -> str:
+    # stand-in for the model call: a summary of the usual size
+    return prompt[-SUMMARY_CHARS:]
+
+
+async def main(args: argparse.Namespace) -> None:
+    metrics = HistoryMetrics()
+    uow = InMemoryUnitOfWork()
+    manager = HistoryManager(
+        repository=InMemoryHistoryRepository(),
+        uow=uow,
+        metrics=metrics,
+        max_tokens=args.max_tokens,
+    )
+    thread = Thread()
+
+    print(
+        f"model {args.model}, budget {manager.token_budget(args.model)} tokens"
+    )
+    print(
+        f"{'turn':>5} {'history tokens':>15} {'sent tokens':>12}"
+        f" {'messages sent':>14} {'messages read':>14}"
+    )
+    for turn in range(1, args.turns + 1):
+        window = await manager.get_window(
+            thread_id=THREAD_ID,
+            model=args.model,
+            list_messages=thread.list_messages,
+            summarize=summarize,
+        )
+        if turn % args.every == 0 or turn == args.turns:
+            stats = metrics.stats()
+            print(
+                f"{turn:>5} {stats.last_history_tokens:>15}"
+                f" {stats.last_sent_tokens:>12} {len(window.messages):>14}"
+                f" {thread.loaded:>14}"
+            )
+
+        async with uow.write():
+            thread.add(
+                Role.User,
+                f"Turn {turn}: compute the statistics of the columns of the"
+                " sales dataset for the stores of region "
+                f"{turn % 7} and compare them with the previous results.",
+            )
+            thread.add(
+                Role.Assistant,
+                f"Here are the statistics of region {turn % 7}:\n{TABLE}",
+            )
+
+    stats = metrics.stats()
+    print(
+        f"{stats.turns} turns: {stats.history_tokens} history tokens,"
+        f" {stats.sent_tokens} sent ({stats.sent_tokens / stats.history_tokens:.1%}),"
+        f" {stats.summaries} summaries, {stats.summary_failures} failures"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--max-tokens", type=int, default=16000)
+    parser.add_argument("--model", default="claude-3-haiku-20240307")
+    parser.add_argument(
+        "--every", type=int, default=20, help="turns between the printed rows"
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,101 @@
+"""Load generation for the benchmarks of the API endpoints.
+
+A minimal HTTP/1.1 client on asyncio streams: every client keeps one
+connection open (keep-alive) and sends its GET requests one after the
+other, so `clients` is the number of requests in flight.
+"""
+
+import asyncio
+import time
+from typing import List, Tuple
+from urllib.parse import urlsplit
+
+from pydantic.dataclasses import dataclass
+
+
+@dataclass
+class LoadResult:
+    requests: int
+    errors: int
+    duration: float
+    # seconds of every successful request
+    latencies: List[float]
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.duration
+
+
+class Connection:
+    def __init__(self, url: str) -> None:
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+
+    async def get(self, path: str) -> Tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        self.writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n\r\n".encode()
+        )
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by the server")
+        headers = {}
+        while (line := await self.reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "content-length" not in headers:
+            raise ValueError(f"unsupported response headers: {headers}")
+        body = await self.reader.readexactly(int(headers["content-length"]))
+        if headers.get("connection") == "close":
+            self.close()
+        return int(status_line.split()[1]), body
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.reader, self.writer = None, None
+
+
+async def run_load(
+    base_url: str, path: str, clients: int, duration: float
+) -> LoadResult:
+    # `clients` connections requesting `path` until `duration` is over
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client() -> None:
+        nonlocal errors
+        connection = Connection(base_url)
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    status, _ = await connection.get(path)
+                except (OSError, ValueError, asyncio.IncompleteReadError):
+                    errors += 1
+                    connection.close()
+                    continue
+                if status == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return LoadResult(
+        requests=len(latencies),
+        errors=errors,
+        duration=time.perf_counter() - start,
+        latencies=latencies,
+    )
@@ -0,0 +1,104 @@
+"""Load benchmark of `GET /assistants/{id}/threads/{tid}/messages`.
+
+Requests per second and latency percentiles of the message listing under
+200 concurrent clients, against a running API (`--base-url`). A thread of
+50 typical messages is created in the database of the .env file for the
+run and deleted afterwards; `--thread ASSISTANT_ID/THREAD_ID` uses an
+existing one instead. Run it against the server before and after a change
+(same database, same machine) to compare them.
+
+    poetry run python -m benchmarks.list_messages --clients 200 --duration 30
+"""
+
+import argparse
+import asyncio
+import uuid
+from typing import Tuple
+
+import numpy as np
+from injector import Injector
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.sql import text
+
+from benchmarks.add_messages import make_messages
+from benchmarks.http_load import run_load
+from uaissistant.assistant.repository import AssistantRepository
+from uaissistant.connections import ConfigModule, DbModule
+
+MESSAGES = 50
+
+
+async def seed(Session: async_sessionmaker[AsyncSession]) -> Tuple[str, str]:
+    assistant_id = f"benchmark_{uuid.uuid4()}"
+    thread_id = f"benchmark_{uuid.uuid4()}"
+    async with Session() as session, session.begin():
+        await session.execute(
+            text("INSERT INTO assistant (id, name) VALUES (:id, 'benchmark')"),
+            {"id": assistant_id},
+        )
+        await session.execute(
+            text(
+                "INSERT INTO assistant_thread (id, name, assistant_id)"
+                " VALUES (:id, 'benchmark', :assistant_id)"
+            ),
+            {"id": thread_id, "assistant_id": assistant_id},
+        )
+        await AssistantRepository(session).add_messages(
+            assistant_id, thread_id, make_messages(MESSAGES, large=False)
+        )
+    return assistant_id, thread_id
+
+
+async def remove(
+    Session: async_sessionmaker[AsyncSession], assistant_id: str
+) -> None:
+    # the thread and the messages go with the assistant (ON DELETE CASCADE)
+    async with Session() as session, session.begin():
+        await session.execute(
+            text("DELETE FROM assistant WHERE id = :id"), {"id": assistant_id}
+        )
+
+
+async def main(args: argparse.Namespace) -> None:
+    Session = None
+    if args.thread is None:
+        Session = Injector([ConfigModule(), DbModule()]).get(
+            async_sessionmaker[AsyncSession]
+        )
+        assistant_id, thread_id = await seed(Session)
+    else:
+        assistant_id, thread_id = args.thread.split("/")
+    path = f"/assistants/{assistant_id}/threads/{thread_id}/messages"
+
+    try:
+        # a short first round opens the connections and warms the pools
+        await run_load(args.base_url, path, args.clients, 2)
+        result = await run_load(
+            args.base_url, path, args.clients, args.duration
+        )
+    finally:
+        if Session is not None:
+            await remove(Session, assistant_id)
+
+    latencies = np.array(result.latencies) * 1000
+    print(f"GET {path}")
+    print(
+        f"{args.clients} clients, {args.duration:.0f} s:"
+        f" {result.requests_per_second:.1f} requests/s,"
+        f" {result.errors} errors"
+    )
+    if len(latencies):
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        print(
+            f"latency (ms): p50 {p50:.1f}, p90 {p90:.1f}, p99 {p99:.1f},"
+            f" max {latencies.max():.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--thread", help="ASSISTANT_ID/THREAD_ID")
+    asyncio.run(main(parser.parse_args()))
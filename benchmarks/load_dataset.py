@@ -0,0 +1,150 @@
+"""Benchmark of the dataset loaders of `ToolFactoryRepository`.
+
+Compares the former loader (`fetchall` of the rows, then a DataFrame built
+from them) with the COPY loader (csv stream parsed into typed columns) on
+tables of 100k, 1M and 10M rows and 6 columns (bigint, double precision,
+real, integer, text, timestamp) created in the database of the .env file
+and dropped afterwards. Every load runs in a new process, so the peak RSS
+is the one of that load alone; it is reported with the increase over the
+process before the load and the size of the resulting DataFrame.
+
+    poetry run python -m benchmarks.load_dataset --sizes 100000 1000000 10000000
+"""
+
+import argparse
+import multiprocessing
+import resource
+import time
+from typing import Dict, List
+
+from injector import Injector
+from pydantic.dataclasses import dataclass
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql import text
+
+# the tool-functions import the assistant package, which imports them back:
+# it is imported first, as in the app
+import uaissistant.assistant  # noqa: F401
+from uaissistant.connections import ConfigModule, DbModule
+from uaissistant.tool_factory.cache import DatasetCache
+from uaissistant.tool_factory.model_cache import ModelCache
+from uaissistant.tool_factory.repository import ToolFactoryRepository
+
+LOADERS = ["fetchall", "copy"]
+CREATE_TABLE_QUERY = """
+CREATE TABLE {table} AS
+SELECT
+    i::bigint AS id,
+    random() * 1000 AS value,
+    random()::real AS ratio,
+    (random() * 100)::integer AS quantity,
+    'category_' || (i % 20) AS category,
+    TIMESTAMP '2024-01-01' + i * INTERVAL '1 second' AS created_at
+FROM generate_series(1, :rows) AS i
+"""
+
+
+@dataclass
+class LoadResult:
+    seconds: float
+    # KB: peak of the process, and its increase over the process before
+    # the load
+    peak_rss: int
+    peak_rss_increase: int
+    dataframe_bytes: int
+
+
+def make_repository() -> ToolFactoryRepository:
+    # no dataset cache: every load reads the table
+    return ToolFactoryRepository(
+        Session=Injector([ConfigModule(), DbModule()]).get(
+            sessionmaker[Session]
+        ),
+        cache=DatasetCache(max_bytes=0),
+        model_cache=ModelCache(max_bytes=0, max_age=0),
+    )
+
+
+def measure(loader: str, table: str, dtypes: Dict[str, str], queue) -> None:
+    repository = make_repository()
+    columns = list(dtypes)
+    # connection and statement set-up outside of the measure
+    repository._load_data(table, columns, dtypes, [], 1)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    with repository.Session() as session:
+        if loader == "copy":
+            data = repository._load_data_copy(
+                session, table, columns, dtypes, [], None
+            )
+        else:
+            data = repository._load_data_rows(session, table, columns, [], None)
+    seconds = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    queue.put(
+        LoadResult(
+            seconds=seconds,
+            peak_rss=peak_rss,
+            peak_rss_increase=peak_rss - rss_before,
+            dataframe_bytes=int(data.memory_usage(deep=True).sum()),
+        )
+    )
+
+
+def run_in_process(
+    loader: str, table: str, dtypes: Dict[str, str]
+) -> LoadResult:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(
+        target=measure, args=(loader, table, dtypes, queue)
+    )
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main(sizes: List[int]) -> None:
+    repository = make_repository()
+
+    print(
+        f"{'rows':>10} {'loader':>8} {'time (s)':>9} {'peak RSS (MB)':>14}"
+        f" {'increase (MB)':>14} {'DataFrame (MB)':>15}"
+    )
+    for rows in sizes:
+        table = f"benchmark_load_{rows}"
+        with repository.Session() as session:
+            session.execute(text(f"DROP TABLE IF EXISTS {table}"))
+            session.execute(
+                text(CREATE_TABLE_QUERY.format(table=table)), {"rows": rows}
+            )
+            session.commit()
+        try:
+            dtypes = repository.get_columns(table)
+            for loader in LOADERS:
+                result = run_in_process(loader, table, dtypes)
+                print(
+                    f"{rows:>10} {loader:>8} {result.seconds:>9.2f}"
+                    f" {result.peak_rss / 1024:>14.0f}"
+                    f" {result.peak_rss_increase / 1024:>14.0f}"
+                    f" {result.dataframe_bytes / 2**20:>15.0f}"
+                )
+        finally:
+            with repository.Session() as session:
+                session.execute(text(f"DROP TABLE IF EXISTS {table}"))
+                session.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[100_000, 1_000_000, 10_000_000],
+        help="rows of the tables",
+    )
+    main(parser.parse_args().sizes)
@@ -4,24 +4,60 @@ CREATE TABLE IF NOT EXISTS assistant (
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     instructions TEXT,
     llmsource TEXT,
-    model TEXT
+    model TEXT,
+    tools_version TEXT,
+    -- soft delete: set by the API, the row is purged in the background
+    deleted_at TIMESTAMP
 );
 
 CREATE TABLE IF NOT EXISTS assistant_thread (
     id TEXT PRIMARY KEY,
     name TEXT,
-    assistant_id TEXT NOT NULL,
-    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    assistant_id TEXT NOT NULL REFERENCES assistant (id) ON DELETE CASCADE,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    deleted_at TIMESTAMP
 );
 
 CREATE TABLE IF NOT EXISTS assistant_message (
     id TEXT PRIMARY KEY,
-    assistant_id TEXT NOT NULL,
-    thread_id TEXT NOT NULL,
+    assistant_id TEXT NOT NULL REFERENCES assistant (id) ON DELETE CASCADE,
+    thread_id TEXT NOT NULL REFERENCES assistant_thread (id) ON DELETE CASCADE,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     role TEXT NOT NULL,
     type TEXT NOT NULL,
-    content JSON
+    content JSONB,
+    -- shown to the user only, never sent back to the LLM as history
+    is_internal BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+-- keyset pagination of the threads and messages on (created_at, id)
+CREATE INDEX IF NOT EXISTS assistant_thread_assistant_id_created_at_idx
+ON assistant_thread (assistant_id, created_at, id);
+
+CREATE INDEX IF NOT EXISTS assistant_message_thread_id_created_at_idx
+ON assistant_message (thread_id, created_at, id);
+
+-- the history sent to the LLMs (Anthropic, Gemini): the messages of a
+-- thread in order, without the internal ones
+CREATE INDEX IF NOT EXISTS assistant_message_history_idx
+ON assistant_message (thread_id, created_at, id) WHERE NOT is_internal;
+
+-- the cascades look up the children by their foreign key: thread_id and
+-- assistant_id (threads) are the leading columns of the indexes above
+CREATE INDEX IF NOT EXISTS assistant_message_assistant_id_idx
+ON assistant_message (assistant_id);
+
+-- the few soft-deleted threads, for the background purge
+CREATE INDEX IF NOT EXISTS assistant_thread_deleted_at_idx
+ON assistant_thread (deleted_at) WHERE deleted_at IS NOT NULL;
+
+-- rolling summary of the older messages of a thread, sent instead of them
+CREATE TABLE IF NOT EXISTS assistant_thread_summary (
+    thread_id TEXT PRIMARY KEY REFERENCES assistant_thread (id) ON DELETE CASCADE,
+    last_message_created_at TIMESTAMP NOT NULL,
+    last_message_id TEXT NOT NULL,
+    content TEXT NOT NULL,
+    summarized_tokens INTEGER NOT NULL
 );
 
 CREATE TABLE IF NOT EXISTS iris(
@@ -644,3 +680,29 @@ VALUES
 (60, 2, 24.9, 99.67, 162, 106.6, 43, 3.77, 4.1271, 95, 132),
 (36, 1, 30, 95, 201, 125.2, 42, 4.79, 5.1299, 85, 220),
 (36, 1, 19.6, 71, 250, 133.2, 97, 3, 4.5951, 92, 57);
+
+-- change counter of the datasets, used to invalidate the dataset cache
+CREATE TABLE IF NOT EXISTS dataset_version (
+    dataset_name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION bump_dataset_version() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO dataset_version (dataset_name, version)
+    VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (dataset_name)
+    DO UPDATE SET version = dataset_version.version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS iris_dataset_version ON iris;
+CREATE TRIGGER iris_dataset_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON iris
+FOR EACH STATEMENT EXECUTE FUNCTION bump_dataset_version();
+
+DROP TRIGGER IF EXISTS diabetes_dataset_version ON diabetes;
+CREATE TRIGGER diabetes_dataset_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON diabetes
+FOR EACH STATEMENT EXECUTE FUNCTION bump_dataset_version();
@@ -0,0 +1,2 @@
+-- hash of the tool-function schemas last pushed to the LLM
+ALTER TABLE assistant ADD COLUMN IF NOT EXISTS tools_version TEXT;
@@ -0,0 +1,25 @@
+-- change counter of the datasets, used to invalidate the dataset cache
+CREATE TABLE IF NOT EXISTS dataset_version (
+    dataset_name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION bump_dataset_version() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO dataset_version (dataset_name, version)
+    VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (dataset_name)
+    DO UPDATE SET version = dataset_version.version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS iris_dataset_version ON iris;
+CREATE TRIGGER iris_dataset_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON iris
+FOR EACH STATEMENT EXECUTE FUNCTION bump_dataset_version();
+
+DROP TRIGGER IF EXISTS diabetes_dataset_version ON diabetes;
+CREATE TRIGGER diabetes_dataset_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON diabetes
+FOR EACH STATEMENT EXECUTE FUNCTION bump_dataset_version();
@@ -0,0 +1,7 @@
+-- keyset pagination of the threads and messages on (created_at, id)
+-- CONCURRENTLY: the tables stay writable while the indexes are built
+CREATE INDEX CONCURRENTLY IF NOT EXISTS assistant_thread_assistant_id_created_at_idx
+ON assistant_thread (assistant_id, created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS assistant_message_thread_id_created_at_idx
+ON assistant_message (thread_id, created_at, id);
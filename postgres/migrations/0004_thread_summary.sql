@@ -0,0 +1,8 @@
+-- rolling summary of the older messages of a thread, sent instead of them
+CREATE TABLE IF NOT EXISTS assistant_thread_summary (
+    thread_id TEXT PRIMARY KEY,
+    last_message_created_at TIMESTAMP NOT NULL,
+    last_message_id TEXT NOT NULL,
+    content TEXT NOT NULL,
+    summarized_tokens INTEGER NOT NULL
+);
@@ -0,0 +1,49 @@
+-- soft delete: set by the API, the rows are purged in the background
+ALTER TABLE assistant ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+ALTER TABLE assistant_thread ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+
+-- indexes of the cascades and of the background purge
+-- CONCURRENTLY: the tables stay writable while the indexes are built
+CREATE INDEX CONCURRENTLY IF NOT EXISTS assistant_message_assistant_id_idx
+ON assistant_message (assistant_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS assistant_thread_deleted_at_idx
+ON assistant_thread (deleted_at) WHERE deleted_at IS NOT NULL;
+
+-- rows left behind by the former multi-statement deletes, which the
+-- foreign keys below would reject
+DELETE FROM assistant_thread_summary s
+WHERE NOT EXISTS (SELECT 1 FROM assistant_thread t WHERE t.id = s.thread_id);
+DELETE FROM assistant_message m
+WHERE NOT EXISTS (SELECT 1 FROM assistant_thread t WHERE t.id = m.thread_id)
+    OR NOT EXISTS (SELECT 1 FROM assistant a WHERE a.id = m.assistant_id);
+DELETE FROM assistant_thread t
+WHERE NOT EXISTS (SELECT 1 FROM assistant a WHERE a.id = t.assistant_id);
+
+-- foreign keys with ON DELETE CASCADE. Added NOT VALID (no scan under the
+-- exclusive lock) and validated afterwards, which only blocks DDL
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'assistant_thread_assistant_id_fkey') THEN
+        ALTER TABLE assistant_thread ADD CONSTRAINT assistant_thread_assistant_id_fkey
+        FOREIGN KEY (assistant_id) REFERENCES assistant (id) ON DELETE CASCADE NOT VALID;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'assistant_message_assistant_id_fkey') THEN
+        ALTER TABLE assistant_message ADD CONSTRAINT assistant_message_assistant_id_fkey
+        FOREIGN KEY (assistant_id) REFERENCES assistant (id) ON DELETE CASCADE NOT VALID;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'assistant_message_thread_id_fkey') THEN
+        ALTER TABLE assistant_message ADD CONSTRAINT assistant_message_thread_id_fkey
+        FOREIGN KEY (thread_id) REFERENCES assistant_thread (id) ON DELETE CASCADE NOT VALID;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'assistant_thread_summary_thread_id_fkey') THEN
+        ALTER TABLE assistant_thread_summary ADD CONSTRAINT assistant_thread_summary_thread_id_fkey
+        FOREIGN KEY (thread_id) REFERENCES assistant_thread (id) ON DELETE CASCADE NOT VALID;
+    END IF;
+END
+$$;
+
+ALTER TABLE assistant_thread VALIDATE CONSTRAINT assistant_thread_assistant_id_fkey;
+ALTER TABLE assistant_message VALIDATE CONSTRAINT assistant_message_assistant_id_fkey;
+ALTER TABLE assistant_message VALIDATE CONSTRAINT assistant_message_thread_id_fkey;
+ALTER TABLE assistant_thread_summary VALIDATE CONSTRAINT assistant_thread_summary_thread_id_fkey;
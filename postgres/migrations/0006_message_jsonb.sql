@@ -0,0 +1,23 @@
+-- message contents as JSONB (parsed once, on write), and an explicit flag
+-- for the messages that are not part of the LLM history. Rewrites the table
+-- (ACCESS EXCLUSIVE lock while it runs)
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'assistant_message' AND column_name = 'content') = 'json' THEN
+        ALTER TABLE assistant_message ALTER COLUMN content TYPE JSONB USING content::jsonb;
+    END IF;
+END
+$$;
+
+ALTER TABLE assistant_message ADD COLUMN IF NOT EXISTS is_internal BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- internal messages were marked by their id until now
+UPDATE assistant_message SET is_internal = TRUE
+WHERE id LIKE 'internal%' AND NOT is_internal;
+
+-- the history sent to the LLMs (Anthropic, Gemini): the messages of a
+-- thread in order, without the internal ones
+-- CONCURRENTLY: the table stays writable while the index is built
+CREATE INDEX CONCURRENTLY IF NOT EXISTS assistant_message_history_idx
+ON assistant_message (thread_id, created_at, id) WHERE NOT is_internal;
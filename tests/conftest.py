@@ -0,0 +1,3 @@
+# the tool-functions import the assistant package, which imports them back:
+# it is imported first, as in the app
+import uaissistant.assistant  # noqa: F401
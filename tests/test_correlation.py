@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from uaissistant.tool_factory.tools.data_analysis import correlation
+
+
+@pytest.fixture
+def data() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(300, 1)) + rng.normal(size=(300, 12))
+    values[rng.random(values.shape) < 0.6] = np.nan
+    data = pd.DataFrame(values, columns=[f"c{i}" for i in range(12)])
+    data["c0"] = data["c0"].round()  # ties
+    data["c1"] = 1.0  # constant
+    data["c2"] = np.nan  # empty
+    return data
+
+
+@pytest.mark.parametrize("method", ["pearson", "spearman"])
+def test_correlation_matrix_matches_pandas(data, method, monkeypatch):
+    # blocks smaller than the table, with missing values in most pairs
+    monkeypatch.setattr(correlation, "BLOCK_COLUMNS", 5)
+    matrix = correlation.correlation_matrix(data, method)
+    expected = data.corr(method=method)
+    np.testing.assert_allclose(matrix, expected, atol=1e-12)
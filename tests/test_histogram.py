@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from uaissistant.tool_factory.tools.data_analysis.plot import (
+    MAX_BINS,
+    histogram,
+)
+
+
+def test_outlier_bins_are_capped():
+    # numpy's "auto" width on these values gives ~10^8 bins
+    rng = np.random.default_rng(0)
+    values = pd.Series(np.append(rng.normal(size=1_000_000), 1e9))
+
+    counts, edges = histogram(dataset_name="data")._get_bins(values)
+
+    assert len(counts) == MAX_BINS
+    assert len(edges) == MAX_BINS + 1
+    assert counts.sum() == len(values)
+
+
+@pytest.mark.parametrize("size", [10, 1000, 100_000])
+def test_automatic_bins_match_numpy(size):
+    rng = np.random.default_rng(0)
+    values = pd.Series(rng.exponential(size=size))
+
+    counts, edges = histogram(dataset_name="data")._get_bins(values)
+
+    expected = np.histogram_bin_edges(values, bins="auto")
+    assert len(edges) == min(len(expected), MAX_BINS + 1)
+    assert counts.sum() == size
+
+
+def test_explicit_bins_are_capped():
+    values = pd.Series(np.arange(10_000, dtype="float64"))
+
+    counts, _ = histogram(dataset_name="data", bins=10_000)._get_bins(values)
+
+    assert len(counts) == MAX_BINS
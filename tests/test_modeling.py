@@ -0,0 +1,74 @@
+import time
+from typing import Any, Iterator, List
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from uaissistant.tool_factory.tools.data_analysis.modeling import modeling
+
+ROWS = 400
+
+
+class DataFrameStreamingRepository:
+    # IStreamingRepository over an in-memory table
+    def __init__(self, data: pd.DataFrame) -> None:
+        self.data = data
+
+    def iter_data(
+        self, dataset_name: str, columns: List[str], chunk_rows: int
+    ) -> Iterator[pd.DataFrame]:
+        for start in range(0, len(self.data), chunk_rows):
+            yield self.data[columns].iloc[start : start + chunk_rows]
+
+    def get_distinct(self, dataset_name: str, column: str) -> List[Any]:
+        return sorted(self.data[column].dropna().unique().tolist())
+
+
+@pytest.fixture
+def data() -> pd.DataFrame:
+    # a table with a numeric and a categorical column without any value
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(
+        {
+            "a": rng.normal(size=ROWS),
+            "empty": np.nan,
+            "category": rng.choice(["x", "y", None], ROWS),
+            "empty_category": pd.Series([None] * ROWS, dtype=object),
+        }
+    )
+    data["regression"] = 2 * data["a"] + rng.normal(size=ROWS)
+    data["classification"] = np.where(data["a"] > 0, "positive", "negative")
+    return data
+
+
+@pytest.mark.parametrize("engine", ["forest", "incremental"])
+@pytest.mark.parametrize("target", ["regression", "classification"])
+def test_importances_with_empty_features(data, engine, target):
+    features = ["a", "empty", "category", "empty_category"]
+    tool = modeling(dataset_name="data", features=features, target=target)
+    classification = target == "classification"
+    deadline = time.monotonic() + 60
+
+    if engine == "forest":
+        fitted = tool._fit_forest(data, classification, deadline)
+    else:
+        dataset_columns = {
+            column: "object" if data[column].dtype == object else "float64"
+            for column in data.columns
+        }
+        fitted = tool._fit_incremental(
+            DataFrameStreamingRepository(data),
+            dataset_columns,
+            classification,
+            ROWS,
+            deadline,
+        )
+
+    assert fitted.importance_mode == (
+        "impurity" if engine == "forest" else "coefficients"
+    )
+    assert list(fitted.importances.index) == features
+    assert fitted.importances["empty"] == 0
+    assert fitted.importances["empty_category"] == 0
+    assert fitted.importances["a"] > 0
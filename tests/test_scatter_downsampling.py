@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import pytest
+
+from uaissistant.tool_factory.tools.data_analysis.modeling import modeling
+from uaissistant.tool_factory.tools.data_analysis.plot import (
+    correlation_scatter_plot,
+)
+
+POINTS = 5_000_000
+# the figure of POINTS markers would be about 200 MB of JSON
+MAX_FIGURE_BYTES = 1_000_000
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=POINTS)
+    y = 2 * x + rng.normal(size=POINTS)
+    return pd.Series(x), y
+
+
+@pytest.mark.parametrize("mode", ["sample", "density"])
+def test_scatter_trace_is_bounded(points, mode):
+    x, y = points
+    tool = correlation_scatter_plot(dataset_name="data")
+    fig = go.Figure(
+        tool.get_scatter_trace(
+            x=x, y=y, mode=mode, name="Data", color=tool.colors[0]
+        )
+    )
+
+    assert len(fig.to_json()) < MAX_FIGURE_BYTES
+
+
+@pytest.mark.parametrize("mode", ["sample", "density"])
+def test_predicted_vs_actual_plot_is_bounded(points, mode):
+    y_test, y_pred = points
+    tool = modeling(
+        dataset_name="data",
+        features=["x"],
+        target="y",
+        large_data_mode=mode,
+    )
+    fig = tool._get_predicted_vs_actual_plot(y_test, y_pred)
+
+    assert len(fig.to_json()) < MAX_FIGURE_BYTES
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+from injector import Injector
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.sql import text
+
+from uaissistant.assistant.repository import AssistantRepository
+from uaissistant.assistant.schemas import LLMSource
+from uaissistant.assistant.service import AssistantService
+from uaissistant.assistant.unit_of_work import UnitOfWork
+from uaissistant.connections import ConfigModule, DbModule
+
+# the queries are checked against the database of the .env file
+pytestmark = pytest.mark.skipif(
+    "DB_HOST" not in os.environ, reason="no database configured (DB_HOST)"
+)
+
+
+class DeletingLLM:
+    async def delete_assistant(self, assistant_id: str) -> None:
+        pass
+
+
+async def seed(session: AsyncSession, assistant_id: str) -> None:
+    await session.execute(
+        text(
+            "INSERT INTO assistant (id, name, llmsource, tools_version)"
+            " VALUES (:id, 'test', 'openai', 'v1')"
+        ),
+        {"id": assistant_id},
+    )
+    await session.execute(
+        text(
+            "INSERT INTO assistant_thread (id, name, assistant_id)"
+            " VALUES (:id, 'test', :assistant_id)"
+        ),
+        {"id": f"{assistant_id}_thread", "assistant_id": assistant_id},
+    )
+    await session.execute(
+        text(
+            "INSERT INTO assistant_message"
+            " (id, assistant_id, thread_id, role, type, content)"
+            " VALUES (:id, :assistant_id, :thread_id, 'user', 'text',"
+            ' CAST(\'{"message": "hello"}\' AS JSONB))'
+        ),
+        {
+            "id": f"{assistant_id}_message",
+            "assistant_id": assistant_id,
+            "thread_id": f"{assistant_id}_thread",
+        },
+    )
+
+
+async def list_after_delete(soft_delete: bool):
+    Session = Injector([ConfigModule(), DbModule()]).get(
+        async_sessionmaker[AsyncSession]
+    )
+    assistant_id = f"test_{uuid.uuid4()}"
+    thread_id = f"{assistant_id}_thread"
+    async with Session() as session:
+        try:
+            await session.execute(text("SELECT 1"))
+        except OSError:
+            pytest.skip("database not reachable")
+        await seed(session, assistant_id)
+        await session.commit()
+
+    try:
+        async with Session() as session:
+            service = AssistantService(
+                ar=AssistantRepository(session),
+                llms={LLMSource.OpenAI: DeletingLLM()},
+                registry=None,
+                uow=UnitOfWork(session),
+                soft_delete=soft_delete,
+            )
+            await service.delete_assistant(assistant_id)
+
+            threads = await service.list_threads(assistant_id, limit=10)
+            messages = await service.list_messages(thread_id, limit=10)
+            tools_version = await service.ar.get_tools_version(assistant_id)
+            await session.rollback()
+            return threads.threads, messages.messages, tools_version
+    finally:
+        async with Session() as session, session.begin():
+            await session.execute(
+                text("DELETE FROM assistant WHERE id = :id"),
+                {"id": assistant_id},
+            )
+
+
+@pytest.mark.parametrize("soft_delete", [True, False])
+def test_deleted_assistant_is_not_listed(soft_delete):
+    threads, messages, tools_version = asyncio.run(
+        list_after_delete(soft_delete)
+    )
+
+    assert threads == []
+    assert messages == []
+    assert tools_version is None
@@ -9,6 +9,7 @@ from uaissistant.assistant.schemas import (
     LLMSource,
     Role,
     AssistantMessageType,
+    StreamEventType,
 )
 
 
@@ -25,6 +26,18 @@ class AssistantMessageItem:
     role: Role
     created_at: datetime
     value: AssistantMessageValue
+    # shown to the user only, never sent back to the LLM as history
+    # (outputs of the tool-functions, notices of the backend)
+    internal: bool = False
+
+
+# For streaming responses
+@dataclass
+class StreamEvent:
+    type: StreamEventType
+    data: dict[str, Any] | None = None
+    # set for `message` events: a complete item that is saved to the DB
+    item: AssistantMessageItem | None = None
 
 
 # For GET requests
@@ -33,14 +46,20 @@ class ListAssistantsResult:
     assistants: List[AssistantEntity]
 
 
+# `before`/`after`: cursors of the previous (older) and next (newer) pages,
+# None if there is no such page
 @dataclass
 class ListThreadsResult:
     threads: List[AssistantThreadEntity]
+    before: str | None = None
+    after: str | None = None
 
 
 @dataclass
 class ListMessageResult:
     messages: List[AssistantMessageItem]
+    before: str | None = None
+    after: str | None = None
 
 
 # For POST requests
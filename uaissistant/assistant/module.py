@@ -1,23 +1,57 @@
 from typing import Dict
+from environs import Env
+from uaissistant.assistant.purger import AssistantPurger, IAssistantPurger
 from uaissistant.assistant.repository import (
     AssistantRepository,
     IAssistantRepository,
 )
 from uaissistant.assistant.service import AssistantService, IAssistantService
+from uaissistant.assistant.unit_of_work import IUnitOfWork, UnitOfWork
 from uaissistant.llms.llm import LLM
-from injector import Module, provider
-from sqlalchemy.orm import Session
+from uaissistant.tool_factory.registry import IToolRegistry
+from fastapi_injector import request_scope
+from injector import Module, provider, singleton
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 
 class AssistantModule(Module):
     @provider
     def provide_assistant_service(
-        self, ar: IAssistantRepository, llms: Dict[str, LLM]
+        self,
+        ar: IAssistantRepository,
+        llms: Dict[str, LLM],
+        registry: IToolRegistry,
+        uow: IUnitOfWork,
+        env: Env,
     ) -> IAssistantService:
-        return AssistantService(ar=ar, llms=llms)
+        return AssistantService(
+            ar=ar,
+            llms=llms,
+            registry=registry,
+            uow=uow,
+            soft_delete=env.bool("ASSISTANT_SOFT_DELETE", default=True),
+        )
 
     @provider
     def provide_assistant_repository(
-        self, session: Session
+        self, session: AsyncSession
     ) -> IAssistantRepository:
         return AssistantRepository(session=session)
+
+    # one per request: the deferred writes of the LLM providers are
+    # committed by the write of the service
+    @provider
+    @request_scope
+    def provide_unit_of_work(self, session: AsyncSession) -> IUnitOfWork:
+        return UnitOfWork(session=session)
+
+    @provider
+    @singleton
+    def provide_assistant_purger(
+        self, Session: async_sessionmaker[AsyncSession], env: Env
+    ) -> IAssistantPurger:
+        return AssistantPurger(
+            Session=Session,
+            batch_size=env.int("PURGE_BATCH_SIZE", default=1000),
+            interval=env.float("PURGE_INTERVAL", default=60),
+        )
@@ -0,0 +1,25 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+
+
+@dataclass
+class Cursor:
+    # keyset position of a row: the lists are ordered by (created_at, id)
+    created_at: datetime
+    id: str
+
+
+def encode_cursor(created_at: datetime, id: str) -> str:
+    data = json.dumps([created_at.isoformat(), id]).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    # raises ValueError for a malformed cursor
+    try:
+        created_at, id = json.loads(base64.urlsafe_b64decode(cursor))
+        return Cursor(created_at=datetime.fromisoformat(created_at), id=id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+from typing import TYPE_CHECKING, Protocol
+
+from pydantic.dataclasses import dataclass
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.sql import text
+
+# the rows of the soft-deleted threads and assistants (deleted_at set by the
+# API) are removed in batches, one short transaction per batch, so a large
+# history never holds its locks for long. Children go first: when the
+# thread and assistant rows are deleted, there is almost nothing left for
+# the ON DELETE CASCADE constraints to remove.
+PURGE_MESSAGES_QUERY = """
+DELETE FROM assistant_message WHERE id IN (
+    SELECT id FROM assistant_message
+    WHERE thread_id IN (
+        SELECT id FROM assistant_thread WHERE deleted_at IS NOT NULL
+        UNION
+        SELECT t.id FROM assistant_thread t JOIN assistant a ON a.id = t.assistant_id
+        WHERE a.deleted_at IS NOT NULL
+    )
+    LIMIT :batch_size
+)
+"""
+
+PURGE_THREADS_QUERY = """
+DELETE FROM assistant_thread WHERE id IN (
+    SELECT id FROM assistant_thread
+    WHERE deleted_at IS NOT NULL
+        OR assistant_id IN (SELECT id FROM assistant WHERE deleted_at IS NOT NULL)
+    LIMIT :batch_size
+)
+"""
+
+PURGE_ASSISTANTS_QUERY = """
+DELETE FROM assistant WHERE id IN (
+    SELECT id FROM assistant WHERE deleted_at IS NOT NULL LIMIT :batch_size
+)
+"""
+
+
+@dataclass
+class PurgeStats:
+    runs: int
+    failures: int
+    batches: int
+    messages: int
+    threads: int
+    assistants: int
+    last_duration: float
+
+
+class IAssistantPurger(Protocol):
+    async def purge(self) -> None:
+        pass
+
+    async def run(self) -> None:
+        pass
+
+    def stats(self) -> PurgeStats:
+        pass
+
+
+class AssistantPurger:
+    """Background removal of the soft-deleted threads and assistants."""
+
+    def __init__(
+        self,
+        Session: async_sessionmaker[AsyncSession],
+        batch_size: int,
+        interval: float,
+    ) -> None:
+        self.Session = Session
+        self.batch_size = batch_size
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._failures = 0
+        self._batches = 0
+        self._messages = 0
+        self._threads = 0
+        self._assistants = 0
+        self._last_duration = 0.0
+
+    async def purge(self) -> None:
+        start = time.perf_counter()
+        messages = await self._delete_in_batches(PURGE_MESSAGES_QUERY)
+        threads = await self._delete_in_batches(PURGE_THREADS_QUERY)
+        assistants = await self._delete_in_batches(PURGE_ASSISTANTS_QUERY)
+
+        with self._lock:
+            self._runs += 1
+            self._messages += messages
+            self._threads += threads
+            self._assistants += assistants
+            self._last_duration = time.perf_counter() - start
+
+    async def run(self) -> None:
+        # purge loop of the API process, until the task is cancelled
+        while True:
+            try:
+                await self.purge()
+            except Exception as e:
+                with self._lock:
+                    self._failures += 1
+                print(f"[{self.__class__.__name__}: run] {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> PurgeStats:
+        with self._lock:
+            return PurgeStats(
+                runs=self._runs,
+                failures=self._failures,
+                batches=self._batches,
+                messages=self._messages,
+                threads=self._threads,
+                assistants=self._assistants,
+                last_duration=self._last_duration,
+            )
+
+    async def _delete_in_batches(self, query: str) -> int:
+        deleted = 0
+        while True:
+            async with self.Session() as session, session.begin():
+                result = await session.execute(
+                    text(query), {"batch_size": self.batch_size}
+                )
+            if result.rowcount > 0:
+                with self._lock:
+                    self._batches += 1
+            deleted += result.rowcount
+            if result.rowcount < self.batch_size:
+                return deleted
+
+
+if TYPE_CHECKING:
+    _: type[IAssistantPurger] = AssistantPurger
@@ -1,15 +1,31 @@
-import json
 from typing import TYPE_CHECKING, List, Protocol
 
 from uaissistant.assistant.models import AssistantMessageItem
+from uaissistant.assistant.pagination import Cursor
 from uaissistant.assistant.schemas import (
     AssistantEntity,
     AssistantMessageEntity,
     AssistantThreadEntity,
 )
-from sqlalchemy.orm import Session
+from uaissistant.connections.dbx import json_dumps
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import text
 
+MESSAGE_COLUMNS = [
+    "id",
+    "assistant_id",
+    "thread_id",
+    "created_at",
+    "role",
+    "type",
+    "content",
+    "is_internal",
+]
+# messages whose encoded contents reach this size are written with COPY:
+# faster for large payloads, but it costs one more round trip (the column
+# types of the table) than the single INSERT of the smaller turns
+COPY_MIN_BYTES = 2**20
+
 
 class IAssistantRepository(Protocol):
     # READ
@@ -19,13 +35,24 @@ class IAssistantRepository(Protocol):
     async def list_assistants(self) -> List[AssistantEntity]:
         pass
 
+    async def get_tools_version(self, assistant_id: str) -> str | None:
+        pass
+
     async def list_threads(
-        self, assistant_id: str
+        self,
+        assistant_id: str,
+        limit: int,
+        before: Cursor | None = None,
+        after: Cursor | None = None,
     ) -> List[AssistantThreadEntity]:
         pass
 
     async def list_messages(
-        self, thread_id: str
+        self,
+        thread_id: str,
+        limit: int,
+        before: Cursor | None = None,
+        after: Cursor | None = None,
     ) -> List[AssistantMessageEntity]:
         pass
 
@@ -59,6 +86,16 @@ class IAssistantRepository(Protocol):
     ) -> AssistantThreadEntity | None:
         pass
 
+    async def soft_delete_assistant(
+        self, assistant_id: str
+    ) -> AssistantEntity | None:
+        pass
+
+    async def soft_delete_thread(
+        self, thread_id: str
+    ) -> AssistantThreadEntity | None:
+        pass
+
     # UPDATE
     async def update_assistant(
         self,
@@ -74,55 +111,99 @@ class IAssistantRepository(Protocol):
     ) -> AssistantThreadEntity | None:
         pass
 
+    async def update_tools_version(
+        self, assistant_id: str, tools_version: str
+    ) -> None:
+        pass
+
 
 class AssistantRepository:
-    def __init__(self, session: Session) -> None:
+    # the statements run in the transaction of the request session, which
+    # is ended by the unit of work of the service (see unit_of_work.py)
+    def __init__(self, session: AsyncSession) -> None:
         self.session = session
 
     # READ
+    # the soft-deleted rows (deleted_at set, see purger.py) and the threads
+    # and messages below them are not listed until they are purged
     async def get_assistant(self, assistant_id: str) -> AssistantEntity | None:
-        query = "SELECT id, name, created_at, instructions, model, llmsource FROM assistant WHERE id = :assistant_id"
+        query = "SELECT id, name, created_at, instructions, model, llmsource FROM assistant WHERE id = :assistant_id AND deleted_at IS NULL"
         parameters = {"assistant_id": assistant_id}
 
-        row = self.session.execute(text(query), parameters).fetchone()
-        self.session.commit()
+        row = (await self.session.execute(text(query), parameters)).fetchone()
 
         return AssistantEntity(*row) if row is not None else None
 
     async def list_assistants(self) -> List[AssistantEntity]:
-        query = "SELECT id, name, created_at, instructions, model, llmsource FROM assistant"
+        query = "SELECT id, name, created_at, instructions, model, llmsource FROM assistant WHERE deleted_at IS NULL"
 
-        rows = self.session.execute(text(query)).fetchall()
-        self.session.commit()
+        rows = (await self.session.execute(text(query))).fetchall()
 
         return [AssistantEntity(*row) for row in rows]
 
+    async def get_tools_version(self, assistant_id: str) -> str | None:
+        query = "SELECT tools_version FROM assistant WHERE id = :assistant_id AND deleted_at IS NULL"
+        parameters = {"assistant_id": assistant_id}
+
+        row = (await self.session.execute(text(query), parameters)).fetchone()
+
+        return row[0] if row is not None else None
+
     async def list_threads(
-        self, assistant_id: str
+        self,
+        assistant_id: str,
+        limit: int,
+        before: Cursor | None = None,
+        after: Cursor | None = None,
     ) -> List[AssistantThreadEntity]:
-        query = "SELECT id, name, assistant_id, created_at FROM assistant_thread WHERE assistant_id = :assistant_id"
-        parameters = {"assistant_id": assistant_id}
+        query = f"""
+        SELECT id, name, assistant_id, created_at FROM assistant_thread
+        WHERE assistant_id = :assistant_id AND deleted_at IS NULL
+            AND EXISTS (
+                SELECT 1 FROM assistant WHERE id = :assistant_id AND deleted_at IS NULL
+            ) {self._keyset(before, after)}
+        """
+        parameters = {
+            "assistant_id": assistant_id,
+            **self._keyset_parameters(limit, before, after),
+        }
 
-        rows = self.session.execute(text(query), parameters).fetchall()
-        self.session.commit()
+        rows = (await self.session.execute(text(query), parameters)).fetchall()
 
-        return [AssistantThreadEntity(*row) for row in rows]
+        return [
+            AssistantThreadEntity(*row)
+            for row in self._ascending(rows, before, after)
+        ]
 
     async def list_messages(
-        self, thread_id: str
+        self,
+        thread_id: str,
+        limit: int,
+        before: Cursor | None = None,
+        after: Cursor | None = None,
     ) -> List[AssistantMessageEntity]:
-        query = """
+        query = f"""
         SELECT id, assistant_id, thread_id, created_at, role, type, content FROM assistant_message
         WHERE thread_id = :thread_id
+            AND EXISTS (
+                SELECT 1 FROM assistant_thread
+                JOIN assistant ON assistant.id = assistant_thread.assistant_id
+                WHERE assistant_thread.id = :thread_id
+                    AND assistant_thread.deleted_at IS NULL
+                    AND assistant.deleted_at IS NULL
+            ) {self._keyset(before, after)}
         """
         parameters = {
             "thread_id": thread_id,
+            **self._keyset_parameters(limit, before, after),
         }
 
-        rows = self.session.execute(text(query), parameters).fetchall()
-        self.session.commit()
+        rows = (await self.session.execute(text(query), parameters)).fetchall()
 
-        return [AssistantMessageEntity(*row) for row in rows]
+        return [
+            AssistantMessageEntity(*row)
+            for row in self._ascending(rows, before, after)
+        ]
 
     # CREATE
     async def create_assistant(
@@ -142,8 +223,7 @@ class AssistantRepository:
             "llmsource": assistant.llmsource.value,
         }
 
-        row = self.session.execute(text(query), parameters).fetchone()
-        self.session.commit()
+        row = (await self.session.execute(text(query), parameters)).fetchone()
 
         return AssistantEntity(*row) if row is not None else None
 
@@ -162,8 +242,7 @@ class AssistantRepository:
             "created_at": thread.created_at,
         }
 
-        row = self.session.execute(text(query), parameters).fetchone()
-        self.session.commit()
+        row = (await self.session.execute(text(query), parameters)).fetchone()
 
         return AssistantThreadEntity(*row) if row is not None else None
 
@@ -173,87 +252,154 @@ class AssistantRepository:
         thread_id: str,
         messages: List[AssistantMessageItem],
     ) -> List[AssistantMessageEntity]:
-        query = """
-            INSERT INTO assistant_message (id, assistant_id, thread_id, created_at, role, type, content)
-            VALUES (:id, :assistant_id, :thread_id, :created_at, :role, :type, :content)
-        """
-        values = [
-            {
-                "id": message.id,
-                "assistant_id": assistant_id,
-                "thread_id": thread_id,
-                "created_at": message.created_at,
-                "role": message.role.value,
-                "type": message.value.type.value,
-                "content": json.dumps(message.value.content),
-            }
+        if len(messages) == 0:
+            return []
+
+        rows = [
+            (
+                message.id,
+                assistant_id,
+                thread_id,
+                message.created_at,
+                message.role.value,
+                message.value.type.value,
+                json_dumps(message.value.content),
+                message.internal,
+            )
+            for message in messages
+        ]
+        if sum(len(row[6]) for row in rows) >= COPY_MIN_BYTES:
+            await self._copy_messages(rows)
+        else:
+            await self._insert_messages(assistant_id, thread_id, rows)
+
+        # the rows are the messages as given: nothing to read back
+        return [
+            AssistantMessageEntity(
+                id=message.id,
+                assistant_id=assistant_id,
+                thread_id=thread_id,
+                created_at=message.created_at,
+                role=message.role,
+                type=message.value.type,
+                content=message.value.content,
+            )
             for message in messages
         ]
 
-        with self.session.begin():
-            self.session.execute(text(query), values)
-        self.session.commit()
+    async def _insert_messages(
+        self, assistant_id: str, thread_id: str, rows: List[tuple]
+    ) -> None:
+        # one statement for all the messages: the columns are sent as arrays
+        # and unnested, so the statement (and the plan prepared by asyncpg)
+        # is the same whatever the number of messages
+        query = """
+            INSERT INTO assistant_message (id, assistant_id, thread_id, created_at, role, type, content, is_internal)
+            SELECT id, :assistant_id, :thread_id, created_at, role, type, CAST(content AS JSONB), is_internal
+            FROM unnest(
+                CAST(:ids AS TEXT[]),
+                CAST(:created_ats AS TIMESTAMP[]),
+                CAST(:roles AS TEXT[]),
+                CAST(:types AS TEXT[]),
+                CAST(:contents AS TEXT[]),
+                CAST(:internals AS BOOLEAN[])
+            ) AS message (id, created_at, role, type, content, is_internal)
+        """
+        ids, _, _, created_ats, roles, types, contents, internals = zip(*rows)
+        parameters = {
+            "assistant_id": assistant_id,
+            "thread_id": thread_id,
+            "ids": list(ids),
+            "created_ats": list(created_ats),
+            "roles": list(roles),
+            "types": list(types),
+            "contents": list(contents),
+            "internals": list(internals),
+        }
 
-        return
+        await self.session.execute(text(query), parameters)
+
+    async def _copy_messages(self, rows: List[tuple]) -> None:
+        # large tool outputs: COPY streams the rows in the binary format,
+        # in the transaction of the session
+        connection = await self.session.connection()
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+        if not driver_connection.is_in_transaction():
+            # the asyncpg adapter begins its transaction with the first
+            # statement, and the COPY goes around it: as the first write of a
+            # unit of work, it would commit on its own
+            await self.session.execute(text("SELECT 1"))
+        await driver_connection.copy_records_to_table(
+            "assistant_message", records=rows, columns=MESSAGE_COLUMNS
+        )
 
     # DELETE
+    # one statement each: the threads, messages and summaries are removed
+    # by the ON DELETE CASCADE foreign keys (postgres/init.sql)
     async def delete_assistant(
         self, assistant_id: str
     ) -> AssistantEntity | None:
-        ### DELETE MESSAGES ###
         query = """
-            DELETE FROM assistant_message WHERE assistant_id = :assistant_id
+            DELETE FROM assistant WHERE id = :assistant_id
+            RETURNING id, name, created_at, instructions, model, llmsource
         """
         parameters = {
             "assistant_id": assistant_id,
         }
-        self.session.execute(text(query), parameters)
 
-        ### DELETE THREADS ###
+        row = (await self.session.execute(text(query), parameters)).fetchone()
+
+        return AssistantEntity(*row) if row is not None else None
+
+    async def delete_thread(
+        self, thread_id: str
+    ) -> AssistantThreadEntity | None:
         query = """
-            DELETE FROM assistant_thread WHERE assistant_id = :assistant_id
+            DELETE FROM assistant_thread WHERE id = :thread_id
+            RETURNING id, name, assistant_id, created_at
         """
         parameters = {
-            "assistant_id": assistant_id,
+            "thread_id": thread_id,
         }
-        self.session.execute(text(query), parameters)
 
-        ### DELETE ASSISTANT ###
+        row = (await self.session.execute(text(query), parameters)).fetchone()
+
+        return AssistantThreadEntity(*row) if row is not None else None
+
+    # soft delete: the rows are only marked, and purged in the background
+    # (see purger.py)
+    async def soft_delete_assistant(
+        self, assistant_id: str
+    ) -> AssistantEntity | None:
         query = """
-            DELETE FROM assistant WHERE id = :assistant_id
+            UPDATE assistant
+            SET deleted_at = CURRENT_TIMESTAMP
+            WHERE id = :assistant_id AND deleted_at IS NULL
             RETURNING id, name, created_at, instructions, model, llmsource
         """
         parameters = {
             "assistant_id": assistant_id,
         }
-        row = self.session.execute(text(query), parameters).fetchone()
-        self.session.commit()
+
+        row = (await self.session.execute(text(query), parameters)).fetchone()
 
         return AssistantEntity(*row) if row is not None else None
 
-    async def delete_thread(
+    async def soft_delete_thread(
         self, thread_id: str
     ) -> AssistantThreadEntity | None:
-        ### DELETE MESSAGES ###
         query = """
-            DELETE FROM assistant_message WHERE thread_id = :thread_id
-        """
-        parameters = {
-            "thread_id": thread_id,
-        }
-        self.session.execute(text(query), parameters)
-
-        ### DELETE THREAD ###
-        query = """
-            DELETE FROM assistant_thread WHERE id = :thread_id
+            UPDATE assistant_thread
+            SET deleted_at = CURRENT_TIMESTAMP
+            WHERE id = :thread_id AND deleted_at IS NULL
             RETURNING id, name, assistant_id, created_at
         """
         parameters = {
             "thread_id": thread_id,
         }
 
-        row = self.session.execute(text(query), parameters).fetchone()
-        self.session.commit()
+        row = (await self.session.execute(text(query), parameters)).fetchone()
 
         return AssistantThreadEntity(*row) if row is not None else None
 
@@ -268,7 +414,7 @@ class AssistantRepository:
         query = """
             UPDATE assistant
             SET name = :name, instructions = :instructions, model = :model
-            WHERE id = :assistant_id
+            WHERE id = :assistant_id AND deleted_at IS NULL
             RETURNING id, name, created_at, instructions, model, llmsource
         """
         parameters = {
@@ -278,8 +424,7 @@ class AssistantRepository:
             "model": model,
         }
 
-        row = self.session.execute(text(query), parameters).fetchone()
-        self.session.commit()
+        row = (await self.session.execute(text(query), parameters)).fetchone()
 
         return AssistantEntity(*row) if row is not None else None
 
@@ -289,7 +434,7 @@ class AssistantRepository:
         query = """
             UPDATE assistant_thread
             SET name = :name
-            WHERE id = :thread_id
+            WHERE id = :thread_id AND deleted_at IS NULL
             RETURNING id, name, assistant_id, created_at
         """
         parameters = {
@@ -297,11 +442,65 @@ class AssistantRepository:
             "name": name,
         }
 
-        row = self.session.execute(text(query), parameters).fetchone()
-        self.session.commit()
+        row = (await self.session.execute(text(query), parameters)).fetchone()
 
         return AssistantThreadEntity(*row) if row is not None else None
 
+    async def update_tools_version(
+        self, assistant_id: str, tools_version: str
+    ) -> None:
+        query = """
+            UPDATE assistant
+            SET tools_version = :tools_version
+            WHERE id = :assistant_id
+        """
+        parameters = {
+            "assistant_id": assistant_id,
+            "tools_version": tools_version,
+        }
+
+        await self.session.execute(text(query), parameters)
+
+    # PAGINATION
+    # keyset pagination on (created_at, id), served by the
+    # (parent id, created_at, id) indexes. Without `after`, the page is the
+    # latest one (before `before`), read backwards from the end of the index.
+    def _keyset(self, before: Cursor | None, after: Cursor | None) -> str:
+        conditions = ""
+        if before is not None:
+            conditions += (
+                " AND (created_at, id) < (:before_created_at, :before_id)"
+            )
+        if after is not None:
+            conditions += (
+                " AND (created_at, id) > (:after_created_at, :after_id)"
+            )
+
+        order = "ASC" if after is not None and before is None else "DESC"
+        return (
+            f"{conditions} ORDER BY created_at {order}, id {order} LIMIT :limit"
+        )
+
+    def _keyset_parameters(
+        self, limit: int, before: Cursor | None, after: Cursor | None
+    ) -> dict:
+        parameters = {"limit": limit}
+        if before is not None:
+            parameters["before_created_at"] = before.created_at
+            parameters["before_id"] = before.id
+        if after is not None:
+            parameters["after_created_at"] = after.created_at
+            parameters["after_id"] = after.id
+        return parameters
+
+    def _ascending(
+        self, rows: List, before: Cursor | None, after: Cursor | None
+    ) -> List:
+        # pages are always returned in chronological order
+        if after is not None and before is None:
+            return list(rows)
+        return list(reversed(rows))
+
 
 if TYPE_CHECKING:
     _: type[IAssistantRepository] = AssistantRepository
@@ -39,6 +39,17 @@ class AssistantMessageType(Enum):
     File = "file"
 
 
+class StreamEventType(Enum):
+    Thread = "thread"
+    Message = "message"
+    TextDelta = "text_delta"
+    ToolCallStarted = "tool_call_started"
+    ToolCallFinished = "tool_call_finished"
+    Usage = "usage"
+    Done = "done"
+    Error = "error"
+
+
 @dataclass
 class AssistantMessageEntity:
     id: str
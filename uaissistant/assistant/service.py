@@ -1,4 +1,12 @@
-from typing import TYPE_CHECKING, Dict, List, Protocol
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    Dict,
+    List,
+    Protocol,
+    Tuple,
+    TypeVar,
+)
 
 from uaissistant.assistant.models import (
     AssistantMessageItem,
@@ -14,29 +22,52 @@ from uaissistant.assistant.models import (
     ListThreadsResult,
     SendMessageParams,
     SendMessageResult,
+    StreamEvent,
     UpdateAssistantParams,
     UpdateAssistantResult,
     UpdateThreadParams,
     UpdateThreadResult,
 )
+from uaissistant.assistant.pagination import (
+    Cursor,
+    decode_cursor,
+    encode_cursor,
+)
 from uaissistant.assistant.repository import IAssistantRepository
 from uaissistant.assistant.schemas import (
     AssistantEntity,
     AssistantMessageEntity,
     AssistantThreadEntity,
     LLMSource,
+    StreamEventType,
 )
+from uaissistant.assistant.unit_of_work import IUnitOfWork
 from uaissistant.llms import LLM
+from uaissistant.tool_factory.registry import IToolRegistry
+
+T = TypeVar("T", AssistantThreadEntity, AssistantMessageEntity)
 
 
 class IAssistantService(Protocol):
     async def list_assistants(self) -> ListAssistantsResult:
         pass
 
-    async def list_threads(self, assistant_id: str) -> ListThreadsResult:
+    async def list_threads(
+        self,
+        assistant_id: str,
+        limit: int,
+        before: str | None = None,
+        after: str | None = None,
+    ) -> ListThreadsResult:
         pass
 
-    async def list_messages(self, thread_id: str) -> ListMessageResult:
+    async def list_messages(
+        self,
+        thread_id: str,
+        limit: int,
+        before: str | None = None,
+        after: str | None = None,
+    ) -> ListMessageResult:
         pass
 
     async def create_assistant(
@@ -57,6 +88,19 @@ class IAssistantService(Protocol):
     ) -> SendMessageResult:
         pass
 
+    def stream_thread(
+        self, assistant_id: str, params: CreateThreadParams
+    ) -> AsyncIterator[StreamEvent]:
+        pass
+
+    def stream_thread_message(
+        self,
+        assistant_id: str,
+        thread_id: str,
+        params: SendMessageParams,
+    ) -> AsyncIterator[StreamEvent]:
+        pass
+
     async def delete_assistant(
         self, assistant_id: str
     ) -> DeleteAssistantResult:
@@ -79,26 +123,61 @@ class IAssistantService(Protocol):
 
 
 class AssistantService:
-    def __init__(self, ar: IAssistantRepository, llms: Dict[str, LLM]) -> None:
+    def __init__(
+        self,
+        ar: IAssistantRepository,
+        llms: Dict[str, LLM],
+        registry: IToolRegistry,
+        uow: IUnitOfWork,
+        soft_delete: bool,
+    ) -> None:
         self.ar = ar
         self.llms = llms
+        self.registry = registry
+        self.uow = uow
+        # soft delete: the assistants and threads are only marked as deleted,
+        # and their rows are purged in the background (see purger.py)
+        self.soft_delete = soft_delete
 
     async def list_assistants(self) -> ListAssistantsResult:
-        assistants: List[
-            AssistantThreadEntity
-        ] = await self.ar.list_assistants()
+        async with self.uow.read():
+            assistants: List[
+                AssistantThreadEntity
+            ] = await self.ar.list_assistants()
         return ListAssistantsResult(assistants=assistants)
 
-    async def list_threads(self, assistant_id: str) -> ListThreadsResult:
-        threads: List[AssistantThreadEntity] = await self.ar.list_threads(
-            assistant_id
-        )
-        return ListThreadsResult(threads=threads)
+    async def list_threads(
+        self,
+        assistant_id: str,
+        limit: int,
+        before: str | None = None,
+        after: str | None = None,
+    ) -> ListThreadsResult:
+        before_cursor, after_cursor = self._decode_cursors(before, after)
+        # one extra row tells whether there is a further page
+        async with self.uow.read():
+            threads: List[AssistantThreadEntity] = await self.ar.list_threads(
+                assistant_id, limit + 1, before_cursor, after_cursor
+            )
+        threads, before, after = self._paginate(threads, limit, before, after)
+        return ListThreadsResult(threads=threads, before=before, after=after)
 
-    async def list_messages(self, thread_id: str) -> ListMessageResult:
-        entities: List[AssistantMessageEntity] = await self.ar.list_messages(
-            thread_id
-        )
+    async def list_messages(
+        self,
+        thread_id: str,
+        limit: int,
+        before: str | None = None,
+        after: str | None = None,
+    ) -> ListMessageResult:
+        before_cursor, after_cursor = self._decode_cursors(before, after)
+        # one extra row tells whether there is a further page
+        async with self.uow.read():
+            entities: List[
+                AssistantMessageEntity
+            ] = await self.ar.list_messages(
+                thread_id, limit + 1, before_cursor, after_cursor
+            )
+        entities, before, after = self._paginate(entities, limit, before, after)
         messages = [
             AssistantMessageItem(
                 id=entity.id,
@@ -111,7 +190,7 @@ class AssistantService:
             for entity in entities
         ]
 
-        return ListMessageResult(messages=messages)
+        return ListMessageResult(messages=messages, before=before, after=after)
 
     async def create_assistant(
         self, params: CreateAssistantParams
@@ -126,10 +205,14 @@ class AssistantService:
             model=params.model,
         )
 
-        # add assistant info to db
-        assistant: AssistantEntity | None = await self.ar.create_assistant(
-            llm_assistant
-        )
+        # add assistant info to db; tool-functions are pushed on creation
+        async with self.uow.write():
+            assistant: AssistantEntity | None = await self.ar.create_assistant(
+                llm_assistant
+            )
+            await self.ar.update_tools_version(
+                llm_assistant.id, self.registry.version
+            )
 
         return CreateAssistantResult(assistant=assistant)
 
@@ -140,15 +223,15 @@ class AssistantService:
         default_name = "New chat"
 
         # get current assistant info
-        assistant: AssistantEntity | None = await self.ar.get_assistant(
-            assistant_id
-        )
+        assistant, tools_version = await self._get_turn_assistant(assistant_id)
 
         # extract current LLM
         current_llm = self.llms[LLMSource(assistant.llmsource)]
 
-        # TODO: remove later. Update tool-functions only when they are updated.
-        await current_llm.update_tools(assistant.id)
+        # push tool-functions only if they changed since the last sync
+        tools_synced = await self._sync_tools(
+            current_llm, assistant.id, tools_version
+        )
 
         # create thread on LLM side
         llm_thread: AssistantThreadEntity = await current_llm.create_thread(
@@ -167,17 +250,17 @@ class AssistantService:
         # extract LLM responses
         responses = user_message_and_responses[1:]
 
-        # save thread in the DB
-        thread_entity: AssistantThreadEntity | None = (
-            await self.ar.create_thread(llm_thread)
-        )
-
-        # save messages to the DB
-        await self.ar.add_messages(
-            assistant_id=assistant.id,
-            thread_id=thread_entity.id,
-            messages=user_message_and_responses,
-        )
+        # save thread and messages to the DB, in one transaction
+        async with self.uow.write():
+            thread_entity: (
+                AssistantThreadEntity | None
+            ) = await self.ar.create_thread(llm_thread)
+            await self.ar.add_messages(
+                assistant_id=assistant.id,
+                thread_id=thread_entity.id,
+                messages=user_message_and_responses,
+            )
+            await self._save_tools_version(assistant.id, tools_synced)
 
         return (
             CreateThreadResult(
@@ -195,16 +278,15 @@ class AssistantService:
         params: SendMessageParams,
     ) -> SendMessageResult:
         # get current assistant info
-        assistant: AssistantEntity | None = await self.ar.get_assistant(
-            assistant_id
-        )
+        assistant, tools_version = await self._get_turn_assistant(assistant_id)
 
         # extract current LLM
         current_llm = self.llms[LLMSource(assistant.llmsource)]
 
-        # TODO: remove for not updating tool-functions frequently.
-        # update LLM tool_functions
-        await current_llm.update_tools(assistant.id)
+        # push tool-functions only if they changed since the last sync
+        tools_synced = await self._sync_tools(
+            current_llm, assistant.id, tools_version
+        )
 
         # send message and get the result from LLM
         user_message_and_responses: List[
@@ -218,21 +300,118 @@ class AssistantService:
         # extract LLM responses
         responses = user_message_and_responses[1:]
 
-        # save messages to the DB
-        await self.ar.add_messages(
-            assistant_id=assistant.id,
-            thread_id=thread_id,
-            messages=user_message_and_responses,
-        )
+        # save messages to the DB, in one transaction
+        async with self.uow.write():
+            await self.ar.add_messages(
+                assistant_id=assistant.id,
+                thread_id=thread_id,
+                messages=user_message_and_responses,
+            )
+            await self._save_tools_version(assistant.id, tools_synced)
 
         return SendMessageResult(thread_id=thread_id, messages=responses)
 
-    async def delete_assistant(self, assistant_id: str) -> AssistantEntity:
+    async def stream_thread(
+        self, assistant_id: str, params: CreateThreadParams
+    ) -> AsyncIterator[StreamEvent]:
+        # default chat/thread name
+        default_name = "New chat"
+
+        # get current assistant info
+        assistant, tools_version = await self._get_turn_assistant(assistant_id)
+
+        # extract current LLM
+        current_llm = self.llms[LLMSource(assistant.llmsource)]
+
+        # push tool-functions only if they changed since the last sync
+        tools_synced = await self._sync_tools(
+            current_llm, assistant.id, tools_version
+        )
+
+        # create thread on LLM side
+        llm_thread: AssistantThreadEntity = await current_llm.create_thread(
+            assistant_id=assistant.id, default_name=default_name
+        )
+        yield StreamEvent(
+            type=StreamEventType.Thread,
+            data={"thread_id": llm_thread.id, "name": llm_thread.name},
+        )
+
+        # send message and stream the result from LLM
+        user_message_and_responses: List[AssistantMessageItem] = []
+        async for event in current_llm.stream_user_message(
+            assistant=assistant,
+            thread_id=llm_thread.id,
+            message=params.message,
+        ):
+            if event.item is not None:
+                user_message_and_responses.append(event.item)
+            yield event
+
+        # save thread and messages to the DB, in one transaction
+        async with self.uow.write():
+            thread_entity: (
+                AssistantThreadEntity | None
+            ) = await self.ar.create_thread(llm_thread)
+            await self.ar.add_messages(
+                assistant_id=assistant.id,
+                thread_id=thread_entity.id,
+                messages=user_message_and_responses,
+            )
+            await self._save_tools_version(assistant.id, tools_synced)
+
+        yield StreamEvent(
+            type=StreamEventType.Done, data={"thread_id": thread_entity.id}
+        )
+
+    async def stream_thread_message(
+        self,
+        assistant_id: str,
+        thread_id: str,
+        params: SendMessageParams,
+    ) -> AsyncIterator[StreamEvent]:
         # get current assistant info
-        assistant: AssistantEntity | None = await self.ar.get_assistant(
-            assistant_id
+        assistant, tools_version = await self._get_turn_assistant(assistant_id)
+
+        # extract current LLM
+        current_llm = self.llms[LLMSource(assistant.llmsource)]
+
+        # push tool-functions only if they changed since the last sync
+        tools_synced = await self._sync_tools(
+            current_llm, assistant.id, tools_version
+        )
+
+        # send message and stream the result from LLM
+        user_message_and_responses: List[AssistantMessageItem] = []
+        async for event in current_llm.stream_user_message(
+            assistant=assistant,
+            thread_id=thread_id,
+            message=params.message,
+        ):
+            if event.item is not None:
+                user_message_and_responses.append(event.item)
+            yield event
+
+        # save messages to the DB once the turn is complete
+        async with self.uow.write():
+            await self.ar.add_messages(
+                assistant_id=assistant.id,
+                thread_id=thread_id,
+                messages=user_message_and_responses,
+            )
+            await self._save_tools_version(assistant.id, tools_synced)
+
+        yield StreamEvent(
+            type=StreamEventType.Done, data={"thread_id": thread_id}
         )
 
+    async def delete_assistant(self, assistant_id: str) -> AssistantEntity:
+        # get current assistant info
+        async with self.uow.read():
+            assistant: AssistantEntity | None = await self.ar.get_assistant(
+                assistant_id
+            )
+
         # extract current LLM
         current_llm = self.llms[LLMSource(assistant.llmsource)]
 
@@ -240,9 +419,12 @@ class AssistantService:
         await current_llm.delete_assistant(assistant_id)
 
         # Delete from DB
-        deleted_assistant: AssistantEntity | None = (
-            await self.ar.delete_assistant(assistant_id)
-        )
+        async with self.uow.write():
+            deleted_assistant: AssistantEntity | None = (
+                await self.ar.soft_delete_assistant(assistant_id)
+                if self.soft_delete
+                else await self.ar.delete_assistant(assistant_id)
+            )
 
         return DeleteAssistantResult(assistant=deleted_assistant)
 
@@ -250,9 +432,10 @@ class AssistantService:
         self, assistant_id: str, thread_id: str
     ) -> AssistantThreadEntity:
         # get current assistant info
-        assistant: AssistantEntity | None = await self.ar.get_assistant(
-            assistant_id
-        )
+        async with self.uow.read():
+            assistant: AssistantEntity | None = await self.ar.get_assistant(
+                assistant_id
+            )
 
         # extract current LLM
         current_llm = self.llms[LLMSource(assistant.llmsource)]
@@ -261,9 +444,12 @@ class AssistantService:
         await current_llm.delete_thread(thread_id)
 
         # Delete from DB
-        deleted_thread: AssistantThreadEntity = await self.ar.delete_thread(
-            thread_id
-        )
+        async with self.uow.write():
+            deleted_thread: AssistantThreadEntity = (
+                await self.ar.soft_delete_thread(thread_id)
+                if self.soft_delete
+                else await self.ar.delete_thread(thread_id)
+            )
 
         return DeleteThreadResult(thread=deleted_thread)
 
@@ -271,9 +457,10 @@ class AssistantService:
         self, assistant_id: str, params: UpdateAssistantParams
     ) -> AssistantEntity:
         # get current assistant info
-        assistant: AssistantEntity | None = await self.ar.get_assistant(
-            assistant_id
-        )
+        async with self.uow.read():
+            assistant: AssistantEntity | None = await self.ar.get_assistant(
+                assistant_id
+            )
 
         # extract current LLM
         current_llm = self.llms[LLMSource(assistant.llmsource)]
@@ -286,13 +473,17 @@ class AssistantService:
             model=params.model,
         )
 
-        # update in DB
-        assistant_entity: AssistantEntity = await self.ar.update_assistant(
-            assistant_id,
-            name=params.name,
-            instructions=params.instructions,
-            model=params.model,
-        )
+        # update in DB; tool-functions are pushed with the update
+        async with self.uow.write():
+            assistant_entity: AssistantEntity = await self.ar.update_assistant(
+                assistant_id,
+                name=params.name,
+                instructions=params.instructions,
+                model=params.model,
+            )
+            await self.ar.update_tools_version(
+                assistant_id, self.registry.version
+            )
 
         return UpdateAssistantResult(assistant=assistant_entity)
 
@@ -300,12 +491,80 @@ class AssistantService:
         self, thread_id: str, params: UpdateThreadParams
     ) -> AssistantThreadEntity:
         # update name in DB
-        thread_entity: AssistantThreadEntity = await self.ar.update_thread(
-            thread_id, params.name
-        )
+        async with self.uow.write():
+            thread_entity: AssistantThreadEntity = await self.ar.update_thread(
+                thread_id, params.name
+            )
 
         return UpdateThreadResult(thread=thread_entity)
 
+    async def _get_turn_assistant(
+        self, assistant_id: str
+    ) -> Tuple[AssistantEntity | None, str | None]:
+        # the reads of a chat turn, in one read-only transaction that is
+        # ended before the LLM is called
+        async with self.uow.read():
+            assistant = await self.ar.get_assistant(assistant_id)
+            tools_version = await self.ar.get_tools_version(assistant_id)
+
+        return assistant, tools_version
+
+    async def _sync_tools(
+        self, current_llm: LLM, assistant_id: str, tools_version: str | None
+    ) -> bool:
+        # the registry version is a hash of the tool-function schemas; the
+        # last pushed one is stored per assistant, so the provider is only
+        # called after the tool-functions have changed
+        if tools_version == self.registry.version:
+            return False
+
+        await current_llm.update_tools(assistant_id)
+        return True
+
+    async def _save_tools_version(
+        self, assistant_id: str, tools_synced: bool
+    ) -> None:
+        # stored with the writes of the turn: if the turn fails, the
+        # tool-functions are pushed again on the next one
+        if tools_synced:
+            await self.ar.update_tools_version(
+                assistant_id, self.registry.version
+            )
+
+    def _decode_cursors(
+        self, before: str | None, after: str | None
+    ) -> Tuple[Cursor | None, Cursor | None]:
+        return (
+            decode_cursor(before) if before is not None else None,
+            decode_cursor(after) if after is not None else None,
+        )
+
+    def _paginate(
+        self,
+        entities: List[T],
+        limit: int,
+        before: str | None,
+        after: str | None,
+    ) -> Tuple[List[T], str | None, str | None]:
+        # `entities` are in chronological order and hold up to limit + 1 rows:
+        # the extra one lies beyond the page, on the side being walked to
+        # (older rows by default, newer ones when only `after` is given)
+        forward = after is not None and before is None
+        has_more = len(entities) > limit
+        if has_more:
+            entities = entities[:limit] if forward else entities[1:]
+        if not entities:
+            return entities, None, None
+
+        first, last = entities[0], entities[-1]
+        older = has_more or forward
+        newer = has_more if forward else before is not None
+        return (
+            entities,
+            encode_cursor(first.created_at, first.id) if older else None,
+            encode_cursor(last.created_at, last.id) if newer else None,
+        )
+
 
 if TYPE_CHECKING:
     _: type[IAssistantService] = AssistantService
@@ -0,0 +1,69 @@
+from contextlib import asynccontextmanager
+from typing import (
+    TYPE_CHECKING,
+    AsyncContextManager,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    List,
+    Protocol,
+)
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class IUnitOfWork(Protocol):
+    def read(self) -> AsyncContextManager[None]:
+        pass
+
+    def write(self) -> AsyncContextManager[None]:
+        pass
+
+    def defer(self, write: Callable[[], Awaitable[None]]) -> None:
+        pass
+
+
+class UnitOfWork:
+    """Transaction boundaries of the assistant service.
+
+    The repositories only execute statements on the request session; the
+    service groups them: `write()` commits all the writes of an operation
+    (e.g. the thread and the messages of a chat turn) at once, and rolls
+    them back on error. `read()` ends with a rollback: nothing is written,
+    so there is no commit to flush, and the connection is returned to the
+    pool before the (long) LLM calls.
+
+    Writes prepared during an operation but owned by its outcome (e.g. the
+    history summary of a chat turn) are deferred: they run in the next
+    `write()`, and are discarded with the request if there is none.
+    """
+
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+        self._deferred: List[Callable[[], Awaitable[None]]] = []
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[None]:
+        try:
+            yield
+        finally:
+            await self.session.rollback()
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[None]:
+        deferred, self._deferred = self._deferred, []
+        try:
+            for write in deferred:
+                await write()
+            yield
+        except BaseException:
+            await self.session.rollback()
+            raise
+        await self.session.commit()
+
+    def defer(self, write: Callable[[], Awaitable[None]]) -> None:
+        self._deferred.append(write)
+
+
+if TYPE_CHECKING:
+    _: type[IUnitOfWork] = UnitOfWork
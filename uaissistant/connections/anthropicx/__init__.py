@@ -1,6 +1,6 @@
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
 from environs import Env
-from injector import Module, provider
+from injector import Module, provider, singleton
 from pydantic.dataclasses import dataclass
 
 
@@ -17,5 +17,6 @@ class AnthropicModule(Module):
         )
 
     @provider
-    def provide_anthropic(self, conf: AnthropicConfig) -> Anthropic:
-        return Anthropic(api_key=conf.api_key)
+    @singleton
+    def provide_anthropic(self, conf: AnthropicConfig) -> AsyncAnthropic:
+        return AsyncAnthropic(api_key=conf.api_key)
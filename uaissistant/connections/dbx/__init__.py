@@ -1,9 +1,21 @@
+import threading
+import time
+from typing import Any, Dict
+
+import orjson
 from environs import Env
 from fastapi_injector import request_scope
-from injector import Module, provider
+from injector import Module, provider, singleton
 from pydantic.dataclasses import dataclass
-from sqlalchemy import Engine, create_engine
+from sqlalchemy import Engine, create_engine, exc
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 
 @dataclass
@@ -13,13 +25,182 @@ class DbConfig:
     user: str
     password: str
     database: str
+    # connection pool of each engine: at most pool_size + max_overflow
+    # connections, a checkout waits pool_timeout seconds for a free one
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    # test the connections on checkout, and replace them after pool_recycle
+    # seconds (before the server or a proxy drops them)
+    pool_pre_ping: bool = True
+    pool_recycle: int = 1800
+    # server-side limit of one statement in seconds, 0 for none
+    statement_timeout: float = 120
 
     def connection_string(self) -> str:
         return f"postgresql://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}"
 
+    def async_connection_string(self) -> str:
+        return f"postgresql+asyncpg://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}"
+
+    def pool_arguments(self) -> Dict[str, Any]:
+        return dict(
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_timeout=self.pool_timeout,
+            pool_pre_ping=self.pool_pre_ping,
+            pool_recycle=self.pool_recycle,
+        )
+
+
+@dataclass
+class PoolStats:
+    size: int
+    checked_out: int
+    # connections open above pool_size
+    overflow: int
+    checked_in: int
+    checkouts: int
+    # checkouts that gave up after pool_timeout
+    timeouts: int
+    # time spent waiting for (or opening) a connection at checkout
+    wait_seconds_total: float
+    wait_seconds_max: float
+
+
+class PoolMetrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_seconds_total = 0.0
+        self._wait_seconds_max = 0.0
+
+    def record_checkout(self, wait_seconds: float) -> None:
+        with self._lock:
+            self._checkouts += 1
+            self._wait_seconds_total += wait_seconds
+            self._wait_seconds_max = max(self._wait_seconds_max, wait_seconds)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self._timeouts += 1
+
+    def stats(self, pool: QueuePool) -> PoolStats:
+        with self._lock:
+            return PoolStats(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                overflow=max(pool.overflow(), 0),
+                checked_in=pool.checkedin(),
+                checkouts=self._checkouts,
+                timeouts=self._timeouts,
+                wait_seconds_total=self._wait_seconds_total,
+                wait_seconds_max=self._wait_seconds_max,
+            )
+
+
+class MeteredPool:
+    # queue pool mixin timing the checkouts. The metrics are set on the pool
+    # after the engine is created and carried over when it is recreated
+    # (engine.dispose()).
+    metrics: PoolMetrics | None = None
+
+    def _do_get(self):
+        start = time.monotonic()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.record_timeout()
+            raise
+        if self.metrics is not None:
+            self.metrics.record_checkout(time.monotonic() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class MeteredQueuePool(MeteredPool, QueuePool):
+    pass
+
+
+class MeteredAsyncAdaptedQueuePool(MeteredPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def create_db_engine(conf: DbConfig) -> Engine:
+    # sync engine (psycopg2): the statement timeout is a libpq option
+    connect_args = {}
+    if conf.statement_timeout > 0:
+        connect_args["options"] = (
+            f"-c statement_timeout={int(conf.statement_timeout * 1000)}"
+        )
+    engine = create_engine(
+        conf.connection_string(),
+        poolclass=MeteredQueuePool,
+        connect_args=connect_args,
+        **conf.pool_arguments(),
+    )
+    engine.pool.metrics = PoolMetrics()
+    return engine
+
+
+def json_dumps(value: Any) -> str:
+    # JSON values of the queries: orjson is several times faster than the
+    # json module, and asyncpg takes the json parameters as str
+    return orjson.dumps(
+        value, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    ).decode()
+
+
+def create_async_db_engine(conf: DbConfig) -> AsyncEngine:
+    # async engine (asyncpg): the statement timeout is a server setting
+    connect_args = {}
+    if conf.statement_timeout > 0:
+        connect_args["server_settings"] = {
+            "statement_timeout": str(int(conf.statement_timeout * 1000))
+        }
+    engine = create_async_engine(
+        conf.async_connection_string(),
+        poolclass=MeteredAsyncAdaptedQueuePool,
+        connect_args=connect_args,
+        json_serializer=json_dumps,
+        json_deserializer=orjson.loads,
+        **conf.pool_arguments(),
+    )
+    engine.sync_engine.pool.metrics = PoolMetrics()
+    return engine
+
+
+def pool_stats(engine: Engine) -> PoolStats:
+    return engine.pool.metrics.stats(engine.pool)
+
+
+@dataclass
+class DbPoolStats:
+    sync_engine: PoolStats
+    async_engine: PoolStats
+
+
+class DbPoolMetrics:
+    def __init__(self, engine: Engine, async_engine: AsyncEngine) -> None:
+        self.engine = engine
+        self.async_engine = async_engine
+
+    def stats(self) -> DbPoolStats:
+        return DbPoolStats(
+            sync_engine=pool_stats(self.engine),
+            async_engine=pool_stats(self.async_engine.sync_engine),
+        )
+
 
 class DbModule(Module):
     @provider
+    @singleton
     def provide_db_config(self, env: Env) -> DbConfig:
         return DbConfig(
             host=env.str("DB_HOST"),
@@ -27,13 +208,23 @@ class DbModule(Module):
             user=env.str("DB_USER"),
             password=env.str("DB_PASSWORD"),
             database=env.str("DB_DATABASE"),
+            pool_size=env.int("DB_POOL_SIZE", default=5),
+            max_overflow=env.int("DB_MAX_OVERFLOW", default=10),
+            pool_timeout=env.float("DB_POOL_TIMEOUT", default=30),
+            pool_pre_ping=env.bool("DB_POOL_PRE_PING", default=True),
+            pool_recycle=env.int("DB_POOL_RECYCLE", default=1800),
+            statement_timeout=env.float("DB_STATEMENT_TIMEOUT", default=120),
         )
 
+    # sync engine: used by the tool-functions, which run outside of the event loop.
+    # One engine (and pool) per process.
     @provider
+    @singleton
     def provide_engine(self, conf: DbConfig) -> Engine:
-        return create_engine(conf.connection_string())
+        return create_db_engine(conf)
 
     @provider
+    @singleton
     def provide_sessionmaker(self, engine: Engine) -> sessionmaker[Session]:
         return sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -41,3 +232,32 @@ class DbModule(Module):
     @request_scope
     def provide_session(self, Session: sessionmaker[Session]) -> Session:
         return Session()
+
+    # async engine: used by the repositories awaited from the API handlers
+    @provider
+    @singleton
+    def provide_async_engine(self, conf: DbConfig) -> AsyncEngine:
+        return create_async_db_engine(conf)
+
+    @provider
+    @singleton
+    def provide_async_sessionmaker(
+        self, engine: AsyncEngine
+    ) -> async_sessionmaker[AsyncSession]:
+        return async_sessionmaker(
+            bind=engine, autoflush=False, expire_on_commit=False
+        )
+
+    @provider
+    @request_scope
+    def provide_async_session(
+        self, AsyncSession: async_sessionmaker[AsyncSession]
+    ) -> AsyncSession:
+        return AsyncSession()
+
+    @provider
+    @singleton
+    def provide_db_pool_metrics(
+        self, engine: Engine, async_engine: AsyncEngine
+    ) -> DbPoolMetrics:
+        return DbPoolMetrics(engine=engine, async_engine=async_engine)
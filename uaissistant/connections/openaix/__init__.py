@@ -1,6 +1,6 @@
 from environs import Env
-from injector import Module, provider
-from openai import OpenAI
+from injector import Module, provider, singleton
+from openai import AsyncOpenAI
 from pydantic.dataclasses import dataclass
 
 
@@ -17,5 +17,6 @@ class OpenAiModule(Module):
         )
 
     @provider
-    def provide_openai(self, conf: OpenAiConfig) -> OpenAI:
-        return OpenAI(api_key=conf.api_key)
+    @singleton
+    def provide_openai(self, conf: OpenAiConfig) -> AsyncOpenAI:
+        return AsyncOpenAI(api_key=conf.api_key)
@@ -0,0 +1 @@
+from .module import FiguresModule  # noqa: F401
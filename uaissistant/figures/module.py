@@ -0,0 +1,12 @@
+from environs import Env
+from injector import Module, provider, singleton
+from uaissistant.figures.store import FileFigureStore, IFigureStore
+
+
+class FiguresModule(Module):
+    @provider
+    @singleton
+    def provide_figure_store(self, env: Env) -> IFigureStore:
+        return FileFigureStore(
+            root=env.path("FIGURE_STORE_PATH", default="data/figures")
+        )
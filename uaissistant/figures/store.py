@@ -0,0 +1,63 @@
+import gzip
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, Protocol
+
+
+class IFigureStore(Protocol):
+    def put(self, raw_json: str) -> str:
+        pass
+
+    def get(self, figure_id: str) -> bytes | None:
+        pass
+
+
+class FileFigureStore:
+    """Content-addressed store of plotly figures on the local filesystem.
+
+    A figure is stored gzip-compressed under the sha256 of its JSON, so the
+    id doubles as an ETag and a stored figure never changes.
+    """
+
+    FIGURE_ID = re.compile(r"^[0-9a-f]{64}$")
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def put(self, raw_json: str) -> str:
+        data = raw_json.encode("utf-8")
+        figure_id = hashlib.sha256(data).hexdigest()
+
+        path = self._path(figure_id)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # write to a temporary file and rename: readers never see a
+            # partially written figure
+            with tempfile.NamedTemporaryFile(
+                dir=path.parent, delete=False
+            ) as file:
+                file.write(gzip.compress(data, compresslevel=6, mtime=0))
+            os.replace(file.name, path)
+
+        return figure_id
+
+    def get(self, figure_id: str) -> bytes | None:
+        # returns the gzip-compressed JSON
+        if not self.FIGURE_ID.match(figure_id):
+            return None
+
+        try:
+            return self._path(figure_id).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _path(self, figure_id: str) -> Path:
+        return self.root / figure_id[:2] / f"{figure_id}.json.gz"
+
+
+if TYPE_CHECKING:
+    _: type[IFigureStore] = FileFigureStore
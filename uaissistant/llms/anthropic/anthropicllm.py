@@ -1,39 +1,64 @@
 import re
 import uuid
 from datetime import datetime
-from typing import List
+from functools import partial
+from typing import AsyncIterator, List
 
-from anthropic import Anthropic
-from anthropic.resources.beta.tools.messages import ToolsBetaMessage
+from anthropic import AsyncAnthropic
+from anthropic.types import Message
 from uaissistant.assistant.models import (
     AssistantMessageItem,
     AssistantMessageValue,
+    StreamEvent,
 )
 from uaissistant.assistant.schemas import (
     AssistantEntity,
-    AssistantMessageEntity,
     AssistantMessageType,
     AssistantThreadEntity,
     LLMSource,
     Role,
+    StreamEventType,
 )
 from uaissistant.llms.anthropic.repository import IAnthropicRepository
-from uaissistant.llms.llm import LLM
-from uaissistant.tool_factory import tools
-from uaissistant.tool_factory.service import IToolFactoryService
-from uaissistant.tool_factory.schemas.tool_function import ToolFunction
+from uaissistant.llms.anthropic.usage import (
+    AnthropicUsage,
+    AnthropicUsageMetrics,
+)
+from uaissistant.llms.history.manager import (
+    SUMMARY_INSTRUCTIONS,
+    IHistoryManager,
+    with_summary,
+)
+from uaissistant.llms.history.schemas import HistoryWindow
+from uaissistant.llms.llm import LLM, collect_message_items
+from uaissistant.tool_factory.executor import IToolExecutor
+from uaissistant.tool_factory.registry import IToolRegistry
+from uaissistant.tool_factory.schemas.tool_call import ToolCall
+
+
+# output cap of the history summaries
+SUMMARY_MAX_TOKENS = 512
+# prompt-caching breakpoint (5 minutes time-to-live, refreshed on every hit);
+# at most 4 per request: tools, system prompt and the last message
+CACHE_CONTROL = {"type": "ephemeral"}
 
 
 class AnthropicLLM(LLM):
     def __init__(
         self,
-        client: Anthropic,
-        tool_factory: IToolFactoryService,
+        client: AsyncAnthropic,
+        tool_executor: IToolExecutor,
+        registry: IToolRegistry,
         anthropic_repository: IAnthropicRepository,
+        history: IHistoryManager,
+        usage_metrics: AnthropicUsageMetrics,
     ):
         self.client = client
-        self.tool_factory = tool_factory
+        self.tool_executor = tool_executor
+        self.registry = registry
         self.anthropic_repository = anthropic_repository
+        self.history = history
+        self.usage_metrics = usage_metrics
 
         self.temperature = 0.1
         self.API_TIMEOUT = 10
@@ -98,8 +123,20 @@ class AnthropicLLM(LLM):
         thread_id: str,
         message: str,
     ) -> List[AssistantMessageItem]:
+        return await collect_message_items(
+            self.stream_user_message(
+                assistant=assistant, thread_id=thread_id, message=message
+            )
+        )
+
+    async def stream_user_message(
+        self,
+        assistant: AssistantEntity,
+        thread_id: str,
+        message: str,
+    ) -> AsyncIterator[StreamEvent]:
         print(
-            f"[{self.__class__.__name__}: process_user_message] you message '{message}' is being sent to the assistant"
+            f"[{self.__class__.__name__}: stream_user_message] you message '{message}' is being sent to the assistant"
         )
         # define user message
         user_message = AssistantMessageItem(
@@ -110,17 +147,20 @@ class AnthropicLLM(LLM):
                 type=AssistantMessageType.Text, content={"message": message}
             ),
         )
+        yield StreamEvent(type=StreamEventType.Message, item=user_message)
 
-        # prepare messages for Anthropic
-        old_messages: List[
-            AssistantMessageEntity
-        ] = await self.anthropic_repository.list_old_messages(
-            thread_id=thread_id
+        # prepare messages for Anthropic: the part of the history that fits
+        # the token budget, the older messages being summarised
+        window: HistoryWindow = await self.history.get_window(
+            thread_id=thread_id,
+            model=assistant.model,
+            list_messages=self.anthropic_repository.list_old_messages,
+            summarize=partial(self._summarize, assistant.model),
         )
+        system = with_summary(assistant.instructions, window.summary)
         messages_for_anthropic = [
             {"role": m.role, "content": m.content["message"]}
-            for m in old_messages
-            if "message" in m.content
+            for m in window.messages
         ]
 
         # add new user message
@@ -130,19 +170,17 @@ class AnthropicLLM(LLM):
         }
         messages_for_anthropic.append(user_message_for_anthropic)
 
-        # output list
-        frontend_outputs: List[AssistantMessageItem] = []
-
         # initial anthropic call
-        response: ToolsBetaMessage = self.client.beta.tools.messages.create(
-            model=assistant.model,
-            max_tokens=1024,
-            tools=self.anthropic_tools,
-            system=assistant.instructions,
-            messages=messages_for_anthropic,
-            temperature=self.temperature,
-            timeout=self.API_TIMEOUT,
-        )
+        usage = AnthropicUsage()
+        response: Message | None = None
+        async for event in self._stream_response(
+            assistant, system, messages_for_anthropic
+        ):
+            if isinstance(event, Message):
+                response = event
+            else:
+                yield event
+        usage.add(response.usage)
 
         messages_for_anthropic.append(
             {"role": response.role, "content": response.content}
@@ -151,48 +189,64 @@ class AnthropicLLM(LLM):
 
         while response.stop_reason == "tool_use":
             print(
-                f"[{self.__class__.__name__}: process_user_message] current response {response.content}"
+                f"[{self.__class__.__name__}: stream_user_message] current response {response.content}"
             )
-            for content in response.content:
+            # the tool-functions of one step run concurrently
+            tool_calls = [
+                ToolCall(id=content.id, name=content.name, args=content.input)
+                for content in response.content
                 # skip text and other non-tool-function content
-                if content.type != "tool_use":
-                    continue
-
+                if content.type == "tool_use"
+            ]
+            for tool_call in tool_calls:
                 print(
-                    f"[{self.__class__.__name__}: process_user_message] executing function {content.name}, with args: {content.input}"
+                    f"[{self.__class__.__name__}: stream_user_message] executing function {tool_call.name}, with args: {tool_call.args}"
+                )
+                yield StreamEvent(
+                    type=StreamEventType.ToolCallStarted,
+                    data={
+                        "id": tool_call.id,
+                        "name": tool_call.name,
+                        "args": tool_call.args,
+                    },
                 )
 
-                # call tool_function
-                (
-                    output,
-                    new_frontend_contents,
-                ) = self.tool_factory.call_tool_function(
-                    function_name=content.name, args=content.input
+            # results come in the order of the calls
+            async for result in self.tool_executor.run(tool_calls):
+                yield StreamEvent(
+                    type=StreamEventType.ToolCallFinished,
+                    data={
+                        "id": result.call.id,
+                        "name": result.call.name,
+                        "output": result.output,
+                    },
                 )
+                for frontend_content in result.frontend_contents:
+                    yield StreamEvent(
+                        type=StreamEventType.Message, item=frontend_content
+                    )
 
                 # save the resulted ouputs
                 tool_outputs.append(
                     {
                         "type": "tool_result",
-                        "tool_use_id": content.id,  # from the API response
-                        "content": output,  # from running your tool
+                        "tool_use_id": result.call.id,  # from the API response
+                        "content": result.output,  # from running your tool
                     }
                 )
-                frontend_outputs.extend(new_frontend_contents)
 
             # submit the results of the tool-functions
             messages_for_anthropic.append(
                 {"role": "user", "content": tool_outputs}
             )
-            response: ToolsBetaMessage = self.client.beta.tools.messages.create(
-                model=assistant.model,
-                max_tokens=1024,
-                tools=self.anthropic_tools,
-                system=assistant.instructions,
-                messages=messages_for_anthropic,
-                temperature=self.temperature,
-                timeout=self.API_TIMEOUT,
-            )
+            async for event in self._stream_response(
+                assistant, system, messages_for_anthropic
+            ):
+                if isinstance(event, Message):
+                    response = event
+                else:
+                    yield event
+            usage.add(response.usage)
             messages_for_anthropic.append(
                 {"role": response.role, "content": response.content}
             )
@@ -201,10 +255,10 @@ class AnthropicLLM(LLM):
         # prepare the final message from the LLM
         # for each message, create a value wrapper.
         for content in response.content:
-            if content.text is not None:
+            if content.type == "text":
                 initial_claude_response = content.text
                 print(
-                    f"[{self.__class__.__name__}: process_user_message] initial claude response: {initial_claude_response}"
+                    f"[{self.__class__.__name__}: stream_user_message] initial claude response: {initial_claude_response}"
                 )
                 content_message = self._remove_thinking_tags(
                     initial_claude_response
@@ -218,24 +272,112 @@ class AnthropicLLM(LLM):
                         content={"message": content_message},
                     ),
                 )
-                frontend_outputs.append(assistant_frontent_output)
-
-        responses = frontend_outputs
+                yield StreamEvent(
+                    type=StreamEventType.Message,
+                    item=assistant_frontent_output,
+                )
 
-        user_message_and_responses = [user_message] + responses
-        return user_message_and_responses
+        # token usage of the turn, over all the calls of the tool-use loop
+        self.usage_metrics.record_turn(usage)
+        print(
+            f"[{self.__class__.__name__}: stream_user_message] usage: {usage}"
+        )
+        yield StreamEvent(type=StreamEventType.Usage, data=vars(usage))
 
     async def update_tools(self, assistant_id: str):
         self._self_update_tools()
 
     def _self_update_tools(self):
-        # gather tools information
-        self.anthropic_tools = []
-        for function_name in [
-            attr for attr in dir(tools) if callable(getattr(tools, attr))
-        ]:
-            function: ToolFunction = getattr(tools, function_name)
-            self.anthropic_tools.append(function.anthropicschema)
+        # gather tools information; the breakpoint on the last tool caches
+        # all the tool definitions
+        self.anthropic_tools = self.registry.anthropic_schemas()
+        if self.anthropic_tools:
+            self.anthropic_tools[-1] = {
+                **self.anthropic_tools[-1],
+                "cache_control": CACHE_CONTROL,
+            }
+
+    async def _stream_response(
+        self,
+        assistant: AssistantEntity,
+        system: str,
+        messages_for_anthropic: List[dict],
+    ) -> AsyncIterator[StreamEvent | Message]:
+        # streams text deltas of one model call and yields the final Message last.
+        # Prompt caching: the tools, the system prompt and the messages up to
+        # the last one are the same prefix on every call of the tool-use loop
+        # (and across turns until the history window moves), so they are
+        # marked as cacheable and read from the cache by the next calls
+        async with self.client.messages.stream(
+            model=assistant.model,
+            max_tokens=1024,
+            tools=self.anthropic_tools,
+            system=[
+                {"type": "text", "text": system, "cache_control": CACHE_CONTROL}
+            ],
+            messages=self._with_cache_breakpoint(messages_for_anthropic),
+            temperature=self.temperature,
+            timeout=self.API_TIMEOUT,
+        ) as stream:
+            streamed_text = ""
+            sent_length = 0
+            async for text in stream.text_stream:
+                streamed_text += text
+                visible_text = self._visible_streamed_text(streamed_text)
+                if len(visible_text) > sent_length:
+                    yield StreamEvent(
+                        type=StreamEventType.TextDelta,
+                        data={"text": visible_text[sent_length:]},
+                    )
+                    sent_length = len(visible_text)
+            yield await stream.get_final_message()
+
+    def _with_cache_breakpoint(self, messages: List[dict]) -> List[dict]:
+        # copy of the messages with a cache breakpoint on the last content
+        # block: the cache is looked up at the earlier block boundaries too,
+        # so the prefix written by the previous call is read back
+        if not messages:
+            return messages
+        last = messages[-1]
+        content = last["content"]
+        if isinstance(content, str):
+            blocks = [{"type": "text", "text": content}]
+        else:
+            blocks = [
+                block
+                if isinstance(block, dict)
+                else block.model_dump(exclude_none=True)
+                for block in content
+            ]
+        blocks[-1] = {**blocks[-1], "cache_control": CACHE_CONTROL}
+        return messages[:-1] + [{**last, "content": blocks}]
+
+    async def _summarize(self, model: str, prompt: str) -> str:
+        response: Message = await self.client.messages.create(
+            model=model,
+            max_tokens=SUMMARY_MAX_TOKENS,
+            system=SUMMARY_INSTRUCTIONS,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            timeout=self.API_TIMEOUT,
+        )
+        return "".join(
+            content.text
+            for content in response.content
+            if content.type == "text"
+        )
+
+    def _visible_streamed_text(self, text):
+        # hide closed and still open <thinking> blocks from the streamed text
+        text = re.sub(r"<thinking>.*?</thinking>\s*", "", text, flags=re.DOTALL)
+        opened = text.find("<thinking>")
+        if opened != -1:
+            return text[:opened]
+        # hold back a tail that may be the beginning of a <thinking> tag
+        for i in range(min(len(text), len("<thinking>") - 1), 0, -1):
+            if "<thinking>".startswith(text[-i:]):
+                return text[:-i]
+        return text
 
     def _remove_thinking_tags(self, text):
         # Define the pattern to match <thinking> ... </thinking> tags
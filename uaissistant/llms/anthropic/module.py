@@ -1,15 +1,21 @@
-from injector import Module, provider
-from sqlalchemy.orm import Session
+from injector import Module, provider, singleton
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from uaissistant.llms.anthropic.repository import (
     AnthropicRepository,
     IAnthropicRepository,
 )
+from uaissistant.llms.anthropic.usage import AnthropicUsageMetrics
 
 
 class AnthropicLLMModule(Module):
     @provider
     def provide_anthropicllm_repository(
-        self, session: Session
+        self, session: AsyncSession
     ) -> IAnthropicRepository:
         return AnthropicRepository(session=session)
+
+    @provider
+    @singleton
+    def provide_anthropic_usage_metrics(self) -> AnthropicUsageMetrics:
+        return AnthropicUsageMetrics()
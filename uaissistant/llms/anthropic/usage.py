@@ -0,0 +1,59 @@
+import threading
+
+from anthropic.types import Usage
+from pydantic.dataclasses import dataclass
+
+
+@dataclass
+class AnthropicUsage:
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    # prompt caching: tokens written to and read from the cache, billed
+    # respectively above and well below the uncached input tokens
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+
+    def add(self, usage: Usage) -> None:
+        self.calls += 1
+        self.input_tokens += usage.input_tokens
+        self.output_tokens += usage.output_tokens
+        self.cache_creation_input_tokens += (
+            usage.cache_creation_input_tokens or 0
+        )
+        self.cache_read_input_tokens += usage.cache_read_input_tokens or 0
+
+
+@dataclass
+class AnthropicUsageStats:
+    turns: int
+    total: AnthropicUsage
+    last_turn: AnthropicUsage
+
+
+class AnthropicUsageMetrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._turns = 0
+        self._total = AnthropicUsage()
+        self._last_turn = AnthropicUsage()
+
+    def record_turn(self, usage: AnthropicUsage) -> None:
+        with self._lock:
+            self._turns += 1
+            self._total.calls += usage.calls
+            self._total.input_tokens += usage.input_tokens
+            self._total.output_tokens += usage.output_tokens
+            self._total.cache_creation_input_tokens += (
+                usage.cache_creation_input_tokens
+            )
+            self._total.cache_read_input_tokens += usage.cache_read_input_tokens
+            self._last_turn = usage
+
+    def stats(self) -> AnthropicUsageStats:
+        with self._lock:
+            return AnthropicUsageStats(
+                turns=self._turns,
+                total=AnthropicUsage(**vars(self._total)),
+                last_turn=AnthropicUsage(**vars(self._last_turn)),
+            )
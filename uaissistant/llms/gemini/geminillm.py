@@ -1,43 +1,59 @@
 import uuid
 import textwrap
 from datetime import datetime
-from typing import List
+from typing import AsyncIterator, List
 from environs import Env
 import google.generativeai as genai
 import google.ai.generativelanguage as glm
-from google.generativeai.types import GenerateContentResponse
+from google.generativeai.types import AsyncGenerateContentResponse
 
 from uaissistant.assistant.models import (
     AssistantMessageItem,
     AssistantMessageValue,
+    StreamEvent,
 )
 from uaissistant.assistant.schemas import (
     AssistantEntity,
-    AssistantMessageEntity,
     AssistantMessageType,
     AssistantThreadEntity,
     LLMSource,
     Role,
+    StreamEventType,
 )
 from uaissistant.llms.gemini.repository import IGeminiRepository
-from uaissistant.llms.llm import LLM
-from uaissistant.tool_factory import tools
-from uaissistant.tool_factory.service import IToolFactoryService
-from uaissistant.tool_factory.schemas.tool_function import ToolFunction
+from uaissistant.llms.history.manager import (
+    SUMMARY_INSTRUCTIONS,
+    IHistoryManager,
+    with_summary,
+)
+from uaissistant.llms.history.schemas import HistoryWindow
+from uaissistant.llms.llm import LLM, collect_message_items
+from uaissistant.tool_factory.executor import IToolExecutor
+from uaissistant.tool_factory.registry import IToolRegistry
+from uaissistant.tool_factory.schemas.tool_call import ToolCall
 
 from IPython.display import Markdown
 
 
+GEMINI_MODEL = "gemini-1.5-pro-latest"
+# output cap of the history summaries
+SUMMARY_MAX_TOKENS = 512
+
+
 class GeminiLLM(LLM):
     def __init__(
         self,
         env: Env,
-        tool_factory: IToolFactoryService,
+        tool_executor: IToolExecutor,
+        registry: IToolRegistry,
         gemini_repository: IGeminiRepository,
+        history: IHistoryManager,
     ):
         genai.configure(api_key=env.str("GEMINI_API_KEY"))
-        self.tool_factory = tool_factory
+        self.tool_executor = tool_executor
+        self.registry = registry
         self.gemini_repository = gemini_repository
+        self.history = history
 
         self._self_update_tools()
 
@@ -99,8 +115,20 @@ class GeminiLLM(LLM):
         thread_id: str,
         message: str,
     ) -> List[AssistantMessageItem]:
+        return await collect_message_items(
+            self.stream_user_message(
+                assistant=assistant, thread_id=thread_id, message=message
+            )
+        )
+
+    async def stream_user_message(
+        self,
+        assistant: AssistantEntity,
+        thread_id: str,
+        message: str,
+    ) -> AsyncIterator[StreamEvent]:
         print(
-            f"[{self.__class__.__name__}: process_user_message] you message '{message}' is being sent to the assistant"
+            f"[{self.__class__.__name__}: stream_user_message] you message '{message}' is being sent to the assistant"
         )
         # define user message
         user_message = AssistantMessageItem(
@@ -111,18 +139,22 @@ class GeminiLLM(LLM):
                 type=AssistantMessageType.Text, content={"message": message}
             ),
         )
+        yield StreamEvent(type=StreamEventType.Message, item=user_message)
 
-        # prepare messages for Gemini
-        old_messages: List[
-            AssistantMessageEntity
-        ] = await self.gemini_repository.list_old_messages(thread_id=thread_id)
+        # prepare messages for Gemini: the part of the history that fits
+        # the token budget, the older messages being summarised
+        window: HistoryWindow = await self.history.get_window(
+            thread_id=thread_id,
+            model=GEMINI_MODEL,
+            list_messages=self.gemini_repository.list_old_messages,
+            summarize=self._summarize,
+        )
         messages_for_gemini = [
             {
                 "role": "model" if m.role == "assistant" else m.role,
                 "parts": [m.content["message"]],
             }
-            for m in old_messages
-            if "message" in m.content
+            for m in window.messages
         ]
 
         # add new user message
@@ -132,20 +164,21 @@ class GeminiLLM(LLM):
         }
         messages_for_gemini.append(user_message_for_gemini)
 
-        # output list
-        frontend_outputs: List[AssistantMessageItem] = []
-
         # use gemini model
         model = genai.GenerativeModel(
-            model_name="gemini-1.5-pro-latest",  # assistant.model,
+            model_name=GEMINI_MODEL,  # assistant.model,
             tools=glm.Tool(function_declarations=self.gemini_tools),
-            system_instruction=assistant.instructions,
+            system_instruction=with_summary(
+                assistant.instructions, window.summary
+            ),
         )
 
         # initial gemini call
-        response: GenerateContentResponse = model.generate_content(
-            messages_for_gemini
+        response: AsyncGenerateContentResponse = (
+            await model.generate_content_async(messages_for_gemini, stream=True)
         )
+        async for event in self._stream_text_deltas(response):
+            yield event
         # role = response._result.candidates[0].content.role
         parts = response._result.candidates[0].content.parts
         messages_for_gemini.append(
@@ -158,42 +191,64 @@ class GeminiLLM(LLM):
 
         while any("function_call" in part for part in parts):
             print(
-                f"[{self.__class__.__name__}: process_user_message] current response {parts}"
+                f"[{self.__class__.__name__}: stream_user_message] current response {parts}"
             )
-            for part in parts:
+            # the tool-functions of one step run concurrently
+            tool_calls = [
+                ToolCall(
+                    id=None,
+                    name=part.function_call.name,
+                    # plain python values: the args are sent to the workers
+                    args=type(part.function_call).to_dict(part.function_call)[
+                        "args"
+                    ],
+                )
+                for part in parts
                 # skip text and other non-tool-function content
-                if "function_call" not in part:
-                    continue
-
+                if "function_call" in part
+            ]
+            for tool_call in tool_calls:
                 print(
-                    f"[{self.__class__.__name__}: process_user_message] executing function {part.function_call.name}, with args: {dict(part.function_call.args)}"
+                    f"[{self.__class__.__name__}: stream_user_message] executing function {tool_call.name}, with args: {tool_call.args}"
+                )
+                yield StreamEvent(
+                    type=StreamEventType.ToolCallStarted,
+                    data={
+                        "name": tool_call.name,
+                        "args": tool_call.args,
+                    },
                 )
 
-                # call tool_function
-                (
-                    output,
-                    new_frontend_contents,
-                ) = self.tool_factory.call_tool_function(
-                    function_name=part.function_call.name,
-                    args=part.function_call.args,
+            # results come in the order of the calls
+            async for result in self.tool_executor.run(tool_calls):
+                yield StreamEvent(
+                    type=StreamEventType.ToolCallFinished,
+                    data={"name": result.call.name, "output": result.output},
                 )
+                for frontend_content in result.frontend_contents:
+                    yield StreamEvent(
+                        type=StreamEventType.Message, item=frontend_content
+                    )
 
                 # save the resulted ouputs
                 tool_outputs.append(
                     glm.Part(
                         function_response=glm.FunctionResponse(
-                            name=part.function_call.name,
-                            response={"result": output},
+                            name=result.call.name,
+                            response={"result": result.output},
                         )
                     )
                 )
-                frontend_outputs.extend(new_frontend_contents)
 
             # submit the results of the tool-functions
             messages_for_gemini.append({"role": "user", "parts": tool_outputs})
-            response: GenerateContentResponse = model.generate_content(
-                messages_for_gemini
+            response: AsyncGenerateContentResponse = (
+                await model.generate_content_async(
+                    messages_for_gemini, stream=True
+                )
             )
+            async for event in self._stream_text_deltas(response):
+                yield event
             parts = response._result.candidates[0].content.parts
             new_parts = []
             if any("function_call" in part for part in parts):
@@ -210,7 +265,7 @@ class GeminiLLM(LLM):
         for part in parts:
             if "text" in part:
                 print(
-                    f"[{self.__class__.__name__}: process_user_message] response: {part.text}"
+                    f"[{self.__class__.__name__}: stream_user_message] response: {part.text}"
                 )
                 assistant_frontent_output = AssistantMessageItem(
                     id=f"gemini_message_{str(uuid.uuid4())}",
@@ -221,24 +276,41 @@ class GeminiLLM(LLM):
                         content={"message": part.text},
                     ),
                 )
-                frontend_outputs.append(assistant_frontent_output)
-
-        responses = frontend_outputs
-
-        user_message_and_responses = [user_message] + responses
-        return user_message_and_responses
+                yield StreamEvent(
+                    type=StreamEventType.Message,
+                    item=assistant_frontent_output,
+                )
 
     async def update_tools(self, assistant_id: str):
         self._self_update_tools()
 
     def _self_update_tools(self):
         # gather tools information
-        self.gemini_tools = []
-        for function_name in [
-            attr for attr in dir(tools) if callable(getattr(tools, attr))
-        ]:
-            function: ToolFunction = getattr(tools, function_name)
-            self.gemini_tools.append(function.geminischema)
+        self.gemini_tools = self.registry.gemini_schemas()
+
+    async def _stream_text_deltas(
+        self, response: AsyncGenerateContentResponse
+    ) -> AsyncIterator[StreamEvent]:
+        # the chunks are joined into response._result while iterating
+        async for chunk in response:
+            for part in chunk._result.candidates[0].content.parts:
+                if "text" in part and part.text:
+                    yield StreamEvent(
+                        type=StreamEventType.TextDelta,
+                        data={"text": part.text},
+                    )
+
+    async def _summarize(self, prompt: str) -> str:
+        model = genai.GenerativeModel(
+            model_name=GEMINI_MODEL,
+            system_instruction=SUMMARY_INSTRUCTIONS,
+            generation_config={
+                "max_output_tokens": SUMMARY_MAX_TOKENS,
+                "temperature": 0,
+            },
+        )
+        response = await model.generate_content_async(prompt)
+        return response.text
 
     def _to_markdown(self, text):
         text = text.replace("•", "  *")
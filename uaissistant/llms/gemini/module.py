@@ -1,5 +1,5 @@
 from injector import Module, provider
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from uaissistant.llms.gemini.repository import (
     GeminiRepository,
@@ -10,6 +10,6 @@ from uaissistant.llms.gemini.repository import (
 class GeminiLLMModule(Module):
     @provider
     def provide_geminillm_repository(
-        self, session: Session
+        self, session: AsyncSession
     ) -> IGeminiRepository:
         return GeminiRepository(session=session)
@@ -1,36 +1,44 @@
 from typing import TYPE_CHECKING, List, Protocol, runtime_checkable
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import text
 
+from uaissistant.assistant.pagination import Cursor
 from uaissistant.assistant.schemas import AssistantMessageEntity
 
 
 @runtime_checkable
 class IGeminiRepository(Protocol):
     async def list_old_messages(
-        self, thread_id: str
+        self, thread_id: str, after: Cursor | None = None
     ) -> List[AssistantMessageEntity]:
         pass
 
 
 class GeminiRepository:
-    def __init__(self, session: Session) -> None:
+    def __init__(self, session: AsyncSession) -> None:
         self.session = session
 
     async def list_old_messages(
-        self, thread_id: str
+        self, thread_id: str, after: Cursor | None = None
     ) -> List[AssistantMessageEntity]:
+        # the history rows only, read in order from the partial index
+        # assistant_message_history_idx (postgres/init.sql)
         query = """
         SELECT id, assistant_id, thread_id, created_at, role, type, content FROM assistant_message
-        WHERE thread_id = :thread_id AND id NOT LIKE 'internal%' ORDER BY created_at
+        WHERE thread_id = :thread_id AND NOT is_internal
         """
         parameters = {
             "thread_id": thread_id,
         }
-
-        rows = self.session.execute(text(query), parameters).fetchall()
-        self.session.commit()
+        # only the messages after the summarised part of the thread
+        if after is not None:
+            query += " AND (created_at, id) > (:after_created_at, :after_id)"
+            parameters["after_created_at"] = after.created_at
+            parameters["after_id"] = after.id
+        query += " ORDER BY created_at, id"
+
+        rows = (await self.session.execute(text(query), parameters)).fetchall()
 
         return [AssistantMessageEntity(*row) for row in rows]
 
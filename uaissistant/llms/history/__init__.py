@@ -0,0 +1 @@
+from .module import HistoryModule  # noqa: F401
@@ -0,0 +1,285 @@
+import math
+import threading
+from functools import partial
+from typing import (
+    TYPE_CHECKING,
+    Awaitable,
+    Callable,
+    List,
+    Protocol,
+)
+
+from pydantic.dataclasses import dataclass
+
+from uaissistant.assistant.pagination import Cursor
+from uaissistant.assistant.schemas import AssistantMessageEntity, Role
+from uaissistant.assistant.unit_of_work import IUnitOfWork
+from uaissistant.llms.history.repository import IHistoryRepository
+from uaissistant.llms.history.schemas import HistoryWindow, ThreadSummaryEntity
+
+# rough estimate of ~4 characters per token (English text and JSON): exact
+# counts need the provider tokenizers, which are a network call away
+CHARS_PER_TOKEN = 4
+# context windows of the models, matched by name prefix
+MODEL_CONTEXT_WINDOWS = {
+    "claude-3": 200_000,
+    "gemini-1.5": 1_048_576,
+    "gemini-1.0": 30_720,
+}
+# share of the budget kept verbatim when the older messages are summarised:
+# the next turns fill the rest before the summary has to be extended again
+RETAINED_FRACTION = 0.5
+
+SUMMARY_INSTRUCTIONS = """You summarise conversations between a user and a data-analysis assistant.
+Write a concise summary of the conversation below, extending the previous summary if there is one.
+Keep the facts the assistant needs to continue: the user's goals, the datasets, columns and tool-functions used, the results and numbers reported, and the open questions.
+Answer with the summary only."""
+
+ListMessages = Callable[..., Awaitable[List[AssistantMessageEntity]]]
+Summarize = Callable[[str], Awaitable[str]]
+
+
+@dataclass
+class HistoryStats:
+    turns: int
+    # estimated tokens of the whole history, as it was sent before
+    history_tokens: int
+    # estimated tokens of the windows actually sent (summary and messages)
+    sent_tokens: int
+    summaries: int
+    summary_failures: int
+    last_history_tokens: int
+    last_sent_tokens: int
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def summary_prompt(
+    previous_summary: str | None, messages: List[AssistantMessageEntity]
+) -> str:
+    transcript = "\n\n".join(
+        f"{Role(m.role).value}: {m.content['message']}" for m in messages
+    )
+    if previous_summary is None:
+        return f"Conversation:\n{transcript}"
+    return (
+        f"Previous summary:\n{previous_summary}\n\nConversation:\n{transcript}"
+    )
+
+
+def with_summary(instructions: str, summary: str | None) -> str:
+    # the summary goes to the system instructions, so the window of messages
+    # can start with any user message
+    if summary is None:
+        return instructions
+    return f"{instructions}\n\nSummary of the earlier conversation:\n{summary}"
+
+
+class HistoryMetrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._turns = 0
+        self._history_tokens = 0
+        self._sent_tokens = 0
+        self._summaries = 0
+        self._summary_failures = 0
+        self._last_history_tokens = 0
+        self._last_sent_tokens = 0
+
+    def record_turn(self, history_tokens: int, sent_tokens: int) -> None:
+        with self._lock:
+            self._turns += 1
+            self._history_tokens += history_tokens
+            self._sent_tokens += sent_tokens
+            self._last_history_tokens = history_tokens
+            self._last_sent_tokens = sent_tokens
+
+    def record_summary(self, succeeded: bool) -> None:
+        with self._lock:
+            if succeeded:
+                self._summaries += 1
+            else:
+                self._summary_failures += 1
+
+    def stats(self) -> HistoryStats:
+        with self._lock:
+            return HistoryStats(
+                turns=self._turns,
+                history_tokens=self._history_tokens,
+                sent_tokens=self._sent_tokens,
+                summaries=self._summaries,
+                summary_failures=self._summary_failures,
+                last_history_tokens=self._last_history_tokens,
+                last_sent_tokens=self._last_sent_tokens,
+            )
+
+
+class IHistoryManager(Protocol):
+    def token_budget(self, model: str) -> int:
+        pass
+
+    async def get_window(
+        self,
+        thread_id: str,
+        model: str,
+        list_messages: ListMessages,
+        summarize: Summarize,
+    ) -> HistoryWindow:
+        pass
+
+
+class HistoryManager:
+    """Fits the history of a thread into the token budget of a model.
+
+    The messages older than the budget are folded into a rolling summary,
+    stored per thread with the position of the last summarised message:
+    a summary is computed once, and only the messages after it are loaded
+    on the next turns. When the summary cannot be computed, the older
+    messages are dropped for this turn. The history is read in a read-only
+    unit of work, and the new summary is saved with the messages of the
+    turn (deferred write): it is not kept if the turn fails.
+    """
+
+    def __init__(
+        self,
+        repository: IHistoryRepository,
+        uow: IUnitOfWork,
+        metrics: HistoryMetrics,
+        max_tokens: int,
+    ) -> None:
+        self.repository = repository
+        self.uow = uow
+        self.metrics = metrics
+        self.max_tokens = max_tokens
+
+    def token_budget(self, model: str) -> int:
+        for prefix, context_window in MODEL_CONTEXT_WINDOWS.items():
+            if model.startswith(prefix):
+                return min(self.max_tokens, context_window // 2)
+        return self.max_tokens
+
+    async def get_window(
+        self,
+        thread_id: str,
+        model: str,
+        list_messages: ListMessages,
+        summarize: Summarize,
+    ) -> HistoryWindow:
+        async with self.uow.read():
+            summary = await self.repository.get_summary(thread_id)
+            after = (
+                Cursor(
+                    created_at=summary.last_message_created_at,
+                    id=summary.last_message_id,
+                )
+                if summary is not None
+                else None
+            )
+            messages = [
+                m
+                for m in await list_messages(thread_id=thread_id, after=after)
+                if "message" in m.content
+            ]
+
+        message_tokens = [
+            estimate_tokens(m.content["message"]) for m in messages
+        ]
+        summary_tokens = (
+            estimate_tokens(summary.content) if summary is not None else 0
+        )
+        summarized_tokens = (
+            summary.summarized_tokens if summary is not None else 0
+        )
+        history_tokens = summarized_tokens + sum(message_tokens)
+
+        budget = self.token_budget(model)
+        window = HistoryWindow(
+            summary=summary.content if summary is not None else None,
+            messages=messages,
+            tokens=summary_tokens + sum(message_tokens),
+        )
+        if window.tokens > budget:
+            window = await self._shrink(
+                thread_id, budget, summary, messages, message_tokens, summarize
+            )
+
+        self.metrics.record_turn(history_tokens, window.tokens)
+        print(
+            f"[{self.__class__.__name__}] thread {thread_id}: {len(window.messages)} messages, {window.tokens}/{history_tokens} history tokens sent"
+        )
+        return window
+
+    async def _shrink(
+        self,
+        thread_id: str,
+        budget: int,
+        summary: ThreadSummaryEntity | None,
+        messages: List[AssistantMessageEntity],
+        message_tokens: List[int],
+        summarize: Summarize,
+    ) -> HistoryWindow:
+        # keep the latest messages within the retained share of the budget,
+        # starting with a user message
+        start, kept_tokens = len(messages), 0
+        while (
+            start > 0
+            and kept_tokens + message_tokens[start - 1]
+            <= budget * RETAINED_FRACTION
+        ):
+            start -= 1
+            kept_tokens += message_tokens[start]
+        while start < len(messages) and messages[start].role != Role.User.value:
+            kept_tokens -= message_tokens[start]
+            start += 1
+
+        dropped, kept = messages[:start], messages[start:]
+        previous = summary.content if summary is not None else None
+        previous_tokens = estimate_tokens(previous) if previous else 0
+        if not dropped:
+            return HistoryWindow(
+                summary=previous,
+                messages=kept,
+                tokens=previous_tokens + kept_tokens,
+            )
+
+        try:
+            content = await summarize(summary_prompt(previous, dropped))
+        except Exception as e:
+            print(
+                f"[{self.__class__.__name__}] summary of thread {thread_id} failed, dropping {len(dropped)} messages: {e}"
+            )
+            self.metrics.record_summary(succeeded=False)
+            return HistoryWindow(
+                summary=previous,
+                messages=kept,
+                tokens=previous_tokens + kept_tokens,
+            )
+        self.metrics.record_summary(succeeded=True)
+
+        last = dropped[-1]
+        self.uow.defer(
+            partial(
+                self.repository.save_summary,
+                ThreadSummaryEntity(
+                    thread_id=thread_id,
+                    last_message_created_at=last.created_at,
+                    last_message_id=last.id,
+                    content=content,
+                    summarized_tokens=(
+                        summary.summarized_tokens if summary is not None else 0
+                    )
+                    + sum(message_tokens[:start]),
+                ),
+            )
+        )
+        return HistoryWindow(
+            summary=content,
+            messages=kept,
+            tokens=estimate_tokens(content) + kept_tokens,
+        )
+
+
+if TYPE_CHECKING:
+    _: type[IHistoryManager] = HistoryManager
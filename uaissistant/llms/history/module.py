@@ -0,0 +1,41 @@
+from environs import Env
+from injector import Module, provider, singleton
+from sqlalchemy.ext.asyncio import AsyncSession
+from uaissistant.assistant.unit_of_work import IUnitOfWork
+from uaissistant.llms.history.manager import (
+    HistoryManager,
+    HistoryMetrics,
+    IHistoryManager,
+)
+from uaissistant.llms.history.repository import (
+    HistoryRepository,
+    IHistoryRepository,
+)
+
+
+class HistoryModule(Module):
+    @provider
+    def provide_history_repository(
+        self, session: AsyncSession
+    ) -> IHistoryRepository:
+        return HistoryRepository(session=session)
+
+    @provider
+    def provide_history_manager(
+        self,
+        repository: IHistoryRepository,
+        uow: IUnitOfWork,
+        metrics: HistoryMetrics,
+        env: Env,
+    ) -> IHistoryManager:
+        return HistoryManager(
+            repository=repository,
+            uow=uow,
+            metrics=metrics,
+            max_tokens=env.int("HISTORY_MAX_TOKENS", default=16000),
+        )
+
+    @provider
+    @singleton
+    def provide_history_metrics(self) -> HistoryMetrics:
+        return HistoryMetrics()
@@ -0,0 +1,60 @@
+from typing import TYPE_CHECKING, Protocol
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text
+
+from uaissistant.llms.history.schemas import ThreadSummaryEntity
+
+
+class IHistoryRepository(Protocol):
+    async def get_summary(self, thread_id: str) -> ThreadSummaryEntity | None:
+        pass
+
+    async def save_summary(self, summary: ThreadSummaryEntity) -> None:
+        pass
+
+
+class HistoryRepository:
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    async def get_summary(self, thread_id: str) -> ThreadSummaryEntity | None:
+        query = """
+        SELECT thread_id, last_message_created_at, last_message_id, content, summarized_tokens
+        FROM assistant_thread_summary WHERE thread_id = :thread_id
+        """
+        parameters = {"thread_id": thread_id}
+
+        row = (await self.session.execute(text(query), parameters)).fetchone()
+
+        return ThreadSummaryEntity(*row) if row is not None else None
+
+    async def save_summary(self, summary: ThreadSummaryEntity) -> None:
+        # a concurrent turn may have stored a summary covering more messages:
+        # only move the summary forward
+        query = """
+        INSERT INTO assistant_thread_summary
+            (thread_id, last_message_created_at, last_message_id, content, summarized_tokens)
+        VALUES
+            (:thread_id, :last_message_created_at, :last_message_id, :content, :summarized_tokens)
+        ON CONFLICT (thread_id) DO UPDATE SET
+            last_message_created_at = excluded.last_message_created_at,
+            last_message_id = excluded.last_message_id,
+            content = excluded.content,
+            summarized_tokens = excluded.summarized_tokens
+        WHERE (excluded.last_message_created_at, excluded.last_message_id)
+            > (assistant_thread_summary.last_message_created_at, assistant_thread_summary.last_message_id)
+        """
+        parameters = {
+            "thread_id": summary.thread_id,
+            "last_message_created_at": summary.last_message_created_at,
+            "last_message_id": summary.last_message_id,
+            "content": summary.content,
+            "summarized_tokens": summary.summarized_tokens,
+        }
+
+        await self.session.execute(text(query), parameters)
+
+
+if TYPE_CHECKING:
+    _: type[IHistoryRepository] = HistoryRepository
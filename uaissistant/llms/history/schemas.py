@@ -0,0 +1,24 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List
+
+from uaissistant.assistant.schemas import AssistantMessageEntity
+
+
+@dataclass
+class ThreadSummaryEntity:
+    thread_id: str
+    # last message folded into the summary (keyset position)
+    last_message_created_at: datetime
+    last_message_id: str
+    content: str
+    # estimated tokens of all the messages folded into the summary
+    summarized_tokens: int
+
+
+@dataclass
+class HistoryWindow:
+    summary: str | None
+    messages: List[AssistantMessageEntity]
+    # estimated tokens of the summary and messages
+    tokens: int
@@ -1,6 +1,6 @@
-from typing import List, Protocol
+from typing import AsyncIterator, List, Protocol
 
-from uaissistant.assistant.models import AssistantMessageItem
+from uaissistant.assistant.models import AssistantMessageItem, StreamEvent
 from uaissistant.assistant.schemas import AssistantEntity, AssistantThreadEntity
 
 
@@ -42,5 +42,21 @@ class LLM(Protocol):
     ) -> List[AssistantMessageItem]:
         pass
 
+    def stream_user_message(
+        self,
+        assistant: AssistantEntity,
+        thread_id: str,
+        message: str,
+    ) -> AsyncIterator[StreamEvent]:
+        pass
+
     async def update_tools(self, assistant_id: str):
         pass
+
+
+async def collect_message_items(
+    events: AsyncIterator[StreamEvent],
+) -> List[AssistantMessageItem]:
+    # drain a stream_user_message() stream, keeping only the complete items:
+    # the user message first, then the responses in order of production
+    return [event.item async for event in events if event.item is not None]
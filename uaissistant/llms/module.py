@@ -6,16 +6,19 @@ from uaissistant.llms.anthropic.repository import (
     AnthropicRepository,
     IAnthropicRepository,
 )
+from uaissistant.llms.anthropic.usage import AnthropicUsageMetrics
 from uaissistant.llms.gemini.geminillm import GeminiLLM
 from uaissistant.llms.gemini.repository import IGeminiRepository
+from uaissistant.llms.history.manager import IHistoryManager
 from uaissistant.llms.llm import LLM
 from uaissistant.llms.openai.openaillm import OpenAILLM
-from uaissistant.tool_factory.service import IToolFactoryService
+from uaissistant.tool_factory.executor import IToolExecutor
+from uaissistant.tool_factory.registry import IToolRegistry
 from injector import Module, multiprovider, provider
-from sqlalchemy.orm import Session
-from openai import Client
+from sqlalchemy.ext.asyncio import AsyncSession
+from openai import AsyncOpenAI
 
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
 from uaissistant.llms.anthropic.anthropicllm import AnthropicLLM
 
 
@@ -23,31 +26,41 @@ class LlmsModule(Module):
     @multiprovider
     def provide_llms(
         self,
-        openai_client: Client,
-        anthropic_client: Anthropic,
-        tool_factory: IToolFactoryService,
+        openai_client: AsyncOpenAI,
+        anthropic_client: AsyncAnthropic,
+        tool_executor: IToolExecutor,
+        registry: IToolRegistry,
         anthropic_repository: IAnthropicRepository,
         gemini_repository: IGeminiRepository,
+        history: IHistoryManager,
+        anthropic_usage_metrics: AnthropicUsageMetrics,
         env: Env,
     ) -> Dict[str, LLM]:
         return {
             LLMSource.OpenAI: OpenAILLM(
-                client=openai_client, tool_factory=tool_factory
+                client=openai_client,
+                tool_executor=tool_executor,
+                registry=registry,
             ),
             LLMSource.Anthropic: AnthropicLLM(
                 client=anthropic_client,
-                tool_factory=tool_factory,
+                tool_executor=tool_executor,
+                registry=registry,
                 anthropic_repository=anthropic_repository,
+                history=history,
+                usage_metrics=anthropic_usage_metrics,
             ),
             LLMSource.Gemini: GeminiLLM(
                 env=env,
-                tool_factory=tool_factory,
+                tool_executor=tool_executor,
+                registry=registry,
                 gemini_repository=gemini_repository,
+                history=history,
             ),
         }
 
     @provider
     def provide_anthropic_repository(
-        self, session: Session
+        self, session: AsyncSession
     ) -> IAnthropicRepository:
         return AnthropicRepository(session=session)
@@ -1,12 +1,14 @@
+import asyncio
 import json
 import time
 import uuid
 from datetime import datetime
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List
 
 from uaissistant.assistant.models import (
     AssistantMessageItem,
     AssistantMessageValue,
+    StreamEvent,
 )
 from uaissistant.assistant.schemas import (
     AssistantEntity,
@@ -14,19 +16,26 @@ from uaissistant.assistant.schemas import (
     LLMSource,
     Role,
     AssistantMessageType,
+    StreamEventType,
 )
-from uaissistant.llms.llm import LLM
-from uaissistant.tool_factory import tools
-from uaissistant.tool_factory.service import IToolFactoryService
-from uaissistant.tool_factory.schemas.tool_function import ToolFunction
-from openai import Client
+from uaissistant.llms.llm import LLM, collect_message_items
+from uaissistant.tool_factory.executor import IToolExecutor
+from uaissistant.tool_factory.registry import IToolRegistry
+from uaissistant.tool_factory.schemas.tool_call import ToolCall
+from openai import AsyncOpenAI
 from openai.types.beta.threads import Run
 
 
 class OpenAILLM:
-    def __init__(self, client: Client, tool_factory: IToolFactoryService):
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        tool_executor: IToolExecutor,
+        registry: IToolRegistry,
+    ):
         self.client = client
-        self.tool_factory = tool_factory
+        self.tool_executor = tool_executor
+        self.registry = registry
 
         # set default values
         self.API_TIMEOUT = 10
@@ -35,6 +44,13 @@ class OpenAILLM:
             "PENDING_STATES": ["queued", "in_progress", "cancelling"],
             "ACTION_STATES": ["requires_action"],
         }
+        # run polling: start fast, back off while the run keeps working
+        self.POLL = {
+            "INITIAL_INTERVAL": 0.1,
+            "MAX_INTERVAL": 2.0,
+            "BACKOFF": 1.5,
+            "TIMEOUT": 60,
+        }
 
         self._self_update_tools()
 
@@ -45,7 +61,7 @@ class OpenAILLM:
     async def create_assistant(
         self, name: str, instructions: str, model: str
     ) -> AssistantEntity:
-        openai_assistant = self.client.beta.assistants.create(
+        openai_assistant = await self.client.beta.assistants.create(
             name=name,
             instructions=instructions,
             tools=self.openai_tools,
@@ -70,7 +86,7 @@ class OpenAILLM:
     ) -> AssistantEntity:
         self._self_update_tools()
 
-        openai_assistant = self.client.beta.assistants.update(
+        openai_assistant = await self.client.beta.assistants.update(
             assistant_id=assistant_id,
             name=name,
             instructions=instructions,
@@ -89,7 +105,7 @@ class OpenAILLM:
 
     async def delete_assistant(self, assistant_id: str):
         try:
-            self.client.beta.assistants.delete(
+            await self.client.beta.assistants.delete(
                 assistant_id=assistant_id, timeout=self.API_TIMEOUT
             )
         except Exception as e:
@@ -99,7 +115,7 @@ class OpenAILLM:
     async def create_thread(
         self, assistant_id: str, default_name: str
     ) -> AssistantThreadEntity:
-        openai_thread = self.client.beta.threads.create(
+        openai_thread = await self.client.beta.threads.create(
             timeout=self.API_TIMEOUT
         )
         thread = AssistantThreadEntity(
@@ -112,7 +128,9 @@ class OpenAILLM:
 
     async def delete_thread(self, thread_id: str):
         try:
-            self.client.beta.threads.delete(thread_id, timeout=self.API_TIMEOUT)
+            await self.client.beta.threads.delete(
+                thread_id, timeout=self.API_TIMEOUT
+            )
         except Exception as e:
             print(f"[{self.__class__.__name__}: delete_thread]: {e}")
         return
@@ -123,17 +141,38 @@ class OpenAILLM:
         thread_id: str,
         message: str,
     ) -> List[AssistantMessageItem]:
+        return await collect_message_items(
+            self.stream_user_message(
+                assistant=assistant, thread_id=thread_id, message=message
+            )
+        )
+
+    async def stream_user_message(
+        self,
+        assistant: AssistantEntity,
+        thread_id: str,
+        message: str,
+    ) -> AsyncIterator[StreamEvent]:
         user_message: AssistantMessageItem = await self._send_message(
             thread_id, message
         )
-        responses: List[AssistantMessageItem] | None = await self._get_response(
+        yield StreamEvent(type=StreamEventType.Message, item=user_message)
+
+        completed = False
+        async for event in self._stream_response(
             assistant_id=assistant.id,
             thread_id=thread_id,
-        )
+        ):
+            if event.type == StreamEventType.Done:
+                completed = True
+                continue
+            yield event
+
         # if there is something wrong with the thread. TODO !!!IMPORTANT!!!: remove thread from assistants
-        if responses is None:
-            responses: List[AssistantMessageItem] = [
-                AssistantMessageItem(
+        if not completed:
+            yield StreamEvent(
+                type=StreamEventType.Message,
+                item=AssistantMessageItem(
                     id=f"internal_{str(uuid.uuid4())}",
                     role=Role.Assistant,
                     created_at=datetime.now(),
@@ -143,16 +182,14 @@ class OpenAILLM:
                             "message": "There is something wrong with this particular chat. Please, start new chat."
                         },
                     ),
-                )
-            ]
-
-        user_message_and_responses = [user_message] + responses
-        return user_message_and_responses
+                    internal=True,
+                ),
+            )
 
     async def update_tools(self, assistant_id: str):
         self._self_update_tools()
         # update OpenAI Client. TODO: add a check for success
-        self.client.beta.assistants.update(
+        await self.client.beta.assistants.update(
             assistant_id,
             tools=self.openai_tools,
         )
@@ -160,20 +197,17 @@ class OpenAILLM:
     def _self_update_tools(self):
         # gather tools information
         self.openai_tools = [{"type": "code_interpreter"}]
-        for function_name in [
-            attr for attr in dir(tools) if callable(getattr(tools, attr))
-        ]:
-            function: ToolFunction = getattr(tools, function_name)
+        for schema in self.registry.openai_schemas():
             tool_function_defenition = {
                 "type": "function",
-                "function": function.openaischema,
+                "function": schema,
             }
             self.openai_tools.append(tool_function_defenition)
 
     async def _send_message(
         self, thread_id: str, message: str
     ) -> AssistantMessageItem:
-        runs = self.client.beta.threads.runs.list(
+        runs = await self.client.beta.threads.runs.list(
             thread_id, timeout=self.API_TIMEOUT
         )
         if len(runs.data) > 0:
@@ -183,7 +217,7 @@ class OpenAILLM:
                     f"[{self.__class__.__name__} _send_message] Existing run: {run.id}, status: {run.status}"
                 )
                 try:
-                    self.client.beta.threads.runs.cancel(
+                    await self.client.beta.threads.runs.cancel(
                         thread_id=thread_id,
                         run_id=run.id,
                         timeout=self.API_TIMEOUT,
@@ -197,7 +231,7 @@ class OpenAILLM:
                     f"[{self.__class__.__name__} _send_message] After wait | Existing run: {run.id}, status: {run.status}"
                 )
 
-        thread_message = self.client.beta.threads.messages.create(
+        thread_message = await self.client.beta.threads.messages.create(
             thread_id,
             role="user",
             content=message,
@@ -220,27 +254,33 @@ class OpenAILLM:
         print(
             f"[{self.__class__.__name__} _wait_on_run] before id: {run.id} status: {run.status}, error: {run.last_error}"
         )
-        itr = 0
-        MAX_ITR = 120
-        while run.status in self.RUN["PENDING_STATES"] and itr <= MAX_ITR:
-            itr += 1
+        interval = self.POLL["INITIAL_INTERVAL"]
+        deadline = time.monotonic() + self.POLL["TIMEOUT"]
+        timed_out = False
+        while run.status in self.RUN["PENDING_STATES"]:
+            if time.monotonic() >= deadline:
+                timed_out = True
+                break
             print(
                 f"[{self.__class__.__name__} _wait_on_run] waiting for id: {run.id} status: {run.status}, error: {run.last_error}"
             )
-            run = self.client.beta.threads.runs.retrieve(
+            await asyncio.sleep(interval)
+            interval = min(
+                interval * self.POLL["BACKOFF"], self.POLL["MAX_INTERVAL"]
+            )
+            run = await self.client.beta.threads.runs.retrieve(
                 thread_id=thread_id, run_id=run.id, timeout=self.API_TIMEOUT
             )
-            time.sleep(0.5)
         print(
             f"[{self.__class__.__name__} _wait_on_run] after id: {run.id} status: {run.status}, error: {run.last_error}"
         )
 
-        if itr > MAX_ITR:
+        if timed_out:
             try:
                 print(
-                    f"[{self.__class__.__name__} _wait_on_run] Cancelling the run {run.id}, itr: {itr}"
+                    f"[{self.__class__.__name__} _wait_on_run] Cancelling the run {run.id}, timeout: {self.POLL['TIMEOUT']}s"
                 )
-                self.client.beta.threads.runs.cancel(
+                await self.client.beta.threads.runs.cancel(
                     thread_id=thread_id, run_id=run.id, timeout=self.API_TIMEOUT
                 )
             except Exception as e:
@@ -251,13 +291,13 @@ class OpenAILLM:
 
         return run
 
-    async def _get_response(
+    async def _stream_response(
         self,
         assistant_id: str,
         thread_id: str,
-    ) -> List[AssistantMessageItem] | None:
-        # creating a run
-        run = self.client.beta.threads.runs.create(
+    ) -> AsyncIterator[StreamEvent]:
+        # creating a streamed run
+        stream_manager = self.client.beta.threads.runs.stream(
             thread_id=thread_id,
             assistant_id=assistant_id,
             timeout=self.API_TIMEOUT,
@@ -267,106 +307,158 @@ class OpenAILLM:
         itr = 0
         MAX_ITR = 10
 
-        # set frontend_outputs
-        frontend_outputs: List[AssistantMessageItem] = []
-
         # processing the run with or without actions
-        while (
-            run := await self._wait_on_run(thread_id, run)
-        ).status not in self.RUN["TERMINAL_STATES"] and itr <= MAX_ITR:
+        while stream_manager is not None and itr <= MAX_ITR:
             itr += 1
-            print(
-                f"[{self.__class__.__name__} _get_response] run.status: {run.status}"
-            )
-            if run.status != "requires_action":  # doesn't require action!
-                continue
-
-            if (
-                run.required_action is None
-            ):  # run.required_action is not properly defined
-                print(
-                    "[{self.__class__.__name__} _get_response] run.required_action is None"
-                )
-                run = self.client.beta.threads.runs.submit_tool_outputs(
-                    thread_id=thread_id,
-                    run_id=run.id,
-                    tool_outputs=[],
-                    timeout=self.API_TIMEOUT,
+            run: Run | None = None
+            failed_run: Run | None = None
+            async with stream_manager as stream:
+                async for event in stream:
+                    if event.event == "thread.message.delta":
+                        for content in event.data.delta.content or []:
+                            if content.type == "text" and content.text:
+                                yield StreamEvent(
+                                    type=StreamEventType.TextDelta,
+                                    data={"text": content.text.value},
+                                )
+                    elif event.event == "thread.message.completed":
+                        # for each message, create a value wrapper. TODO: Process content.test is None = MessageContentImageFile or other file/json/etc.
+                        for content in event.data.content:
+                            if content.type != "text":
+                                continue
+                            yield StreamEvent(
+                                type=StreamEventType.Message,
+                                item=AssistantMessageItem(
+                                    id=event.data.id,
+                                    role=Role.Assistant,
+                                    created_at=datetime.now(),
+                                    value=AssistantMessageValue(
+                                        type=AssistantMessageType.Text,
+                                        content={"message": content.text.value},
+                                    ),
+                                ),
+                            )
+                    elif event.event == "thread.run.requires_action":
+                        run = event.data
+                    elif event.event in [
+                        "thread.run.failed",
+                        "thread.run.cancelled",
+                        "thread.run.expired",
+                    ]:
+                        failed_run = event.data
+                        print(
+                            f"[{self.__class__.__name__} _stream_response] run.status: {event.data.status}, error: {event.data.last_error}"
+                        )
+            stream_manager = None
+
+            if failed_run is not None:  # the run ended without an answer
+                last_error = failed_run.last_error
+                yield StreamEvent(
+                    type=StreamEventType.Error,
+                    data={
+                        "status": failed_run.status,
+                        "detail": (
+                            last_error.message
+                            if last_error is not None
+                            else f"run {failed_run.status}"
+                        ),
+                        "code": (
+                            last_error.code if last_error is not None else None
+                        ),
+                    },
                 )
+                return
+
+            if run is None:  # doesn't require action: the run is finished
+                yield StreamEvent(type=StreamEventType.Done)
+                return
 
             ###############################
             ####### REQUIRES ACTION #######
             ###############################
 
-            # set tool_outputs for current run tool calling iteration
-            tool_outputs = []
+            # collect the tool calls of the current run iteration
+            tool_calls: List[ToolCall] = []
             for tool_call in run.required_action.submit_tool_outputs.tool_calls:
                 # process tool_call
                 print(
-                    f"[{self.__class__.__name__} _get_response] executing function {tool_call.function.name}, with args: {tool_call.function.arguments}"
+                    f"[{self.__class__.__name__} _stream_response] executing function {tool_call.function.name}, with args: {tool_call.function.arguments}"
                 )
 
-                if tool_call.function.name == "multi_tool_use.parallel":
-                    output = "Please, call the tool-functions one by one!"
-                    break
-
                 # parse arguments for tool-function
                 args = {}
                 try:
                     args = json.loads(tool_call.function.arguments)
                 except Exception as e:
                     print(
-                        f"[{self.__class__.__name__} _get_response]function argument parsing error: {e}, args: {args}"
+                        f"[{self.__class__.__name__} _stream_response]function argument parsing error: {e}, args: {args}"
                     )
 
-                # call tool_function
-                (
-                    output,
-                    new_frontend_contents,
-                ) = self.tool_factory.call_tool_function(
-                    function_name=tool_call.function.name, args=args
-                )
+                if tool_call.function.name == "multi_tool_use.parallel":
+                    # parallel calls wrapped into one pseudo tool-function:
+                    # unwrapped, their outputs are joined under its id
+                    for tool_use in args.get("tool_uses", []):
+                        tool_calls.append(
+                            ToolCall(
+                                id=tool_call.id,
+                                name=tool_use.get(
+                                    "recipient_name", ""
+                                ).removeprefix("functions."),
+                                args=tool_use.get("parameters", {}),
+                            )
+                        )
+                else:
+                    tool_calls.append(
+                        ToolCall(
+                            id=tool_call.id,
+                            name=tool_call.function.name,
+                            args=args,
+                        )
+                    )
 
-                # save the resulted ouputs
-                tool_outputs.append(
-                    {"tool_call_id": tool_call.id, "output": output}
+            for tool_call in tool_calls:
+                yield StreamEvent(
+                    type=StreamEventType.ToolCallStarted,
+                    data={
+                        "id": tool_call.id,
+                        "name": tool_call.name,
+                        "args": tool_call.args,
+                    },
                 )
-                frontend_outputs.extend(new_frontend_contents)
-
-            # submit the results of the tool-functions
-            run = self.client.beta.threads.runs.submit_tool_outputs(
-                thread_id=thread_id,
-                run_id=run.id,
-                tool_outputs=tool_outputs,
-                timeout=self.API_TIMEOUT,
-            )
-
-        if itr > MAX_ITR:
-            return None
 
-        # prepare the final message from the OpenAI Assistant
-        messages = self.client.beta.threads.messages.list(
-            thread_id=thread_id,
-            timeout=self.API_TIMEOUT,
-        )
-        assistant_message = messages.data[0]
-
-        # for each message, create a value wrapper. TODO: Process content.test is None = MessageContentImageFile or other file/json/etc.
-        if assistant_message.role == "assistant":
-            for content in assistant_message.content:
-                if content.text is not None:
-                    assistant_frontent_output = AssistantMessageItem(
-                        id=assistant_message.id,
-                        role=Role.Assistant,
-                        created_at=datetime.now(),
-                        value=AssistantMessageValue(
-                            type=AssistantMessageType.Text,
-                            content={"message": content.text.value},
-                        ),
+            # the tool-functions run concurrently, results come in the order
+            # of the calls
+            outputs: Dict[str, List[str]] = {}
+            async for result in self.tool_executor.run(tool_calls):
+                yield StreamEvent(
+                    type=StreamEventType.ToolCallFinished,
+                    data={
+                        "id": result.call.id,
+                        "name": result.call.name,
+                        "output": result.output,
+                    },
+                )
+                for frontend_content in result.frontend_contents:
+                    yield StreamEvent(
+                        type=StreamEventType.Message, item=frontend_content
                     )
-                    frontend_outputs.append(assistant_frontent_output)
 
-        return frontend_outputs
+                # save the resulted ouputs
+                outputs.setdefault(result.call.id, []).append(result.output)
+            tool_outputs = [
+                {"tool_call_id": tool_call_id, "output": "\n\n".join(output)}
+                for tool_call_id, output in outputs.items()
+            ]
+
+            # submit the results of the tool-functions and continue streaming
+            stream_manager = (
+                self.client.beta.threads.runs.submit_tool_outputs_stream(
+                    thread_id=thread_id,
+                    run_id=run.id,
+                    tool_outputs=tool_outputs,
+                    timeout=self.API_TIMEOUT,
+                )
+            )
 
 
 if TYPE_CHECKING:
@@ -1,14 +1,20 @@
+import asyncio
+
 from uaissistant.assistant import AssistantModule
+from uaissistant.assistant.purger import IAssistantPurger
 from uaissistant.connections import (
     AnthropicModule,
     ConfigModule,
     DbModule,
     OpenAiModule,
 )
+from uaissistant.figures import FiguresModule
 from uaissistant.llms import LlmsModule
 from uaissistant.llms.anthropic.module import AnthropicLLMModule
 from uaissistant.llms.gemini.module import GeminiLLMModule
+from uaissistant.llms.history import HistoryModule
 from uaissistant.tool_factory import ToolFactoryModule
+from uaissistant.tool_factory.executor import IToolExecutor
 from injector import Injector
 from fastapi import FastAPI
 from fastapi_injector import (
@@ -16,7 +22,7 @@ from fastapi_injector import (
     RequestScopeOptions,
     attach_injector,
 )
-from uaissistant.routes import assistant
+from uaissistant.routes import assistant, figures, metrics
 from fastapi.middleware.cors import CORSMiddleware
 
 injector = Injector(
@@ -25,6 +31,8 @@ injector = Injector(
         AssistantModule(),
         # toolfactory module
         ToolFactoryModule(),
+        # figures module
+        FiguresModule(),
         # connections
         ConfigModule(),
         DbModule(),
@@ -34,6 +42,7 @@ injector = Injector(
         LlmsModule(),
         AnthropicLLMModule(),
         GeminiLLMModule(),
+        HistoryModule(),
     ]
 )
 app = FastAPI(root_path="/api")
@@ -47,8 +56,30 @@ app.add_middleware(
 )
 app.add_middleware(InjectorMiddleware, injector=injector)
 app.include_router(assistant.router)
+app.include_router(figures.router)
+app.include_router(metrics.router)
 attach_injector(app, injector, options=RequestScopeOptions(enable_cleanup=True))
 
+
+@app.on_event("startup")
+async def start_assistant_purger():
+    # background purge of the soft-deleted assistants and threads
+    app.state.purger_task = asyncio.create_task(
+        injector.get(IAssistantPurger).run()
+    )
+
+
+@app.on_event("shutdown")
+async def stop_assistant_purger():
+    app.state.purger_task.cancel()
+
+
+@app.on_event("shutdown")
+def shutdown_tool_executor():
+    # stop the tool executor workers: uvicorn re-raises the termination
+    # signal after its shutdown, so the exit handlers of the pool do not run
+    injector.get(IToolExecutor).shutdown()
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -1,17 +1,39 @@
+from typing import AsyncIterator
+
 from uaissistant.assistant.models import (
     CreateAssistantParams,
     CreateThreadParams,
     ListMessageResult,
     SendMessageParams,
+    StreamEvent,
     UpdateAssistantParams,
     UpdateThreadParams,
 )
+from uaissistant.assistant.schemas import StreamEventType
 from uaissistant.assistant.service import IAssistantService
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from fastapi_injector import Injected
+from pydantic import TypeAdapter
 
 router = APIRouter(prefix="/assistants", tags=["assistants"])
 
+stream_event_adapter = TypeAdapter(StreamEvent)
+
+
+async def to_server_sent_events(
+    events: AsyncIterator[StreamEvent],
+) -> AsyncIterator[str]:
+    try:
+        async for event in events:
+            data = stream_event_adapter.dump_json(event, exclude_none=True)
+            yield f"event: {event.type.value}\ndata: {data.decode()}\n\n"
+    except Exception as e:
+        print(f"[to_server_sent_events] {e}")
+        event = StreamEvent(type=StreamEventType.Error, data={"detail": str(e)})
+        data = stream_event_adapter.dump_json(event, exclude_none=True)
+        yield f"event: {event.type.value}\ndata: {data.decode()}\n\n"
+
 
 # GET requests
 @router.get("")
@@ -25,18 +47,30 @@ async def list_assistants(
 @router.get("/{assistant_id}/threads")
 async def list_threads(
     assistant_id: str,
+    limit: int = Query(default=50, ge=1, le=200),
+    before: str | None = None,
+    after: str | None = None,
     ass: IAssistantService = Injected(IAssistantService),
 ):
-    result = await ass.list_threads(assistant_id)
+    try:
+        result = await ass.list_threads(assistant_id, limit, before, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return result
 
 
 @router.get("/{assistant_id}/threads/{thread_id}/messages")
 async def list_messages(
     thread_id: str,
+    limit: int = Query(default=50, ge=1, le=200),
+    before: str | None = None,
+    after: str | None = None,
     ass: IAssistantService = Injected(IAssistantService),
 ) -> ListMessageResult:
-    result = await ass.list_messages(thread_id)
+    try:
+        result = await ass.list_messages(thread_id, limit, before, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return result
 
 
@@ -75,6 +109,31 @@ async def send_message(
     return result
 
 
+@router.post("/{assistant_id}/threads/stream")
+async def create_thread_stream(
+    assistant_id: str,
+    params: CreateThreadParams,
+    ass: IAssistantService = Injected(IAssistantService),
+) -> StreamingResponse:
+    events = ass.stream_thread(assistant_id, params)
+    return StreamingResponse(
+        to_server_sent_events(events), media_type="text/event-stream"
+    )
+
+
+@router.post("/{assistant_id}/threads/{thread_id}/messages/stream")
+async def send_message_stream(
+    assistant_id: str,
+    thread_id: str,
+    params: SendMessageParams,
+    ass: IAssistantService = Injected(IAssistantService),
+) -> StreamingResponse:
+    events = ass.stream_thread_message(assistant_id, thread_id, params)
+    return StreamingResponse(
+        to_server_sent_events(events), media_type="text/event-stream"
+    )
+
+
 # DELETE requests
 @router.delete("/{assistant_id}")
 async def delete_assistant(
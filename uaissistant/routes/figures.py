@@ -0,0 +1,43 @@
+import gzip
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi_injector import Injected
+from uaissistant.figures.store import IFigureStore
+
+router = APIRouter(prefix="/figures", tags=["figures"])
+
+
+# GET requests
+@router.get("/{figure_id}")
+async def get_figure(
+    figure_id: str,
+    request: Request,
+    figure_store: IFigureStore = Injected(IFigureStore),
+):
+    # figures are content-addressed: the id is a strong ETag and the
+    # content behind an id never changes
+    etag = f'"{figure_id}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Vary": "Accept-Encoding",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    ]:
+        return Response(status_code=304, headers=headers)
+
+    content = figure_store.get(figure_id)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Figure not found")
+
+    # serve the stored gzip as is to the clients that accept it
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+    else:
+        content = gzip.decompress(content)
+
+    return Response(
+        content=content, media_type="application/json", headers=headers
+    )
@@ -0,0 +1,46 @@
+from fastapi import APIRouter
+from fastapi_injector import Injected
+from uaissistant.assistant.purger import IAssistantPurger
+from uaissistant.connections.dbx import DbPoolMetrics
+from uaissistant.llms.anthropic.usage import AnthropicUsageMetrics
+from uaissistant.llms.history.manager import HistoryMetrics
+from uaissistant.tool_factory.cache import IDatasetCache
+from uaissistant.tool_factory.executor import IToolExecutor
+from uaissistant.tool_factory.model_cache import IModelCache
+from uaissistant.tool_factory.worker import WorkerCacheStats
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+# GET requests
+@router.get("")
+async def get_metrics(
+    dataset_cache: IDatasetCache = Injected(IDatasetCache),
+    model_cache: IModelCache = Injected(IModelCache),
+    history_metrics: HistoryMetrics = Injected(HistoryMetrics),
+    anthropic_usage_metrics: AnthropicUsageMetrics = Injected(
+        AnthropicUsageMetrics
+    ),
+    tool_executor: IToolExecutor = Injected(IToolExecutor),
+    db_pool_metrics: DbPoolMetrics = Injected(DbPoolMetrics),
+    purger: IAssistantPurger = Injected(IAssistantPurger),
+):
+    # the caches used by the tool-functions: the ones of the worker processes
+    # (summed) with the process backend, of this process with the threads
+    tool_caches = tool_executor.cache_stats()
+    if tool_caches is None:
+        tool_caches = WorkerCacheStats(
+            dataset_cache=dataset_cache.stats(),
+            model_cache=model_cache.stats(),
+        )
+    return {
+        "dataset_cache": tool_caches.dataset_cache,
+        "model_cache": tool_caches.model_cache,
+        # caches of the tool executor worker processes, by pid
+        "worker_caches": tool_executor.worker_stats(),
+        "history": history_metrics.stats(),
+        "anthropic_usage": anthropic_usage_metrics.stats(),
+        "db_pools": db_pool_metrics.stats(),
+        # background purge of the soft-deleted assistants and threads
+        "purger": purger.stats(),
+    }
@@ -0,0 +1,115 @@
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Hashable, Protocol
+
+import pandas as pd
+from pydantic.dataclasses import dataclass
+
+
+@dataclass
+class DatasetCacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    entries: int
+    size_bytes: int
+    max_bytes: int
+
+
+class IDatasetCache(Protocol):
+    def get(self, key: Hashable, version: Hashable) -> pd.DataFrame | None:
+        pass
+
+    def put(self, key: Hashable, version: Hashable, data: pd.DataFrame) -> None:
+        pass
+
+    def stats(self) -> DatasetCacheStats:
+        pass
+
+
+class DatasetCache:
+    """Process-wide LRU cache of datasets, bounded by their memory usage.
+
+    Entries are keyed by dataset (and column selection) and stored with the
+    table version they were loaded at; a lookup with a different version
+    drops the entry. The cached frames are shared
+    between the tool-functions, so they must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+
+        self._entries: OrderedDict[
+            Hashable, tuple[Hashable, pd.DataFrame, int]
+        ] = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, key: Hashable, version: Hashable) -> pd.DataFrame | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            cached_version, data, nbytes = entry
+            if cached_version != version:
+                # the table has changed since it was loaded
+                self._remove(key)
+                self._invalidations += 1
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            # shallow copy: the callers may add or drop columns
+            return data.copy(deep=False)
+
+    def put(self, key: Hashable, version: Hashable, data: pd.DataFrame) -> None:
+        nbytes = int(data.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            print(
+                f"[{self.__class__.__name__}] {key} ({nbytes} bytes) exceeds the cache budget"
+            )
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            while self._size_bytes + nbytes > self.max_bytes:
+                evicted_key, (_, _, evicted_bytes) = self._entries.popitem(
+                    last=False
+                )
+                self._size_bytes -= evicted_bytes
+                self._evictions += 1
+                print(f"[{self.__class__.__name__}] evicted {evicted_key}")
+
+            self._entries[key] = (version, data, nbytes)
+            self._size_bytes += nbytes
+
+    def stats(self) -> DatasetCacheStats:
+        with self._lock:
+            return DatasetCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                invalidations=self._invalidations,
+                entries=len(self._entries),
+                size_bytes=self._size_bytes,
+                max_bytes=self.max_bytes,
+            )
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, nbytes = self._entries.pop(key)
+        self._size_bytes -= nbytes
+
+
+if TYPE_CHECKING:
+    _: type[IDatasetCache] = DatasetCache
@@ -0,0 +1,257 @@
+import asyncio
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    Awaitable,
+    Dict,
+    List,
+    Protocol,
+    Tuple,
+)
+
+from uaissistant.assistant.models import AssistantMessageItem
+from uaissistant.connections.dbx import DbConfig
+from uaissistant.tool_factory import worker
+from uaissistant.tool_factory.schemas.tool_call import ToolCall, ToolResult
+from uaissistant.tool_factory.service import IToolFactoryService
+from uaissistant.tool_factory.tools.data_analysis.modeling import set_jobs
+from uaissistant.tool_factory.worker import WorkerCacheStats
+
+
+class IToolExecutor(Protocol):
+    def run(self, calls: List[ToolCall]) -> AsyncIterator[ToolResult]:
+        pass
+
+    def worker_stats(self) -> Dict[int, WorkerCacheStats]:
+        pass
+
+    def cache_stats(self) -> WorkerCacheStats | None:
+        pass
+
+    def shutdown(self) -> None:
+        pass
+
+
+class ToolExecutor:
+    """Runs the tool-function calls of one LLM step concurrently.
+
+    The calls are submitted together to a bounded worker pool shared by all
+    the requests, and the results are yielded in the order of the calls, as
+    soon as each one and the ones before it are done. A call not done within
+    `timeout` seconds of its submission gets an error output: it is dropped
+    if still queued, otherwise its worker cannot be interrupted and finishes
+    in the background. `jobs` is the number of cores one call may use.
+    """
+
+    def __init__(
+        self,
+        tool_factory: IToolFactoryService,
+        max_workers: int,
+        timeout: float,
+        jobs: int,
+    ) -> None:
+        self.tool_factory = tool_factory
+        self.timeout = timeout
+        # the threads share the settings of the process
+        set_jobs(jobs)
+        self.pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="tool-executor"
+        )
+
+    async def run(self, calls: List[ToolCall]) -> AsyncIterator[ToolResult]:
+        loop = asyncio.get_running_loop()
+        futures = [self._submit(loop, call) for call in calls]
+        deadline = loop.time() + self.timeout
+
+        for call, future in zip(calls, futures):
+            try:
+                # the calls run together: the deadline is shared
+                output, frontend_contents = await asyncio.wait_for(
+                    future, timeout=max(deadline - loop.time(), 0)
+                )
+            except asyncio.TimeoutError:
+                output = f"The function {call.name} did not finish within {self.timeout} seconds. Consider calling it on less data."
+                frontend_contents = []
+                print(f"[{self.__class__.__name__}] {output}")
+            yield ToolResult(
+                call=call, output=output, frontend_contents=frontend_contents
+            )
+
+    def worker_stats(self) -> Dict[int, WorkerCacheStats]:
+        # the threads share the caches of the process
+        return {}
+
+    def cache_stats(self) -> WorkerCacheStats | None:
+        # the tool-functions use the caches of this process
+        return None
+
+    def shutdown(self) -> None:
+        # queued calls are dropped, running ones are waited for
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+    def _submit(
+        self, loop: asyncio.AbstractEventLoop, call: ToolCall
+    ) -> Awaitable[Tuple[str, List[AssistantMessageItem]]]:
+        return loop.run_in_executor(
+            self.pool,
+            self.tool_factory.call_tool_function,
+            call.name,
+            call.args,
+        )
+
+
+class ProcessToolExecutor(ToolExecutor):
+    """Tool executor running the tool-functions in worker processes.
+
+    CPU-bound tool-functions (model training, correlation matrices) hold the
+    GIL in the threads of the API process; in worker processes they leave
+    the event loop responsive. Each worker has its own DB engine, dataset
+    cache, model cache and figure store (see `worker.py`): the calls and
+    results are pickled, the datasets are not. The cache counters of the
+    workers come back with every result.
+
+    Every worker is a pool of one process, so that a call can be routed to
+    the worker holding its dataset (and fitted models) in cache: the worker
+    that last ran a call on the same dataset, when it is idle, otherwise the
+    least busy one. A worker stays busy until its call is done, even after
+    the call timed out. A worker process that dies (killed, out of memory)
+    is replaced: its call gets an error output, the next ones run on a new
+    process.
+    """
+
+    def __init__(
+        self,
+        db_config: DbConfig,
+        cache_max_bytes: int,
+        model_cache_max_bytes: int,
+        model_cache_max_age: float,
+        figure_store_root: Path,
+        max_workers: int,
+        timeout: float,
+        jobs: int,
+    ) -> None:
+        self.timeout = timeout
+        self._initargs = (
+            db_config,
+            cache_max_bytes,
+            model_cache_max_bytes,
+            model_cache_max_age,
+            figure_store_root,
+            jobs,
+        )
+        self.pools = [self._create_pool() for _ in range(max_workers)]
+        # calls submitted to each worker and not finished yet, and the worker
+        # that last got a call on each dataset. Only used from the event loop.
+        self._pending = [0] * max_workers
+        self._affinity: Dict[str, int] = {}
+        # cache counters of the live workers by pid, and the pid of each one
+        self._worker_stats: Dict[int, WorkerCacheStats] = {}
+        self._pids: List[int | None] = [None] * max_workers
+
+    def worker_stats(self) -> Dict[int, WorkerCacheStats]:
+        return dict(self._worker_stats)
+
+    def cache_stats(self) -> WorkerCacheStats | None:
+        # the caches of the API process are not used by the tool-functions:
+        # the ones of the workers, together
+        _, cache_max_bytes, model_cache_max_bytes, model_cache_max_age, *_ = (
+            self._initargs
+        )
+        return worker.total_cache_stats(
+            list(self._worker_stats.values()),
+            workers=len(self.pools),
+            cache_max_bytes=cache_max_bytes,
+            model_cache_max_bytes=model_cache_max_bytes,
+            model_cache_max_age=model_cache_max_age,
+        )
+
+    def shutdown(self) -> None:
+        for pool in self.pools:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _submit(
+        self, loop: asyncio.AbstractEventLoop, call: ToolCall
+    ) -> Awaitable[Tuple[str, List[AssistantMessageItem]]]:
+        return asyncio.ensure_future(self._call(loop, call))
+
+    async def _call(
+        self, loop: asyncio.AbstractEventLoop, call: ToolCall
+    ) -> Tuple[str, List[AssistantMessageItem]]:
+        index = self._choose_worker(call)
+        pool = self.pools[index]
+        try:
+            future = self._submit_to(pool, call)
+        except BrokenProcessPool:
+            # the worker died since its last call: a new one takes this call
+            pool = self._replace_pool(index, pool)
+            future = self._submit_to(pool, call)
+
+        # released when the worker is done with the call: a call that timed
+        # out (and cancelled this coroutine) still occupies its worker
+        self._pending[index] += 1
+        future.add_done_callback(
+            lambda _: self._call_soon(loop, self._release, index)
+        )
+
+        try:
+            output, frontend_contents, pid, stats = await asyncio.wrap_future(
+                future, loop=loop
+            )
+        except BrokenProcessPool:
+            self._replace_pool(index, pool)
+            output = f"The function {call.name} failed: its worker process stopped during the call."
+            print(f"[{self.__class__.__name__}] {output}")
+            return output, []
+        self._worker_stats[pid] = stats
+        self._pids[index] = pid
+        return output, frontend_contents
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=1,
+            initializer=worker.init_worker,
+            initargs=self._initargs,
+        )
+
+    def _submit_to(self, pool: ProcessPoolExecutor, call: ToolCall) -> Future:
+        return pool.submit(worker.call_tool_function, call.name, call.args)
+
+    def _replace_pool(
+        self, index: int, broken: ProcessPoolExecutor
+    ) -> ProcessPoolExecutor:
+        # the calls that saw the same broken pool replace it only once
+        if self.pools[index] is broken:
+            print(f"[{self.__class__.__name__}] replacing worker {index}")
+            self.pools[index] = self._create_pool()
+            # the caches of the worker went with its process
+            self._worker_stats.pop(self._pids[index], None)
+            self._pids[index] = None
+            broken.shutdown(wait=False, cancel_futures=True)
+        return self.pools[index]
+
+    def _release(self, index: int) -> None:
+        self._pending[index] -= 1
+
+    @staticmethod
+    def _call_soon(loop: asyncio.AbstractEventLoop, callback, *args) -> None:
+        # from the thread of the pool that completes the future; nothing to
+        # do once the loop is closed (shutdown)
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(callback, *args)
+
+    def _choose_worker(self, call: ToolCall) -> int:
+        dataset_name = call.args.get("dataset_name")
+        index = self._affinity.get(dataset_name)
+        if index is None or self._pending[index] > 0:
+            index = min(range(len(self.pools)), key=lambda i: self._pending[i])
+        if dataset_name is not None:
+            self._affinity[dataset_name] = index
+        return index
+
+
+if TYPE_CHECKING:
+    _: type[IToolExecutor] = ToolExecutor
+    _: type[IToolExecutor] = ProcessToolExecutor
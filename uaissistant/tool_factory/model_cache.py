@@ -0,0 +1,138 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Hashable, Protocol
+
+from pydantic.dataclasses import dataclass
+
+
+@dataclass
+class ModelCacheStats:
+    # lookups answered from the cache: each one is a model fit avoided
+    fits_avoided: int
+    misses: int
+    evictions: int
+    expirations: int
+    invalidations: int
+    entries: int
+    size_bytes: int
+    max_bytes: int
+    max_age: float
+
+
+class IModelCache(Protocol):
+    def get(self, key: Hashable, version: Hashable) -> Any | None:
+        pass
+
+    def put(self, key: Hashable, version: Hashable, model: Any) -> None:
+        pass
+
+    def stats(self) -> ModelCacheStats:
+        pass
+
+
+class ModelCache:
+    """Process-wide LRU cache of fitted models, bounded by size and age.
+
+    Entries are keyed by the fit inputs and stored with the table version of
+    the dataset they were fitted on, like the datasets of `DatasetCache`. An
+    entry not used for `max_age` seconds expires. The size of an entry is the
+    size of its pickle. The cached models are shared between the
+    tool-functions, so they must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes: int, max_age: float) -> None:
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+        # key -> (version, model, size, time of the last use)
+        self._entries: OrderedDict[
+            Hashable, tuple[Hashable, Any, int, float]
+        ] = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+
+        self._fits_avoided = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def get(self, key: Hashable, version: Hashable) -> Any | None:
+        with self._lock:
+            self._expire(time.monotonic())
+
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            cached_version, model, nbytes, _ = entry
+            if cached_version != version:
+                # the dataset has changed since the model was fitted
+                self._remove(key)
+                self._invalidations += 1
+                self._misses += 1
+                return None
+
+            self._entries[key] = (version, model, nbytes, time.monotonic())
+            self._entries.move_to_end(key)
+            self._fits_avoided += 1
+            return model
+
+    def put(self, key: Hashable, version: Hashable, model: Any) -> None:
+        nbytes = len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+        if nbytes > self.max_bytes:
+            print(
+                f"[{self.__class__.__name__}] {key} ({nbytes} bytes) exceeds the cache budget"
+            )
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            if key in self._entries:
+                self._remove(key)
+
+            while self._size_bytes + nbytes > self.max_bytes:
+                evicted_key, (_, _, evicted_bytes, _) = self._entries.popitem(
+                    last=False
+                )
+                self._size_bytes -= evicted_bytes
+                self._evictions += 1
+                print(f"[{self.__class__.__name__}] evicted {evicted_key}")
+
+            self._entries[key] = (version, model, nbytes, now)
+            self._size_bytes += nbytes
+
+    def stats(self) -> ModelCacheStats:
+        with self._lock:
+            return ModelCacheStats(
+                fits_avoided=self._fits_avoided,
+                misses=self._misses,
+                evictions=self._evictions,
+                expirations=self._expirations,
+                invalidations=self._invalidations,
+                entries=len(self._entries),
+                size_bytes=self._size_bytes,
+                max_bytes=self.max_bytes,
+                max_age=self.max_age,
+            )
+
+    def _expire(self, now: float) -> None:
+        # the entries are in order of last use: the expired ones come first
+        while self._entries:
+            key, (_, _, _, used_at) = next(iter(self._entries.items()))
+            if now - used_at < self.max_age:
+                break
+            self._remove(key)
+            self._expirations += 1
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, nbytes, _ = self._entries.pop(key)
+        self._size_bytes -= nbytes
+
+
+if TYPE_CHECKING:
+    _: type[IModelCache] = ModelCache
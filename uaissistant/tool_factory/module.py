@@ -1,5 +1,18 @@
-from injector import Module, provider
-from sqlalchemy.orm import Session
+import os
+
+from environs import Env
+from injector import Module, provider, singleton
+from sqlalchemy.orm import Session, sessionmaker
+from uaissistant.connections.dbx import DbConfig
+from uaissistant.figures.store import IFigureStore
+from uaissistant.tool_factory.cache import DatasetCache, IDatasetCache
+from uaissistant.tool_factory.executor import (
+    IToolExecutor,
+    ProcessToolExecutor,
+    ToolExecutor,
+)
+from uaissistant.tool_factory.model_cache import IModelCache, ModelCache
+from uaissistant.tool_factory.registry import IToolRegistry, ToolRegistry
 from uaissistant.tool_factory.repository import (
     IToolFactoryRepository,
     ToolFactoryRepository,
@@ -13,12 +26,79 @@ from uaissistant.tool_factory.service import (
 class ToolFactoryModule(Module):
     @provider
     def provide_tool_factory_service(
-        self, tfr: IToolFactoryRepository
+        self,
+        tfr: IToolFactoryRepository,
+        registry: IToolRegistry,
+        figure_store: IFigureStore,
     ) -> IToolFactoryService:
-        return ToolFactoryService(tfr=tfr)
+        return ToolFactoryService(
+            tfr=tfr, registry=registry, figure_store=figure_store
+        )
+
+    @provider
+    @singleton
+    def provide_tool_registry(self) -> IToolRegistry:
+        return ToolRegistry()
 
     @provider
     def provide_tool_factory_repository(
-        self, session: Session
+        self,
+        Session: sessionmaker[Session],
+        cache: IDatasetCache,
+        model_cache: IModelCache,
     ) -> IToolFactoryRepository:
-        return ToolFactoryRepository(session=session)
+        return ToolFactoryRepository(
+            Session=Session, cache=cache, model_cache=model_cache
+        )
+
+    @provider
+    @singleton
+    def provide_dataset_cache(self, env: Env) -> IDatasetCache:
+        return DatasetCache(
+            max_bytes=env.int("DATASET_CACHE_MAX_MB", default=256) * 2**20
+        )
+
+    @provider
+    @singleton
+    def provide_model_cache(self, env: Env) -> IModelCache:
+        return ModelCache(
+            max_bytes=env.int("MODEL_CACHE_MAX_MB", default=256) * 2**20,
+            max_age=env.float("MODEL_CACHE_MAX_AGE", default=3600),
+        )
+
+    @provider
+    @singleton
+    def provide_tool_executor(
+        self, tool_factory: IToolFactoryService, db_config: DbConfig, env: Env
+    ) -> IToolExecutor:
+        max_workers = env.int("TOOL_EXECUTOR_WORKERS", default=4)
+        timeout = env.float("TOOL_CALL_TIMEOUT", default=120)
+        # cores per call: by default the workers share the cores, so the
+        # calls running together do not oversubscribe them
+        jobs = env.int(
+            "TOOL_FUNCTION_JOBS",
+            default=max((os.cpu_count() or 1) // max_workers, 1),
+        )
+        # "process": worker processes, "thread": threads of the API process
+        backend = env.str("TOOL_EXECUTOR_BACKEND", default="process")
+        if backend == "thread":
+            return ToolExecutor(
+                tool_factory=tool_factory,
+                max_workers=max_workers,
+                timeout=timeout,
+                jobs=jobs,
+            )
+        return ProcessToolExecutor(
+            db_config=db_config,
+            cache_max_bytes=env.int("DATASET_CACHE_MAX_MB", default=256)
+            * 2**20,
+            model_cache_max_bytes=env.int("MODEL_CACHE_MAX_MB", default=256)
+            * 2**20,
+            model_cache_max_age=env.float("MODEL_CACHE_MAX_AGE", default=3600),
+            figure_store_root=env.path(
+                "FIGURE_STORE_PATH", default="data/figures"
+            ),
+            max_workers=max_workers,
+            timeout=timeout,
+            jobs=jobs,
+        )
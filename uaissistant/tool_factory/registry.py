@@ -0,0 +1,76 @@
+import hashlib
+import json
+from typing import TYPE_CHECKING, Any, Dict, List, Protocol, Type
+
+from uaissistant.tool_factory.schemas.tool_function import ToolFunction
+
+from . import tools
+
+
+class IToolRegistry(Protocol):
+    @property
+    def version(self) -> str:
+        pass
+
+    def get(self, function_name: str) -> Type[ToolFunction] | None:
+        pass
+
+    def openai_schemas(self) -> List[dict[str, Any]]:
+        pass
+
+    def anthropic_schemas(self) -> List[dict[str, Any]]:
+        pass
+
+    def gemini_schemas(self) -> List[Any]:
+        pass
+
+
+class ToolRegistry:
+    def __init__(self) -> None:
+        # gather tools information once: the tool-functions are static for
+        # the lifetime of the process
+        self.functions: Dict[str, Type[ToolFunction]] = {
+            function_name: getattr(tools, function_name)
+            for function_name in sorted(dir(tools))
+            if callable(getattr(tools, function_name))
+        }
+        self._version = self._compute_version()
+        print(
+            f"[{self.__class__.__name__}] {len(self.functions)} tool-functions, version={self._version}"
+        )
+
+    @property
+    def version(self) -> str:
+        return self._version
+
+    def get(self, function_name: str) -> Type[ToolFunction] | None:
+        return self.functions.get(function_name)
+
+    def openai_schemas(self) -> List[dict[str, Any]]:
+        return [function.openaischema for function in self.functions.values()]
+
+    def anthropic_schemas(self) -> List[dict[str, Any]]:
+        return [
+            function.anthropicschema for function in self.functions.values()
+        ]
+
+    def gemini_schemas(self) -> List[Any]:
+        return [function.geminischema for function in self.functions.values()]
+
+    def _compute_version(self) -> str:
+        # content hash of the schemas pushed to the LLMs. The gemini schema is
+        # derived from the same pydantic schema, so hashing the JSON ones is
+        # enough to detect any change of name, description or arguments.
+        payload = json.dumps(
+            [
+                [function.openaischema, function.anthropicschema]
+                for function in self.functions.values()
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+if TYPE_CHECKING:
+    _: type[IToolRegistry] = ToolRegistry
@@ -1,26 +1,405 @@
-from typing import TYPE_CHECKING, Protocol, runtime_checkable
+import itertools
+import tempfile
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Protocol,
+    Tuple,
+    runtime_checkable,
+)
+import numpy as np
 import pandas as pd
+import psycopg2
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.sql import text
+from uaissistant.tool_factory.cache import IDatasetCache
+from uaissistant.tool_factory.model_cache import IModelCache
+from uaissistant.tool_factory.schemas.data_filter import DataFilter
+
+# postgres column type -> pandas dtype of the loaded column
+pgtype2dtype = {
+    "smallint": "int64",
+    "integer": "int64",
+    "bigint": "int64",
+    "real": "float64",
+    "double precision": "float64",
+    "numeric": "float64",
+    "boolean": "bool",
+    "date": "datetime64[ns]",
+    "timestamp without time zone": "datetime64[ns]",
+    "timestamp with time zone": "datetime64[ns]",
+}
+# dtypes passed to the csv parser of the COPY loader. Integer and boolean
+# columns are left to the parser (int64/bool without NULLs, float64/object
+# with them), dates are converted after parsing, the rest stays object.
+copy_parser_dtypes = ["float64", "object"]
+
+
+def quote_identifier(column: str) -> str:
+    return '"' + column.replace('"', '""') + '"'
 
 
 @runtime_checkable
 class IToolFactoryRepository(Protocol):
-    def get_data(self, dataset_name: str) -> pd.DataFrame:
+    def get_data(
+        self,
+        dataset_name: str,
+        columns: List[str] | None = None,
+        filters: List[DataFilter] | None = None,
+        limit: int | None = None,
+    ) -> pd.DataFrame:
+        pass
+
+    def get_columns(self, dataset_name: str) -> Dict[str, str]:
+        pass
+
+    def count_rows(self, dataset_name: str) -> int:
+        pass
+
+
+@runtime_checkable
+class ISqlAggregateRepository(Protocol):
+    # repositories that can aggregate inside the database; the tool-functions
+    # fall back to pandas for the ones that can not
+    def get_statistics(
+        self, dataset_name: str, columns: List[str]
+    ) -> pd.DataFrame:
+        pass
+
+    def get_correlations(
+        self, dataset_name: str, columns: List[str]
+    ) -> pd.DataFrame:
+        pass
+
+
+@runtime_checkable
+class IModelCacheRepository(Protocol):
+    # repositories that keep the fitted models of the tool-functions, valid
+    # as long as the version of their dataset does not change
+    model_cache: IModelCache
+
+    def get_version(self, dataset_name: str) -> Hashable | None:
+        pass
+
+
+@runtime_checkable
+class IStreamingRepository(Protocol):
+    # repositories that can stream a dataset in chunks, for the
+    # tool-functions on tables that do not fit in memory
+    def iter_data(
+        self, dataset_name: str, columns: List[str], chunk_rows: int
+    ) -> Iterator[pd.DataFrame]:
+        pass
+
+    def get_distinct(self, dataset_name: str, column: str) -> List[Any]:
         pass
 
 
 class ToolFactoryRepository:
-    def __init__(self, session: Session) -> None:
-        self.session = session
+    def __init__(
+        self,
+        Session: sessionmaker[Session],
+        cache: IDatasetCache,
+        model_cache: IModelCache,
+    ) -> None:
+        # one session per call: the tool-functions of a turn may run
+        # concurrently on the tool executor threads
+        self.Session = Session
+        self.cache = cache
+        self.model_cache = model_cache
+
+        # in-memory part of the COPY buffer, larger tables spill to disk
+        self.COPY_BUFFER_SIZE = 64 * 2**20
+        # aggregates per query (postgres allows 1664 result columns)
+        self.CORRELATION_PAIRS_PER_QUERY = 1000
+
+    def get_data(
+        self,
+        dataset_name: str,
+        columns: List[str] | None = None,
+        filters: List[DataFilter] | None = None,
+        limit: int | None = None,
+    ) -> pd.DataFrame:
+        # only the requested columns and rows are fetched from postgres
+        dataset_columns = self.get_columns(dataset_name)
+        columns = list(dataset_columns) if columns is None else columns
+        unknown_columns = [
+            column
+            for column in columns + [f.column for f in filters or []]
+            if column not in dataset_columns
+        ]
+        if unknown_columns:
+            raise ValueError(
+                f"Columns {unknown_columns} do not exist in the dataset {dataset_name}. Available columns: {list(dataset_columns)}"
+            )
+
+        # filtered/limited results are not cached
+        version = (
+            self.get_version(dataset_name)
+            if not filters and limit is None
+            else None
+        )
+        key = (dataset_name, tuple(columns))
+        if version is not None:
+            data = self.cache.get(key, version)
+            if data is not None:
+                return data
+
+        data = self._load_data(
+            dataset_name,
+            columns,
+            {column: dataset_columns[column] for column in columns},
+            filters or [],
+            limit,
+        )
+        if version is not None:
+            self.cache.put(key, version, data)
+
+        return data
+
+    def get_columns(self, dataset_name: str) -> Dict[str, str]:
+        query = """
+            SELECT attname, format_type(atttypid, NULL)
+            FROM pg_attribute
+            WHERE attrelid = to_regclass(:dataset_name) AND attnum > 0 AND NOT attisdropped
+            ORDER BY attnum
+        """
+        parameters = {"dataset_name": dataset_name}
+
+        with self.Session() as session:
+            rows = session.execute(text(query), parameters).fetchall()
+            session.commit()
+
+        return {
+            name: pgtype2dtype.get(pgtype, "object") for name, pgtype in rows
+        }
 
-    def get_data(self, dataset_name: str) -> pd.DataFrame:
-        query = f"SELECT * FROM {dataset_name}"
+    def get_statistics(
+        self, dataset_name: str, columns: List[str]
+    ) -> pd.DataFrame:
+        # describe() and the quartiles in one aggregate query: only one row
+        # leaves the database. percentile_cont interpolates linearly, as
+        # pandas' quantile does.
+        aggregates = []
+        for column in columns:
+            value = f"{quote_identifier(column)}::double precision"
+            aggregates += [
+                f"count({value})",
+                f"avg({value})",
+                f"stddev_samp({value})",
+                f"min({value})",
+                f"percentile_cont(ARRAY[0.25, 0.5, 0.75]) WITHIN GROUP (ORDER BY {value})",
+                f"max({value})",
+            ]
+        query = f"SELECT {', '.join(aggregates)} FROM {dataset_name}"
 
-        result = self.session.execute(text(query))
+        with self.Session() as session:
+            row = session.execute(text(query)).fetchone()
+            session.commit()
+
+        stats = []
+        for i in range(len(columns)):
+            count, mean, std, min_value, quartiles, max_value = row[
+                i * 6 : (i + 1) * 6
+            ]
+            stats.append(
+                [
+                    count,
+                    mean,
+                    std,
+                    min_value,
+                    *(quartiles or [None] * 3),
+                    max_value,
+                ]
+            )
+
+        return pd.DataFrame(
+            stats,
+            index=columns,
+            columns=["count", "mean", "std", "min", "25%", "50%", "75%", "max"],
+            dtype="float64",
+        )
+
+    def get_correlations(
+        self, dataset_name: str, columns: List[str]
+    ) -> pd.DataFrame:
+        # pearson correlation of every pair of columns with corr() aggregates,
+        # over the rows where both are not NULL (as pandas' corr). One scan
+        # of the table per batch of CORRELATION_PAIRS_PER_QUERY pairs.
+        pairs = list(itertools.combinations(range(len(columns)), 2))
+        matrix = np.eye(len(columns))
+        for start in range(0, len(pairs), self.CORRELATION_PAIRS_PER_QUERY):
+            batch = pairs[start : start + self.CORRELATION_PAIRS_PER_QUERY]
+            aggregates = [
+                f"corr({quote_identifier(columns[a])}::double precision, {quote_identifier(columns[b])}::double precision)"
+                for a, b in batch
+            ]
+            query = f"SELECT {', '.join(aggregates)} FROM {dataset_name}"
+
+            with self.Session() as session:
+                row = session.execute(text(query)).fetchone()
+                session.commit()
+
+            for (a, b), value in zip(batch, row):
+                matrix[a, b] = matrix[b, a] = np.nan if value is None else value
+
+        return pd.DataFrame(matrix, index=columns, columns=columns)
+
+    def count_rows(self, dataset_name: str) -> int:
+        query = f"SELECT count(*) FROM {dataset_name}"
+
+        with self.Session() as session:
+            row = session.execute(text(query)).fetchone()
+            session.commit()
+
+        return row[0]
+
+    def iter_data(
+        self, dataset_name: str, columns: List[str], chunk_rows: int
+    ) -> Iterator[pd.DataFrame]:
+        # server-side cursor: only one chunk of rows is in memory at a time.
+        # The chunks are neither cached nor shuffled (table order).
+        dataset_columns = self.get_columns(dataset_name)
+        unknown_columns = [
+            column for column in columns if column not in dataset_columns
+        ]
+        if unknown_columns:
+            raise ValueError(
+                f"Columns {unknown_columns} do not exist in the dataset {dataset_name}. Available columns: {list(dataset_columns)}"
+            )
+
+        query, parameters = self._build_select(
+            dataset_name, columns, [], None, paramstyle="named"
+        )
+        with self.Session() as session:
+            result = session.execute(
+                text(query),
+                parameters,
+                execution_options={"stream_results": True},
+            )
+            for rows in result.partitions(chunk_rows):
+                df = pd.DataFrame(rows, columns=columns)
+                for column in columns:
+                    if dataset_columns[column] in ("int64", "float64"):
+                        # numeric comes as Decimal, NULLs as None
+                        df[column] = pd.to_numeric(df[column])
+                yield df
+            session.commit()
+
+    def get_distinct(self, dataset_name: str, column: str) -> List[Any]:
+        query = f"SELECT DISTINCT {quote_identifier(column)} FROM {dataset_name} WHERE {quote_identifier(column)} IS NOT NULL ORDER BY 1"
+
+        with self.Session() as session:
+            rows = session.execute(text(query)).fetchall()
+            session.commit()
+
+        return [row[0] for row in rows]
+
+    def get_version(self, dataset_name: str) -> Hashable | None:
+        # cheap change detection. dataset_version is bumped by a statement
+        # trigger (see postgres/init.sql) and is exact; the statistics
+        # collector counters cover the tables without the trigger, but they
+        # are only flushed by the writing backends every few seconds.
+        # None (e.g. for a view) means that the dataset is not cached.
+        query = """
+            SELECT v.version, pg_relation_filenode(s.relid), s.n_tup_ins, s.n_tup_upd, s.n_tup_del
+            FROM pg_stat_user_tables s
+            LEFT JOIN dataset_version v ON v.dataset_name = s.relname
+            WHERE s.relid = to_regclass(:dataset_name)
+        """
+        parameters = {"dataset_name": dataset_name}
+
+        with self.Session() as session:
+            row = session.execute(text(query), parameters).fetchone()
+            session.commit()
+
+        return tuple(row) if row is not None else None
+
+    def _load_data(
+        self,
+        dataset_name: str,
+        columns: List[str],
+        dtypes: Dict[str, str],
+        filters: List[DataFilter],
+        limit: int | None,
+    ) -> pd.DataFrame:
+        with self.Session() as session:
+            return self._load_data_copy(
+                session, dataset_name, columns, dtypes, filters, limit
+            )
+
+    def _load_data_copy(
+        self,
+        session: Session,
+        dataset_name: str,
+        columns: List[str],
+        dtypes: Dict[str, str],
+        filters: List[DataFilter],
+        limit: int | None,
+    ) -> pd.DataFrame:
+        dbapi_connection = session.connection().connection.dbapi_connection
+        if not isinstance(dbapi_connection, psycopg2.extensions.connection):
+            return self._load_data_rows(
+                session, dataset_name, columns, filters, limit
+            )
+
+        # stream the selection as csv: the buffer stays in memory up to
+        # COPY_BUFFER_SIZE and spills to disk above, and the csv parser builds
+        # typed column arrays without per-row python objects
+        with tempfile.SpooledTemporaryFile(
+            max_size=self.COPY_BUFFER_SIZE, mode="w+b"
+        ) as buffer:
+            with dbapi_connection.cursor() as cursor:
+                query, parameters = self._build_select(
+                    dataset_name, columns, filters, limit, paramstyle="pyformat"
+                )
+                query = cursor.mogrify(query, parameters).decode()
+                cursor.copy_expert(
+                    f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)",
+                    buffer,
+                )
+            session.commit()
+
+            buffer.seek(0)
+            df = pd.read_csv(
+                buffer,
+                dtype={
+                    column: dtype
+                    for column, dtype in dtypes.items()
+                    if dtype in copy_parser_dtypes
+                },
+                true_values=["t"],
+                false_values=["f"],
+                keep_default_na=False,
+                na_values=[""],
+            )
+
+        for column, dtype in dtypes.items():
+            if dtype == "datetime64[ns]":
+                df[column] = pd.to_datetime(df[column], format="ISO8601")
+
+        return df if len(df) > 0 else pd.DataFrame()
+
+    def _load_data_rows(
+        self,
+        session: Session,
+        dataset_name: str,
+        columns: List[str],
+        filters: List[DataFilter],
+        limit: int | None,
+    ) -> pd.DataFrame:
+        query, parameters = self._build_select(
+            dataset_name, columns, filters, limit, paramstyle="named"
+        )
+
+        result = session.execute(text(query), parameters)
         rows = result.fetchall()
-        self.session.commit()
+        session.commit()
 
         if rows:
             columns = result.keys()
@@ -29,6 +408,43 @@ class ToolFactoryRepository:
         else:
             return pd.DataFrame()
 
+    def _build_select(
+        self,
+        dataset_name: str,
+        columns: List[str],
+        filters: List[DataFilter],
+        limit: int | None,
+        paramstyle: str,
+    ) -> Tuple[str, dict]:
+        def placeholder(name: str) -> str:
+            return f"%({name})s" if paramstyle == "pyformat" else f":{name}"
+
+        def identifier(column: str) -> str:
+            quoted = quote_identifier(column)
+            return (
+                quoted.replace("%", "%%")
+                if paramstyle == "pyformat"
+                else quoted
+            )
+
+        query = f"SELECT {', '.join(identifier(column) for column in columns)} FROM {dataset_name}"
+        parameters = {}
+
+        if filters:
+            conditions = []
+            for i, data_filter in enumerate(filters):
+                conditions.append(
+                    f"{identifier(data_filter.column)} {data_filter.operator} {placeholder(f'filter_{i}')}"
+                )
+                parameters[f"filter_{i}"] = data_filter.value
+            query += f" WHERE {' AND '.join(conditions)}"
+
+        if limit is not None:
+            query += f" LIMIT {placeholder('limit')}"
+            parameters["limit"] = limit
+
+        return query, parameters
+
 
 if TYPE_CHECKING:
     _: type[IToolFactoryRepository] = ToolFactoryRepository
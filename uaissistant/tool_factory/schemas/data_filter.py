@@ -0,0 +1,12 @@
+from typing import Literal
+
+from pydantic.dataclasses import dataclass
+
+
+@dataclass
+class DataFilter:
+    """Row filter pushed down to the dataset query: `column operator value`."""
+
+    column: str
+    operator: Literal["=", "!=", "<", "<=", ">", ">="]
+    value: str | int | float | bool
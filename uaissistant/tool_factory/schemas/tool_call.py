@@ -0,0 +1,20 @@
+from dataclasses import dataclass, field
+from typing import Any, List
+
+from uaissistant.assistant.models import AssistantMessageItem
+
+
+@dataclass
+class ToolCall:
+    """Tool-function call requested by the LLM."""
+
+    id: str | None
+    name: str
+    args: Any
+
+
+@dataclass
+class ToolResult:
+    call: ToolCall
+    output: str
+    frontend_contents: List[AssistantMessageItem] = field(default_factory=list)
@@ -2,12 +2,15 @@ import uuid
 from datetime import datetime
 from typing import TYPE_CHECKING, Any, List, Protocol, Tuple, runtime_checkable
 
-from uaissistant.assistant.models import AssistantMessageItem
-from uaissistant.assistant.schemas import Role
+from uaissistant.assistant.models import (
+    AssistantMessageItem,
+    AssistantMessageValue,
+)
+from uaissistant.assistant.schemas import AssistantMessageType, Role
+from uaissistant.figures.store import IFigureStore
+from uaissistant.tool_factory.registry import IToolRegistry
 from uaissistant.tool_factory.repository import IToolFactoryRepository
 
-from . import tools
-
 
 @runtime_checkable
 class IToolFactoryService(Protocol):
@@ -21,8 +24,15 @@ class IToolFactoryService(Protocol):
 
 
 class ToolFactoryService:
-    def __init__(self, tfr: IToolFactoryRepository) -> None:
+    def __init__(
+        self,
+        tfr: IToolFactoryRepository,
+        registry: IToolRegistry,
+        figure_store: IFigureStore,
+    ) -> None:
         self.tfr = tfr
+        self.registry = registry
+        self.figure_store = figure_store
 
     def call_tool_function(
         self, function_name: str, args: dict[str, Any]
@@ -30,10 +40,10 @@ class ToolFactoryService:
         output = ""
         frontend_values = []
         try:
-            function_object = getattr(tools, function_name)
-            function_object_initialized = function_object(**args)
-            # Check if the object is callable (a function/method)
-            if callable(function_object):
+            function_object = self.registry.get(function_name)
+            # Check if the object is a registered tool-function
+            if function_object is not None:
+                function_object_initialized = function_object(**args)
                 output, frontend_values = function_object_initialized(
                     tfr=self.tfr, args=args
                 )
@@ -49,13 +59,31 @@ class ToolFactoryService:
                 id=f"internal_{str(uuid.uuid4())}",
                 role=Role.Assistant,
                 created_at=datetime.now(),
-                value=value,
+                value=self._store_figure(value),
+                internal=True,
             )
             for value in frontend_values
         ]
 
         return output, frontend_contents
 
+    def _store_figure(
+        self, value: AssistantMessageValue
+    ) -> AssistantMessageValue:
+        # plots are kept out of the messages: only a reference to the figure
+        # is returned, saved to the DB and sent to the frontend, which gets
+        # the figure itself from `GET /figures/{figure_id}`
+        if (
+            value.type != AssistantMessageType.Plot
+            or "raw_json" not in value.content
+        ):
+            return value
+
+        content = {k: v for k, v in value.content.items() if k != "raw_json"}
+        content["figure_id"] = self.figure_store.put(value.content["raw_json"])
+
+        return AssistantMessageValue(type=value.type, content=content)
+
 
 if TYPE_CHECKING:
     _: type[IToolFactoryService] = ToolFactoryService
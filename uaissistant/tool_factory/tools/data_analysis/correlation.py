@@ -0,0 +1,284 @@
+from typing import Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import leaves_list, linkage
+from scipy.spatial.distance import squareform
+
+CORRELATION_METHODS = ["pearson", "spearman", "kendall"]
+# columns per block of the correlation matrix: one block is at most
+# BLOCK_COLUMNS x BLOCK_COLUMNS values, whatever the width of the table
+BLOCK_COLUMNS = 256
+# kendall is quadratic in the rows: it is computed on a sample of them
+MAX_KENDALL_ROWS = 2000
+
+
+def prepare_values(data: pd.DataFrame, method: str) -> np.ndarray:
+    # the values whose pearson correlation is the requested one: spearman is
+    # pearson of the ranks (of whole columns: exact for the pairs of columns
+    # without missing values, see `spearman_blocks`). Kendall is not a
+    # pearson correlation.
+    if method == "pearson":
+        return data.to_numpy(dtype="float64")
+    if method == "spearman":
+        return data.rank().to_numpy(dtype="float64")
+    raise ValueError(
+        f"Unknown correlation method '{method}'. Available methods: {CORRELATION_METHODS}"
+    )
+
+
+def sample_rows(
+    data: pd.DataFrame, method: str, random_state: int = 0
+) -> Tuple[pd.DataFrame, str]:
+    # kendall compares every pair of rows: it runs on a uniform sample of
+    # MAX_KENDALL_ROWS rows, the other methods on all of them
+    if method != "kendall" or len(data) <= MAX_KENDALL_ROWS:
+        return data, ""
+    return (
+        data.sample(n=MAX_KENDALL_ROWS, random_state=random_state),
+        f"computed on a random sample of {MAX_KENDALL_ROWS} out of {len(data)} rows",
+    )
+
+
+def iter_correlation_blocks(
+    values: np.ndarray,
+) -> Iterator[Tuple[slice, slice, np.ndarray]]:
+    """Pearson correlation of the columns of `values`, block by block.
+
+    Yields the blocks (rows, columns, correlations) of the upper triangle of
+    the matrix, diagonal blocks included, so that only one block is in
+    memory at a time. Rows with a missing value are left out pair by pair,
+    as `DataFrame.corr` does. Constant columns correlate as NaN.
+    """
+    mask = ~np.isnan(values)
+    # centered values (NaN -> 0): the sums below stay well conditioned
+    with np.errstate(invalid="ignore"):
+        centered = np.where(mask, values - np.nanmean(values, axis=0), 0.0)
+
+    if mask.all():
+        # without missing values: one product of standardized blocks
+        with np.errstate(invalid="ignore", divide="ignore"):
+            norms = np.sqrt((centered**2).sum(axis=0))
+            standardized = centered / np.where(norms > 0, norms, np.nan)
+        for i, j in _iter_block_indices(values.shape[1]):
+            block = standardized[:, i].T @ standardized[:, j]
+            yield i, j, np.clip(block, -1, 1)
+        return
+
+    weights = mask.astype("float64")
+    squares = centered**2
+    for i, j in _iter_block_indices(values.shape[1]):
+        # sums over the rows where both columns are present
+        n = weights[:, i].T @ weights[:, j]
+        sum_x = centered[:, i].T @ weights[:, j]
+        sum_y = weights[:, i].T @ centered[:, j]
+        sum_xy = centered[:, i].T @ centered[:, j]
+        sum_xx = squares[:, i].T @ weights[:, j]
+        sum_yy = weights[:, i].T @ squares[:, j]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            covariance = sum_xy - sum_x * sum_y / n
+            variance_x = sum_xx - sum_x**2 / n
+            variance_y = sum_yy - sum_y**2 / n
+            block = covariance / np.sqrt(variance_x * variance_y)
+        block[(n < 2) | (variance_x <= 0) | (variance_y <= 0)] = np.nan
+        yield i, j, np.clip(block, -1, 1)
+
+
+def _iter_block_indices(n_columns: int) -> Iterator[Tuple[slice, slice]]:
+    starts = range(0, n_columns, BLOCK_COLUMNS)
+    for a in starts:
+        for b in starts:
+            if b >= a:
+                yield (
+                    slice(a, min(a + BLOCK_COLUMNS, n_columns)),
+                    slice(b, min(b + BLOCK_COLUMNS, n_columns)),
+                )
+
+
+def correlation_matrix(data: pd.DataFrame, method: str) -> pd.DataFrame:
+    if method == "kendall":
+        return data.corr(method="kendall")
+
+    matrix = np.empty((len(data.columns), len(data.columns)))
+    for i, j, block in correlation_blocks(data, method):
+        matrix[i, j] = block
+        matrix[j, i] = block.T
+    # exactly 1 on the diagonal, NaN for the constant columns, as pandas
+    np.fill_diagonal(matrix, np.where(np.isnan(np.diag(matrix)), np.nan, 1.0))
+    return pd.DataFrame(matrix, index=data.columns, columns=data.columns)
+
+
+def correlation_blocks(
+    data: pd.DataFrame, method: str
+) -> Iterator[Tuple[slice, slice, np.ndarray]]:
+    if method == "kendall":
+        return matrix_blocks(correlation_matrix(data, method).to_numpy())
+    blocks = iter_correlation_blocks(prepare_values(data, method))
+    if method == "spearman" and data.isna().to_numpy().any():
+        return spearman_blocks(blocks, data.to_numpy(dtype="float64"))
+    return blocks
+
+
+def spearman_blocks(
+    blocks: Iterator[Tuple[slice, slice, np.ndarray]], values: np.ndarray
+) -> Iterator[Tuple[slice, slice, np.ndarray]]:
+    """Spearman blocks with every pair ranked on its complete rows.
+
+    `blocks` are the pearson correlations of the ranks of whole columns: a
+    column with missing values is ranked on more rows than the ones it
+    shares with the other column of a pair. The pairs with such a column
+    are recomputed, each ranked on the rows where both values are present,
+    as `DataFrame.corr` does.
+    """
+    mask = ~np.isnan(values)
+    incomplete = ~mask.all(axis=0)
+    for i, j, block in blocks:
+        for a in np.flatnonzero(incomplete[i]):
+            todo = np.ones(j.stop - j.start, dtype=bool)
+            if i == j:
+                # the pairs with the previous incomplete columns are done
+                todo[:a] = ~incomplete[j][:a]
+                block[a, ~todo] = block[~todo, a]
+            block[a, todo] = _spearman_with(
+                values, mask, i.start + a, j.start + np.flatnonzero(todo)
+            )
+        # the complete columns of `i` with the incomplete columns of `j`
+        complete_rows = np.flatnonzero(~incomplete[i])
+        for b in np.flatnonzero(incomplete[j]):
+            if i == j:
+                block[complete_rows, b] = block[b, complete_rows]
+            else:
+                block[complete_rows, b] = _spearman_with(
+                    values, mask, j.start + b, i.start + complete_rows
+                )
+        yield i, j, block
+
+
+def _spearman_with(
+    values: np.ndarray, mask: np.ndarray, a: int, columns: np.ndarray
+) -> np.ndarray:
+    # spearman of the column `a` with each of `columns`, on the rows where
+    # both are present: `a` is sorted once, the order is filtered per pair
+    rows = mask[:, a]
+    x = values[rows, a]
+    order = np.argsort(x, kind="stable")
+    correlations = np.empty(len(columns))
+    for k, c in enumerate(columns):
+        y = values[rows, c]
+        present = mask[rows, c]
+        x_order = order[present[order]]
+        y_order = np.flatnonzero(present)
+        y_order = y_order[np.argsort(y[y_order], kind="stable")]
+        x_ranks = np.empty(len(x))
+        x_ranks[x_order] = _sorted_ranks(x[x_order])
+        y_ranks = np.empty(len(y))
+        y_ranks[y_order] = _sorted_ranks(y[y_order])
+        correlations[k] = _pearson(x_ranks[present], y_ranks[present])
+    return correlations
+
+
+def _sorted_ranks(sorted_values: np.ndarray) -> np.ndarray:
+    # ranks of sorted values, ties get the average of their ranks
+    starts = np.flatnonzero(
+        np.r_[True, sorted_values[1:] != sorted_values[:-1]]
+    )
+    ends = np.r_[starts[1:], len(sorted_values)]
+    return np.repeat((starts + ends + 1) / 2, ends - starts)
+
+
+def _pearson(x: np.ndarray, y: np.ndarray) -> float:
+    if len(x) < 2:
+        return np.nan
+    x = x - x.mean()
+    y = y - y.mean()
+    denominator = np.sqrt((x @ x) * (y @ y))
+    if denominator <= 0:
+        return np.nan
+    return float(np.clip((x @ y) / denominator, -1, 1))
+
+
+def matrix_blocks(
+    matrix: np.ndarray,
+) -> Iterator[Tuple[slice, slice, np.ndarray]]:
+    # the blocks of an already computed matrix
+    for i, j in _iter_block_indices(matrix.shape[1]):
+        yield i, j, matrix[i, j]
+
+
+def strongest_pairs(
+    blocks: Iterator[Tuple[slice, slice, np.ndarray]],
+    columns: pd.Index,
+    k: int,
+) -> pd.DataFrame:
+    """The `k` pairs of distinct columns with the largest |correlation|.
+
+    Only the best `k` candidates are kept between the blocks, so the memory
+    does not grow with the square of the number of columns.
+    """
+    rows = np.empty(0, dtype="int64")
+    pair_columns = np.empty(0, dtype="int64")
+    correlations = np.empty(0)
+    for i, j, block in blocks:
+        block_rows, block_columns = np.nonzero(~np.isnan(block))
+        global_rows = block_rows + i.start
+        global_columns = block_columns + j.start
+        # upper triangle only: every pair once, no column with itself
+        upper = global_rows < global_columns
+        rows = np.concatenate([rows, global_rows[upper]])
+        pair_columns = np.concatenate([pair_columns, global_columns[upper]])
+        correlations = np.concatenate(
+            [correlations, block[block_rows[upper], block_columns[upper]]]
+        )
+        if len(correlations) > k:
+            best = np.argpartition(-np.abs(correlations), k - 1)[:k]
+            rows, pair_columns, correlations = (
+                rows[best],
+                pair_columns[best],
+                correlations[best],
+            )
+
+    order = np.argsort(-np.abs(correlations), kind="stable")
+    return pd.DataFrame(
+        {
+            "column_1": columns[rows[order]],
+            "column_2": columns[pair_columns[order]],
+            "correlation": correlations[order],
+        }
+    )
+
+
+def strongest_columns(
+    blocks: Iterator[Tuple[slice, slice, np.ndarray]],
+    columns: pd.Index,
+    n: int,
+) -> List[str]:
+    # the `n` columns with the largest |correlation| to any other column,
+    # in the order of the table
+    strength = np.zeros(len(columns))
+    for i, j, block in blocks:
+        block = np.abs(block)
+        if i == j:
+            np.fill_diagonal(block, np.nan)
+        strength[i] = np.maximum(strength[i], _nanmax(block, 1))
+        strength[j] = np.maximum(strength[j], _nanmax(block, 0))
+
+    chosen = np.sort(np.argsort(-strength, kind="stable")[:n])
+    return list(columns[chosen])
+
+
+def clustered_order(matrix: pd.DataFrame) -> List[str]:
+    # hierarchical clustering (average linkage) on 1 - |correlation|: the
+    # groups of correlated columns end up next to each other
+    if len(matrix.columns) < 3:
+        return list(matrix.columns)
+    distances = 1 - np.abs(np.nan_to_num(matrix.to_numpy(), nan=0.0))
+    np.fill_diagonal(distances, 0)
+    order = leaves_list(
+        linkage(squareform(distances, checks=False), method="average")
+    )
+    return list(matrix.columns[order])
+
+
+def _nanmax(block: np.ndarray, axis: int) -> np.ndarray:
+    # nanmax without the warning of the all-NaN slices (-> 0)
+    return np.max(np.nan_to_num(block, nan=0.0), axis=axis)
@@ -1,12 +1,19 @@
 from abc import abstractmethod
-from typing import List, Tuple, Any
+from typing import Dict, List, Tuple, Any
 
+import numpy as np
 import pandas as pd
+import plotly.graph_objects as go
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
 from pydantic import Field
 from uaissistant.assistant.models import AssistantMessageValue
 from uaissistant.tool_factory.repository import IToolFactoryRepository
 from uaissistant.tool_factory.schemas.tool_function import ToolFunction
 
+# scatter plots with more points are downsampled (see get_scatter_trace)
+MAX_SCATTER_POINTS = 10000
+DENSITY_BINS = 100
+
 
 class DataAnalyser(ToolFunction):
     """DataAnalyser Class"""
@@ -31,18 +38,21 @@ class DataAnalyser(ToolFunction):
     ) -> Tuple[str, List[AssistantMessageValue]]:
         pass
 
-    def get_validated_dataset(
+    def get_validated_columns(
         self, tfr: IToolFactoryRepository, dataset_name
-    ) -> Any:
-        # get data
-        data: pd.DataFrame = tfr.get_data(dataset_name)
+    ) -> List[str]:
+        # get the columns of the dataset and their types (no data transfer)
+        dataset_columns: Dict[str, str] = tfr.get_columns(dataset_name)
 
-        if len(data.columns) == 0:
+        if len(dataset_columns) == 0:
             raise Exception("The chosen dataset is empty!")
 
         # extract different types of columns
-        numerical_columns = data.select_dtypes(include=["number"])
-        # categorical_columns = data.select_dtypes(include=["category", "object"])
+        numerical_columns = [
+            column
+            for column, dtype in dataset_columns.items()
+            if is_numeric_dtype(dtype) and not is_bool_dtype(dtype)
+        ]
 
         # set target_columns
         self.target_columns = (
@@ -56,7 +66,26 @@ class DataAnalyser(ToolFunction):
             col for col in self.target_columns if col in numerical_columns
         ]
 
-        return data
+        return list(dataset_columns)
+
+    def get_validated_dataset(
+        self,
+        tfr: IToolFactoryRepository,
+        dataset_name,
+        columns: List[str] | None = None,
+    ) -> Tuple[pd.DataFrame, List[str]]:
+        column_names = self.get_validated_columns(tfr, dataset_name)
+
+        # get data: only the columns that the tool-function needs
+        data: pd.DataFrame = tfr.get_data(
+            dataset_name,
+            columns=self.target_columns if columns is None else columns,
+        )
+
+        if len(data.columns) == 0:
+            raise Exception("The chosen dataset is empty!")
+
+        return data, column_names
 
     def get_validated_target_columns(self, good_columns) -> Any:
         # good_columns examples
@@ -67,3 +96,44 @@ class DataAnalyser(ToolFunction):
             return good_columns
         else:
             return [col for col in self.target_columns if col in good_columns]
+
+    def get_scatter_trace(
+        self, x: Any, y: Any, mode: str, name: str, color: str
+    ) -> go.Scatter | go.Heatmap:
+        # one marker per point up to MAX_SCATTER_POINTS. Above it, `mode`
+        # caps the payload: "sample" keeps a uniform random sample of the
+        # points, "density" (default) aggregates them into a 2D histogram
+        x = np.asarray(x, dtype="float64")
+        y = np.asarray(y, dtype="float64")
+
+        if len(x) <= MAX_SCATTER_POINTS:
+            return go.Scatter(
+                x=x, y=y, mode="markers", name=name, marker=dict(color=color)
+            )
+
+        if mode == "sample":
+            idx = np.random.default_rng(0).choice(
+                len(x), size=MAX_SCATTER_POINTS, replace=False
+            )
+            idx.sort()
+            return go.Scatter(
+                x=x[idx],
+                y=y[idx],
+                mode="markers",
+                name=f"{name} (sample of {MAX_SCATTER_POINTS} out of {len(x)})",
+                marker=dict(color=color),
+            )
+
+        valid = ~(np.isnan(x) | np.isnan(y))
+        counts, x_edges, y_edges = np.histogram2d(
+            x[valid], y[valid], bins=DENSITY_BINS
+        )
+        return go.Heatmap(
+            x=(x_edges[:-1] + x_edges[1:]) / 2,
+            y=(y_edges[:-1] + y_edges[1:]) / 2,
+            # rows of a heatmap are y; empty cells are transparent
+            z=np.where(counts > 0, counts, np.nan).T,
+            colorscale=self.colorscale,
+            colorbar=dict(title="Points"),
+            name=f"{name} (density of {int(valid.sum())} points)",
+        )
@@ -1,6 +1,5 @@
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 
-import pandas as pd
 from pydantic import Field
 
 from uaissistant.assistant.models import AssistantMessageValue
@@ -39,13 +38,15 @@ class get_dataset_columns(ToolFunction):
     ) -> Tuple[str, List[AssistantMessageValue]]:
         print(f"[{self.__class__.__name__}] args={args}")
 
-        # get data
-        data: pd.DataFrame = tfr.get_data(self.dataset_name)
+        # get columns and the number of rows (no data transfer)
+        columns: Dict[str, str] = tfr.get_columns(self.dataset_name)
 
-        if len(data.columns) == 0:
+        if len(columns) == 0:
             raise Exception("The chosen dataset is empty!")
 
-        output = f"The dataset {self.dataset_name} contains the following columns: {data.columns} (with the following types: {data.dtypes}). There are {len(data)} rows in total."
+        rows = tfr.count_rows(self.dataset_name)
+
+        output = f"The dataset {self.dataset_name} contains the following columns: {list(columns)} (with the following types: {columns}). There are {rows} rows in total."
         frontend_values = []
 
         print(f"[{self.__class__.__name__}] DONE")
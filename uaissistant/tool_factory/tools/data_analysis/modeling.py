@@ -1,11 +1,15 @@
-from typing import List, Tuple
+from contextlib import closing
+from dataclasses import dataclass
+import os
+import time
+from typing import Any, Dict, List, Tuple
 import uuid
 from pydantic import Field
 
 import pandas as pd
 import numpy as np
 
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
+from sklearn.preprocessing import StandardScaler, OneHotEncoder, OrdinalEncoder
 from sklearn.impute import SimpleImputer
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
@@ -17,19 +21,73 @@ from sklearn.metrics import (
     r2_score,
     confusion_matrix,
 )
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.ensemble import (
+    HistGradientBoostingClassifier,
+    HistGradientBoostingRegressor,
+    RandomForestClassifier,
+    RandomForestRegressor,
+)
+from sklearn.inspection import permutation_importance
+from sklearn.linear_model import SGDClassifier, SGDRegressor
 
 import plotly.graph_objects as go
 import plotly.figure_factory as ff
 
 from uaissistant.assistant.models import AssistantMessageValue
 from uaissistant.assistant.schemas import AssistantMessageType
-from uaissistant.tool_factory.repository import IToolFactoryRepository
+from uaissistant.tool_factory.repository import (
+    IModelCacheRepository,
+    IStreamingRepository,
+    IToolFactoryRepository,
+)
 
 from uaissistant.tool_factory.tools.data_analysis.data_analyser import (
+    MAX_SCATTER_POINTS,
     DataAnalyser,
 )
 
+# engine="auto" fits a random forest up to MAX_FOREST_ROWS rows, a gradient
+# boosting on the whole dataset while it fits in MAX_IN_MEMORY_CELLS loaded
+# values, and a linear model on the dataset streamed in chunks above
+MAX_FOREST_ROWS = 200_000
+MAX_IN_MEMORY_CELLS = 50_000_000
+STREAM_CHUNK_ROWS = 50_000
+# rows of the streamed test set, and of the test rows permuted for the
+# importances of the gradient boosting
+MAX_STREAM_TEST_ROWS = 200_000
+MAX_PERMUTATION_ROWS = 10_000
+# the ensembles grow by steps between which the time budget is checked
+FOREST_TREES = 100
+BOOSTING_ITERATIONS = 200
+BOOSTING_ITERATIONS_PER_STEP = 20
+# categories above are grouped as infrequent (the boosting bins are 255)
+MAX_BOOSTING_CATEGORIES = 254
+# cores used by one call for the trees and the permutation importances: the
+# tool executor shares the cores of the machine between its workers, and
+# sets this share in every worker (`set_jobs`)
+N_JOBS = os.cpu_count() or 1
+
+ENGINES = ["auto", "forest", "boosting", "incremental"]
+IMPORTANCE_MODES = ["impurity", "permutation"]
+
+
+@dataclass
+class FittedModel:
+    # everything the outputs need: the figures are drawn from it, so the
+    # calls that only change their colors reuse it instead of refitting
+    classification: bool
+    model: Any
+    # e.g. "random forest of 100 trees", for the text output
+    description: str
+    train_rows: int
+    total_rows: int
+    stopped_early: bool
+    y_test: pd.Series
+    y_pred: Any
+    # importance of each source feature, and how it was computed
+    importances: pd.Series
+    importance_mode: str
+
 
 class modeling(DataAnalyser):
     """Call this function to preform modeling for the given dataset"""
@@ -47,6 +105,26 @@ class modeling(DataAnalyser):
         description="The size of the test dataset for the modeling. The size of the training dataset is (1-test_size)",
     )
 
+    random_state: int = Field(
+        default=0,
+        description="Seed of the train/test split and of the model. The same seed gives the same model.",
+    )
+
+    engine: str = Field(
+        default="auto",
+        description=f"The modeling engine: 'forest' (random forest, on a stratified sample of {MAX_FOREST_ROWS} training rows for larger datasets), 'boosting' (histogram-based gradient boosting, for large datasets), 'incremental' (linear model trained on the dataset streamed in chunks, for datasets that do not fit in memory) or 'auto' (chosen by the size of the dataset).",
+    )
+
+    importance_mode: str = Field(
+        default="impurity",
+        description="How the feature importances are computed: 'impurity' (from the fitted model, fast) or 'permutation' (drop of the test score when the values of a feature are shuffled, slower but unbiased towards high-cardinality features). The gradient boosting always uses 'permutation', and the incremental linear model uses the magnitude of its coefficients on the standardised features ('coefficients') instead of 'impurity'.",
+    )
+
+    time_budget: float = Field(
+        default=60,
+        description="Maximum time in seconds for training the model. When it is exceeded, the training stops with the trees, iterations or rows done so far.",
+    )
+
     predicted_vs_actual_plot_predicted_color: str = Field(
         default="blue",
         description="Color for `predicted vs actual plot` for predicted points. Examples: 'black', 'green', 'rgb(228,26,28)', 'rgb(55,126,184)', 'rgb(77,175,74)'.",
@@ -57,6 +135,11 @@ class modeling(DataAnalyser):
         description="Color for `predicted vs actual plot` for ideal case line. Examples: 'black', 'green', 'rgb(228,26,28)', 'rgb(55,126,184)', 'rgb(77,175,74)'.",
     )
 
+    large_data_mode: str = Field(
+        default="density",
+        description=f"How to plot more than {MAX_SCATTER_POINTS} points in the `predicted vs actual plot`: 'density' (2D histogram heatmap of all points) or 'sample' (uniform random sample of the points).",
+    )
+
     importances_bars_color: str = Field(
         default="blue",
         description="Color for importances coeficients bars. Examples: 'black', 'green', 'rgb(228,26,28)', 'rgb(55,126,184)', 'rgb(77,175,74)'.",
@@ -67,24 +150,15 @@ class modeling(DataAnalyser):
     ) -> Tuple[str, List[AssistantMessageValue]]:
         print(f"[{self.__class__.__name__}] args={args}")
 
-        # get data
-        data: pd.DataFrame = self.get_validated_dataset(tfr, self.dataset_name)
-
         ####################
         ##### Modeling #####
         ####################
 
-        text_outputs = []
-        fig_outputs = []
-        if self.target in data.select_dtypes(include=["object"]):
-            text_outputs, fig_outputs = self._categorical_modeling(data)
-        if self.target in data.select_dtypes(include=["number"]):
-            text_outputs, fig_outputs = self._numerical_modeling(data)
-
-        if len(text_outputs) == 0 and len(fig_outputs) == 0:
-            raise Exception(
-                f"Target '{self.target}' is not a column with type a number or object. The modelling is not supported for this column"
-            )
+        fitted = self._get_fitted_model(tfr)
+        if fitted.classification:
+            text_outputs, fig_outputs = self._categorical_outputs(fitted)
+        else:
+            text_outputs, fig_outputs = self._numerical_outputs(fitted)
 
         #########################################
 
@@ -129,48 +203,477 @@ class modeling(DataAnalyser):
 
         return output, frontend_values
 
-    def _categorical_modeling(self, data):
+    def _get_fitted_model(self, tfr: IToolFactoryRepository) -> FittedModel:
+        # the fit only depends on the data and on the arguments of the key:
+        # it is reused until the dataset changes
+        key = (
+            self.dataset_name,
+            tuple(self.features),
+            self.target,
+            self.test_size,
+            self.random_state,
+            self.engine,
+            self.importance_mode,
+            self.time_budget,
+        )
+        version = (
+            tfr.get_version(self.dataset_name)
+            if isinstance(tfr, IModelCacheRepository)
+            else None
+        )
+        if version is not None:
+            fitted = tfr.model_cache.get(key, version)
+            if fitted is not None:
+                print(f"[{self.__class__.__name__}] fitted model reused")
+                return fitted
+
+        deadline = time.monotonic() + self.time_budget
+
+        # the strategy is chosen from the column types and the row count,
+        # before any data is loaded
+        dataset_columns = self.get_validated_modeling_columns(tfr)
+        if dataset_columns[self.target] == "object":
+            classification = True
+        elif dataset_columns[self.target] in ("int64", "float64"):
+            classification = False
+        else:
+            raise Exception(
+                f"Target '{self.target}' is not a column with type a number or object. The modelling is not supported for this column"
+            )
+        total_rows = tfr.count_rows(self.dataset_name)
+        engine = self._choose_engine(tfr, total_rows)
+        print(f"[{self.__class__.__name__}] engine={engine} rows={total_rows}")
+
+        if engine == "incremental":
+            fitted = self._fit_incremental(
+                tfr, dataset_columns, classification, total_rows, deadline
+            )
+        else:
+            # get data
+            data, _ = self.get_validated_dataset(
+                tfr,
+                self.dataset_name,
+                columns=list(dict.fromkeys(self.features + [self.target])),
+            )
+            if engine == "forest":
+                fitted = self._fit_forest(data, classification, deadline)
+            else:
+                fitted = self._fit_boosting(data, classification, deadline)
+
+        # the version read before loading the data: a change in between
+        # invalidates the entry on the next call
+        if version is not None:
+            tfr.model_cache.put(key, version, fitted)
+        return fitted
+
+    def get_validated_modeling_columns(
+        self, tfr: IToolFactoryRepository
+    ) -> Dict[str, str]:
+        dataset_columns = tfr.get_columns(self.dataset_name)
+        if len(dataset_columns) == 0:
+            raise Exception("The chosen dataset is empty!")
+
+        unknown_columns = [
+            column
+            for column in self.features + [self.target]
+            if column not in dataset_columns
+        ]
+        if unknown_columns:
+            raise ValueError(
+                f"Columns {unknown_columns} do not exist in the dataset {self.dataset_name}. Available columns: {list(dataset_columns)}"
+            )
+
+        if self.engine not in ENGINES:
+            raise ValueError(
+                f"Unknown engine '{self.engine}'. Available engines: {ENGINES}"
+            )
+        if self.importance_mode not in IMPORTANCE_MODES:
+            raise ValueError(
+                f"Unknown importance mode '{self.importance_mode}'. Available modes: {IMPORTANCE_MODES}"
+            )
+
+        return dataset_columns
+
+    def _choose_engine(self, tfr: IToolFactoryRepository, rows: int) -> str:
+        if self.engine != "auto":
+            if self.engine == "incremental" and not isinstance(
+                tfr, IStreamingRepository
+            ):
+                raise Exception(
+                    "The incremental engine is not supported for this dataset"
+                )
+            return self.engine
+
+        if rows <= MAX_FOREST_ROWS:
+            return "forest"
+        if rows * (len(self.features) + 1) <= MAX_IN_MEMORY_CELLS:
+            return "boosting"
+        if isinstance(tfr, IStreamingRepository):
+            return "incremental"
+        # the repository can only load the whole dataset
+        return "boosting"
+
+    def _split(self, data: pd.DataFrame, classification: bool):
+        # rows without target can not be learned from
+        data = data[data[self.target].notna()]
         X = data[self.features]
         y = data[self.target]
 
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=self.test_size
+        return train_test_split(
+            X,
+            y,
+            test_size=self.test_size,
+            random_state=self.random_state,
+            stratify=self._stratify(y, classification),
         )
 
+    def _stratify(self, y: pd.Series, classification: bool):
+        # stratification needs at least two rows of every class
+        if classification and y.value_counts().min() >= 2:
+            return y
+        return None
+
+    def _fit_forest(
+        self, data: pd.DataFrame, classification: bool, deadline: float
+    ) -> FittedModel:
+        X_train, X_test, y_train, y_test = self._split(data, classification)
+
+        # the forest is fitted on a stratified sample of the large datasets;
+        # the sampling error shows in the confidence interval of the metrics
+        sampled = len(X_train) > MAX_FOREST_ROWS
+        if sampled:
+            X_train, _, y_train, _ = train_test_split(
+                X_train,
+                y_train,
+                train_size=MAX_FOREST_ROWS,
+                random_state=self.random_state,
+                stratify=self._stratify(y_train, classification),
+            )
+
         numeric_features = X_train.select_dtypes(include=["number"]).columns
         categorical_features = X_train.select_dtypes(include=["object"]).columns
 
         preprocessor = self._get_preprocessor(
             numeric_features, categorical_features
         )
+        X_train_encoded = preprocessor.fit_transform(X_train)
+
+        estimator = (
+            RandomForestClassifier(
+                random_state=self.random_state, n_jobs=N_JOBS
+            )
+            if classification
+            else RandomForestRegressor(
+                random_state=self.random_state, n_jobs=N_JOBS
+            )
+        )
+        # one tree per core and step
+        stopped_early = self._fit_with_budget(
+            estimator,
+            "n_estimators",
+            FOREST_TREES,
+            N_JOBS,
+            X_train_encoded,
+            y_train,
+            deadline,
+        )
 
         model = Pipeline(
             steps=[
                 ("preprocessor", preprocessor),
-                ("classifier", RandomForestClassifier()),
+                ("estimator", estimator),
             ]
         )
+        y_pred = model.predict(X_test)
+
+        description = f"random forest of {estimator.n_estimators} trees"
+        if sampled:
+            description += (
+                f", on a stratified sample of {MAX_FOREST_ROWS} training rows"
+            )
+
+        return FittedModel(
+            classification=classification,
+            model=model,
+            description=description,
+            train_rows=len(X_train),
+            total_rows=len(data),
+            stopped_early=stopped_early,
+            y_test=y_test,
+            y_pred=y_pred,
+            **self._get_importances(
+                model,
+                estimator.feature_importances_,
+                "impurity",
+                X_test,
+                y_test,
+            ),
+        )
+
+    def _fit_boosting(
+        self, data: pd.DataFrame, classification: bool, deadline: float
+    ) -> FittedModel:
+        X_train, X_test, y_train, y_test = self._split(data, classification)
 
-        model.fit(X_train, y_train)
+        numeric_features = X_train.select_dtypes(include=["number"]).columns
+        categorical_features = X_train.select_dtypes(include=["object"]).columns
+
+        # the trees bin the values: no scaling, and the missing values and the
+        # categories are handled natively
+        preprocessor = ColumnTransformer(
+            [
+                ("num", "passthrough", numeric_features),
+                (
+                    "cat",
+                    OrdinalEncoder(
+                        handle_unknown="use_encoded_value",
+                        unknown_value=np.nan,
+                        max_categories=MAX_BOOSTING_CATEGORIES,
+                    ),
+                    categorical_features,
+                ),
+            ]
+        )
+        X_train_encoded = preprocessor.fit_transform(X_train)
+        categorical_mask = [False] * len(numeric_features) + [True] * len(
+            categorical_features
+        )
+
+        parameters = dict(
+            random_state=self.random_state,
+            categorical_features=(
+                categorical_mask if len(categorical_features) else None
+            ),
+        )
+        estimator = (
+            HistGradientBoostingClassifier(**parameters)
+            if classification
+            else HistGradientBoostingRegressor(**parameters)
+        )
+        stopped_early = self._fit_with_budget(
+            estimator,
+            "max_iter",
+            BOOSTING_ITERATIONS,
+            BOOSTING_ITERATIONS_PER_STEP,
+            X_train_encoded,
+            y_train,
+            deadline,
+        )
+
+        model = Pipeline(
+            steps=[
+                ("preprocessor", preprocessor),
+                ("estimator", estimator),
+            ]
+        )
         y_pred = model.predict(X_test)
 
-        accuracy_score_result = f"Accuracy: {accuracy_score(y_test, y_pred)}"
+        return FittedModel(
+            classification=classification,
+            model=model,
+            description=f"histogram-based gradient boosting of {estimator.n_iter_} iterations",
+            train_rows=len(X_train),
+            total_rows=len(data),
+            stopped_early=stopped_early,
+            y_test=y_test,
+            y_pred=y_pred,
+            # the boosting has no impurity importances
+            importances=self._get_permutation_importances(
+                model, X_test, y_test
+            ),
+            importance_mode="permutation",
+        )
+
+    def _fit_with_budget(
+        self,
+        estimator,
+        parameter: str,
+        total: int,
+        step: int,
+        X,
+        y,
+        deadline: float,
+    ) -> bool:
+        # grows the ensemble `step` trees/iterations at a time (warm start)
+        # up to `total`, and stops after the step that exceeds the deadline.
+        # True if it stopped before `total`.
+        estimator.set_params(warm_start=True)
+        size = 0
+        while size < total:
+            size = min(size + step, total)
+            estimator.set_params(**{parameter: size})
+            estimator.fit(X, y)
+            if getattr(estimator, "n_iter_", size) < size:
+                # early stopping of the boosting
+                return False
+            if size < total and time.monotonic() > deadline:
+                print(
+                    f"[{self.__class__.__name__}] time budget exceeded at {parameter}={size}"
+                )
+                return True
+        return False
+
+    def _fit_incremental(
+        self,
+        tfr: IStreamingRepository,
+        dataset_columns: Dict[str, str],
+        classification: bool,
+        total_rows: int,
+        deadline: float,
+    ) -> FittedModel:
+        # a linear model fitted chunk by chunk (partial_fit): only one chunk
+        # and the test rows are in memory. The categories come from the
+        # database, the imputation and the scaling from the first chunk.
+        numeric_features = pd.Index(
+            [
+                feature
+                for feature in self.features
+                if dataset_columns[feature] in ("int64", "float64")
+            ]
+        )
+        categories = {
+            feature: tfr.get_distinct(self.dataset_name, feature)
+            for feature in self.features
+            if dataset_columns[feature] == "object"
+        }
+        # a categorical feature without any value has nothing to encode: it
+        # is left out of the model, with an importance of 0
+        categorical_features = pd.Index(
+            [feature for feature, values in categories.items() if values]
+        )
+        preprocessor = self._get_preprocessor(
+            numeric_features,
+            categorical_features,
+            categories=[
+                categories[feature] for feature in categorical_features
+            ],
+        )
+
+        if classification:
+            classes = np.array(tfr.get_distinct(self.dataset_name, self.target))
+            estimator = SGDClassifier(
+                loss="log_loss", random_state=self.random_state
+            )
+        else:
+            estimator = SGDRegressor(random_state=self.random_state)
+        y_scaler = StandardScaler()
+
+        rng = np.random.default_rng(self.random_state)
+        test_chunks = []
+        test_rows = 0
+        train_rows = 0
+        stopped_early = False
+        with closing(
+            tfr.iter_data(
+                self.dataset_name,
+                list(dict.fromkeys(self.features + [self.target])),
+                STREAM_CHUNK_ROWS,
+            )
+        ) as chunks:
+            for chunk in chunks:
+                # the chunks come in table order: the rows are only shuffled
+                # within a chunk
+                chunk = chunk[chunk[self.target].notna()]
+                chunk = chunk.iloc[rng.permutation(len(chunk))]
+                is_test = rng.random(len(chunk)) < self.test_size
+
+                test_chunk = chunk[is_test].iloc[
+                    : MAX_STREAM_TEST_ROWS - test_rows
+                ]
+                test_chunks.append(test_chunk)
+                test_rows += len(test_chunk)
+
+                train_chunk = chunk[~is_test]
+                if len(train_chunk) == 0:
+                    continue
+                X = train_chunk[self.features]
+                y = train_chunk[self.target]
+                if train_rows == 0:
+                    preprocessor.fit(X)
+                    if not classification:
+                        y_scaler.fit(y.to_frame())
+                X_encoded = preprocessor.transform(X)
+                if classification:
+                    estimator.partial_fit(X_encoded, y, classes=classes)
+                else:
+                    # the gradient steps need a target of unit scale
+                    estimator.partial_fit(
+                        X_encoded, y_scaler.transform(y.to_frame()).ravel()
+                    )
+                train_rows += len(train_chunk)
+
+                if time.monotonic() > deadline:
+                    print(
+                        f"[{self.__class__.__name__}] time budget exceeded at {train_rows} training rows"
+                    )
+                    stopped_early = True
+                    break
+
+        if train_rows == 0 or test_rows == 0:
+            raise Exception("The chosen dataset is empty!")
+
+        test = pd.concat(test_chunks)
+        y_test = test[self.target]
+        y_pred = estimator.predict(preprocessor.transform(test[self.features]))
+        if not classification:
+            y_pred = y_scaler.inverse_transform(y_pred.reshape(-1, 1)).ravel()
+            # the model predicts the scaled target: it is scored against it
+            y_scored = pd.Series(
+                y_scaler.transform(y_test.to_frame()).ravel(),
+                index=y_test.index,
+            )
+        else:
+            y_scored = y_test
+
+        # the features are standardised: the magnitude of the coefficients
+        # ranks them
+        coefficients = np.abs(estimator.coef_)
+        if coefficients.ndim > 1:
+            coefficients = coefficients.mean(axis=0)
+        importances = coefficients / max(coefficients.sum(), 1e-12)
+
+        model = Pipeline(
+            steps=[
+                ("preprocessor", preprocessor),
+                ("estimator", estimator),
+            ]
+        )
+
+        return FittedModel(
+            classification=classification,
+            model=model,
+            description=f"linear model (SGD) trained incrementally on chunks of {STREAM_CHUNK_ROWS} rows",
+            train_rows=train_rows,
+            total_rows=total_rows,
+            stopped_early=stopped_early,
+            y_test=y_test,
+            y_pred=y_pred,
+            **self._get_importances(
+                model,
+                importances,
+                "coefficients",
+                test[self.features],
+                y_scored,
+            ),
+        )
+
+    def _categorical_outputs(self, fitted: FittedModel):
+        y_test, y_pred = fitted.y_test, fitted.y_pred
+
+        accuracy_score_result = f"Accuracy: {accuracy_score(y_test, y_pred)} {self._confidence_interval(np.asarray(y_test) == y_pred)}"
         classification_report_result = f"Classification Report:\n\n{classificationreport2dataframe(classification_report(y_test, y_pred, output_dict=True)).to_markdown()}"
 
         confusion_matrix_fig = self._get_confusion_matrix_plot(y_test, y_pred)
 
-        # Get importance values
-        importances = model.named_steps["classifier"].feature_importances_
-        model_preprocessor = model.named_steps["preprocessor"]
-
         importances_fig = self._get_importance_plot(
-            importances,
-            model_preprocessor,
-            numeric_features,
-            categorical_features,
+            fitted.importances, fitted.importance_mode
         )
 
-        text_outputs = [accuracy_score_result, classification_report_result]
+        text_outputs = [
+            self._model_summary(fitted),
+            accuracy_score_result,
+            classification_report_result,
+        ]
         fig_outputs = [confusion_matrix_fig, importances_fig]
 
         return text_outputs, fig_outputs
@@ -199,66 +702,71 @@ class modeling(DataAnalyser):
 
         return fig
 
-    def _numerical_modeling(self, data):
-        X = data[self.features]
-        y = data[self.target]
-
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=self.test_size
-        )
-
-        numeric_features = X_train.select_dtypes(include=["number"]).columns
-        categorical_features = X_train.select_dtypes(include=["object"]).columns
-
-        preprocessor = self._get_preprocessor(
-            numeric_features, categorical_features
-        )
-
-        model = Pipeline(
-            steps=[
-                ("preprocessor", preprocessor),
-                ("regressor", RandomForestRegressor()),
-            ]
-        )
-
-        model.fit(X_train, y_train)
-        y_pred = model.predict(X_test)
+    def _numerical_outputs(self, fitted: FittedModel):
+        y_test, y_pred = fitted.y_test, fitted.y_pred
 
-        mean_squared_error_result = (
-            f"Mean Squared Error: {mean_squared_error(y_test, y_pred)}"
-        )
+        mean_squared_error_result = f"Mean Squared Error: {mean_squared_error(y_test, y_pred)} {self._confidence_interval((np.asarray(y_test) - y_pred) ** 2)}"
         r2_score_result = f"R^2 Score: {r2_score(y_test, y_pred)}"
 
         predict_vs_actual_fig = self._get_predicted_vs_actual_plot(
             y_test, y_pred
         )
-        # Get importance values
-        importances = model.named_steps["regressor"].feature_importances_
-        model_preprocessor = model.named_steps["preprocessor"]
-
         importances_fig = self._get_importance_plot(
-            importances,
-            model_preprocessor,
-            numeric_features,
-            categorical_features,
+            fitted.importances, fitted.importance_mode
         )
 
-        text_outputs = [mean_squared_error_result, r2_score_result]
+        text_outputs = [
+            self._model_summary(fitted),
+            mean_squared_error_result,
+            r2_score_result,
+        ]
         fig_outputs = [predict_vs_actual_fig, importances_fig]
         return text_outputs, fig_outputs
 
-    def _get_preprocessor(self, numeric_features, categorical_features):
+    def _model_summary(self, fitted: FittedModel) -> str:
+        summary = f"Model: {fitted.description}. Trained on {fitted.train_rows} rows and tested on {len(fitted.y_test)} rows, out of {fitted.total_rows} rows."
+        if fitted.stopped_early:
+            summary += f" The training was stopped at the time budget of {self.time_budget} seconds."
+        return summary
+
+    def _confidence_interval(self, values) -> str:
+        # 95% interval of a mean over the test rows (normal approximation):
+        # the uncertainty of the metric due to the size of the test set
+        values = np.asarray(values, dtype="float64")
+        if len(values) < 2:
+            return ""
+        half_width = 1.96 * values.std(ddof=1) / np.sqrt(len(values))
+        return f"(95% confidence interval: {values.mean() - half_width} to {values.mean() + half_width})"
+
+    def _get_preprocessor(
+        self, numeric_features, categorical_features, categories="auto"
+    ):
+        # the features without any value are kept (as zeros), so the encoded
+        # columns still map to the source features
         numerical_pipeline = Pipeline(
             [
-                ("imputer", SimpleImputer(strategy="mean")),
+                (
+                    "imputer",
+                    SimpleImputer(strategy="mean", keep_empty_features=True),
+                ),
                 ("scaler", StandardScaler()),
             ]
         )
 
         categorical_pipeline = Pipeline(
             [
-                ("imputer", SimpleImputer(strategy="most_frequent")),
-                ("onehot", OneHotEncoder(handle_unknown="ignore")),
+                (
+                    "imputer",
+                    SimpleImputer(
+                        strategy="most_frequent", keep_empty_features=True
+                    ),
+                ),
+                (
+                    "onehot",
+                    OneHotEncoder(
+                        handle_unknown="ignore", categories=categories
+                    ),
+                ),
             ]
         )
 
@@ -275,14 +783,12 @@ class modeling(DataAnalyser):
         # Plot predicted vs actual
         fig = go.Figure()
         fig.add_trace(
-            go.Scatter(
+            self.get_scatter_trace(
                 x=y_test,
                 y=y_pred,
-                mode="markers",
+                mode=self.large_data_mode,
                 name="Predicted vs Actual",
-                marker=dict(
-                    color=self.predicted_vs_actual_plot_predicted_color
-                ),
+                color=self.predicted_vs_actual_plot_predicted_color,
             )
         )
         fig.add_trace(
@@ -305,74 +811,117 @@ class modeling(DataAnalyser):
 
         return fig
 
-    def _get_importance_plot(
+    def _get_importances(
         self,
-        importances,
-        model_preprocessor,
-        numeric_features,
-        categorical_features,
-    ):
-        # Get numerical feature names
-        numeric_feature_names = numeric_features.tolist()
-
-        # Get categorical feature names after one-hot encoding
-        try:
-            categorical_feature_names = (
-                model_preprocessor.transformers_[1][1]
-                .named_steps["onehot"]
-                .get_feature_names_out(categorical_features)
-            )
-        except Exception:
-            categorical_feature_names = []
-
-        # Combine the numerical and categorical feature importances
-        combined_importances = []
-        combined_feature_names = []
-
-        # Add numerical feature importances
-        combined_importances.extend(importances[: len(numeric_feature_names)])
-        combined_feature_names.extend(numeric_feature_names)
-
-        # Add combined importances for categorical features
-        start_index = len(numeric_feature_names)
-        for i, category in enumerate(categorical_features):
-            category_importance = np.sum(
-                importances[
-                    start_index : start_index
-                    + len(categorical_feature_names[i])
-                ]
+        model: Pipeline,
+        encoded_importances,
+        encoded_mode: str,
+        X_test: pd.DataFrame,
+        y_test: pd.Series,
+    ) -> Dict[str, Any]:
+        # the importances and importance_mode of a FittedModel: the ones of
+        # the model (`encoded_mode`: "impurity" for the forest, "coefficients"
+        # for the linear model) unless the permutation ones are requested
+        if self.importance_mode == "permutation":
+            return dict(
+                importances=self._get_permutation_importances(
+                    model, X_test, y_test
+                ),
+                importance_mode="permutation",
             )
-            combined_importances.append(category_importance)
-            combined_feature_names.append(category)
+        return dict(
+            importances=self._get_source_importances(
+                encoded_importances,
+                model.named_steps["preprocessor"],
+                X_test.columns,
+            ),
+            importance_mode=encoded_mode,
+        )
 
-        # Zip feature names and importances, and sort them based on importances
-        sorted_features_importances = sorted(
-            zip(combined_feature_names, combined_importances),
-            key=lambda x: x[1],
-            reverse=True,
+    def _get_permutation_importances(
+        self, model: Pipeline, X_test: pd.DataFrame, y_test: pd.Series
+    ) -> pd.Series:
+        # drop of the test score when the values of each source feature are
+        # shuffled, on a sample of the test rows. The features are permuted
+        # in parallel.
+        rows = min(len(X_test), MAX_PERMUTATION_ROWS)
+        permutation = permutation_importance(
+            model,
+            X_test.iloc[:rows],
+            y_test.iloc[:rows],
+            n_repeats=5,
+            random_state=self.random_state,
+            n_jobs=N_JOBS,
         )
+        return pd.Series(permutation.importances_mean, index=X_test.columns)
+
+    def _get_source_importances(
+        self,
+        importances,
+        preprocessor: ColumnTransformer,
+        features: pd.Index,
+    ) -> pd.Series:
+        # sums the importances of the encoded columns per source feature:
+        # every encoded column gets the position of its source feature, and
+        # one bincount adds them up. A one-hot encoded feature has one column
+        # per category, the other ones a single column.
+        positions = pd.Series(np.arange(len(features)), index=features)
+        sources = np.empty(len(importances), dtype="int64")
+        for name, transformer, columns in preprocessor.transformers_:
+            output = preprocessor.output_indices_[name]
+            if output.stop == output.start:
+                # dropped or empty selection
+                continue
+            columns_positions = positions[list(columns)].to_numpy()
+            onehot = (
+                transformer.named_steps.get("onehot")
+                if isinstance(transformer, Pipeline)
+                else None
+            )
+            if onehot is None:
+                sources[output] = columns_positions
+            else:
+                sources[output] = np.repeat(
+                    columns_positions,
+                    [len(categories) for categories in onehot.categories_],
+                )
 
-        # Unzip the sorted feature names and importances
-        sorted_feature_names, sorted_importances = zip(
-            *sorted_features_importances
+        return pd.Series(
+            np.bincount(
+                sources,
+                weights=np.asarray(importances, dtype="float64"),
+                minlength=len(features),
+            ),
+            index=features,
         )
+
+    def _get_importance_plot(
+        self, importances: pd.Series, importance_mode: str
+    ):
+        importances = importances.sort_values(ascending=False)
+
         # Create a bar plot for feature importances
         fig = go.Figure()
         fig.add_trace(
             go.Bar(
-                x=sorted_feature_names,
-                y=sorted_importances,
+                x=importances.index.tolist(),
+                y=importances.tolist(),
                 marker=dict(color=self.importances_bars_color),
             )
         )
         fig.update_layout(
-            title="Feature Importances",
+            title=f"Feature Importances ({importance_mode})",
             xaxis_title="Features",
             yaxis_title="Importance",
         )
         return fig
 
 
+def set_jobs(jobs: int) -> None:
+    global N_JOBS
+    N_JOBS = jobs
+
+
 def classificationreport2dataframe(report):
     df_classification_report = pd.DataFrame(report).transpose()
     df_classification_report = df_classification_report.sort_values(
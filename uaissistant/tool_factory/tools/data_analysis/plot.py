@@ -9,14 +9,38 @@ import plotly.graph_objects as go
 from pydantic import Field
 from uaissistant.assistant.models import AssistantMessageValue
 from uaissistant.assistant.schemas import AssistantMessageType
-from uaissistant.tool_factory.repository import IToolFactoryRepository
+from uaissistant.tool_factory.repository import (
+    IToolFactoryRepository,
+    ISqlAggregateRepository,
+)
 
+from uaissistant.tool_factory.tools.data_analysis.correlation import (
+    CORRELATION_METHODS,
+    clustered_order,
+    correlation_blocks,
+    correlation_matrix,
+    matrix_blocks,
+    sample_rows,
+    strongest_columns,
+    strongest_pairs,
+)
 from uaissistant.tool_factory.tools.data_analysis.data_analyser import (
+    MAX_SCATTER_POINTS,
     DataAnalyser,
 )
 
 import plotly.express as px
 
+# upper bound of the number of bins per histogram
+MAX_BINS = 200
+# wider correlation heatmaps show the sub-matrix of the most correlated
+# columns; at most MAX_TOP_K pairs are listed
+MAX_HEATMAP_COLUMNS = 50
+MAX_TOP_K = 100
+# pearson correlations are computed by postgres up to this number of pairs
+# (one corr() aggregate per pair), above the data is loaded
+MAX_SQL_CORRELATION_PAIRS = 500
+
 
 class histogram(DataAnalyser):
     """Call this function to give to the user a histogram plot of the data available"""
@@ -26,14 +50,18 @@ class histogram(DataAnalyser):
         description="List of colors to use. Example: ['rgb(228,26,28)', 'rgb(55,126,184)', 'rgb(77,175,74)']. Applied in same order as target_columns List.",
     )
 
+    bins: int = Field(
+        default=0,
+        description=f"Number of bins of each histogram (at most {MAX_BINS}). By default (0), it is chosen automatically from the data.",
+    )
+
     def run(
         self, tfr: IToolFactoryRepository, **args
     ) -> Tuple[str, List[AssistantMessageValue]]:
         print(f"[{self.__class__.__name__}] args={args}")
 
         # get data
-        data: pd.DataFrame = self.get_validated_dataset(tfr, self.dataset_name)
-        column_names = data.columns
+        data, column_names = self.get_validated_dataset(tfr, self.dataset_name)
 
         # set target_columns
         self.target_columns = self.get_validated_target_columns(
@@ -71,9 +99,16 @@ class histogram(DataAnalyser):
                 if specs[i][j] is None:
                     break
                 idx = i * 2 + j
+                # pre-binned bars: the figure size depends on the number of
+                # bins only, not on the number of rows
+                counts, edges = self._get_bins(data.iloc[:, idx])
                 fig.add_trace(
-                    go.Histogram(
-                        x=data.iloc[:, idx],
+                    go.Bar(
+                        x=(edges[:-1] + edges[1:]) / 2,
+                        y=counts,
+                        width=np.diff(edges),
+                        customdata=np.column_stack((edges[:-1], edges[1:])),
+                        hovertemplate="[%{customdata[0]:.4g}, %{customdata[1]:.4g}): %{y}",
                         name=data.columns[idx],
                         marker_color=self.colors[idx],
                     ),
@@ -81,7 +116,7 @@ class histogram(DataAnalyser):
                     col=j + 1,
                 )
         # Update layout
-        fig.update_layout(title=self.dataset_name)
+        fig.update_layout(title=self.dataset_name, bargap=0)
         ########################################
 
         ########################################
@@ -108,51 +143,153 @@ class histogram(DataAnalyser):
 
         return output, frontend_values
 
+    def _get_bins(self, column: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        values = column.to_numpy(dtype="float64")
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return np.array([]), np.array([0.0])
+
+        # the number of bins is capped before the edges are built: with an
+        # outlier, the width of the automatic rule gives millions of bins
+        bins = self.bins if self.bins > 0 else self._auto_bins(values)
+        counts, edges = np.histogram(values, bins=min(bins, MAX_BINS))
+        return counts, edges
+
+    @staticmethod
+    def _auto_bins(values: np.ndarray) -> int:
+        # numpy's "auto" rule: the smaller of the Sturges and
+        # Freedman-Diaconis widths (Sturges when the IQR is 0)
+        value_range = np.ptp(values)
+        if value_range == 0:
+            return 1
+        width = value_range / (np.log2(len(values)) + 1)
+        q25, q75 = np.percentile(values, [25, 75])
+        if q75 > q25:
+            width = min(width, 2 * (q75 - q25) * len(values) ** (-1 / 3))
+        return int(np.ceil(value_range / width))
+
 
 class correlation_heatmap(DataAnalyser):
     """Call this function to give to the user a correlation heatmap plot of the data available"""
 
+    method: str = Field(
+        default="pearson",
+        description=f"Correlation method: one of {CORRELATION_METHODS}.",
+    )
+
+    top_k: int = Field(
+        default=0,
+        description=f"If set (at most {MAX_TOP_K}), only the top_k most strongly correlated pairs of columns are returned, as a table and a bar plot, instead of the heatmap. Use it for datasets with many columns.",
+    )
+
+    cluster: bool = Field(
+        default=False,
+        description=f"Order the columns of the heatmap by hierarchical clustering, so that the groups of correlated columns are next to each other. Always done when the heatmap has more than {MAX_HEATMAP_COLUMNS} columns, of which only the {MAX_HEATMAP_COLUMNS} most correlated ones are shown.",
+    )
+
     def run(
         self, tfr: IToolFactoryRepository, **args
     ) -> Tuple[str, List[AssistantMessageValue]]:
         print(f"[{self.__class__.__name__}] args={args}")
 
-        # get data
-        data: pd.DataFrame = self.get_validated_dataset(tfr, self.dataset_name)
-        column_names = data.columns
+        if self.method not in CORRELATION_METHODS:
+            raise ValueError(
+                f"Unknown correlation method '{self.method}'. Available methods: {CORRELATION_METHODS}"
+            )
+        if not 0 <= self.top_k <= MAX_TOP_K:
+            raise ValueError(f"top_k must be between 0 and {MAX_TOP_K}")
+
+        #######################################
+        ##### from data to correlations #######
+        #######################################
+        # notes on how the correlations were computed, for the user
+        notes = []
+        column_names = self.get_validated_columns(tfr, self.dataset_name)
+        n_pairs = len(self.target_columns) * (len(self.target_columns) - 1) // 2
+        if (
+            self.method == "pearson"
+            and isinstance(tfr, ISqlAggregateRepository)
+            and n_pairs <= MAX_SQL_CORRELATION_PAIRS
+        ):
+            # correlate in the database: the data is not loaded
+            data_corr = tfr.get_correlations(
+                self.dataset_name, self.target_columns
+            )
+            columns = data_corr.columns
 
-        # set target_columns
-        self.target_columns = self.get_validated_target_columns(
-            good_columns=data.select_dtypes(include=["number"])
-        )
+            def get_blocks():
+                return matrix_blocks(data_corr.to_numpy())
 
-        # get the data only for target columns
-        data = data[self.target_columns]
+            def get_matrix(selected: List[str]) -> pd.DataFrame:
+                return data_corr.loc[selected, selected]
+
+        else:
+            # get data
+            data, column_names = self.get_validated_dataset(
+                tfr, self.dataset_name
+            )
+
+            # set target_columns
+            self.target_columns = self.get_validated_target_columns(
+                good_columns=data.select_dtypes(include=["number"])
+            )
+
+            # get the data only for target columns
+            data = data[self.target_columns]
+
+            data, note = sample_rows(data, self.method)
+            if note:
+                notes.append(note)
+            if (
+                self.method == "kendall"
+                and len(data.columns) > MAX_HEATMAP_COLUMNS
+            ):
+                # kendall is computed pair by pair: the columns are chosen
+                # with the (blocked) spearman correlation first
+                selected = strongest_columns(
+                    correlation_blocks(data, "spearman"),
+                    data.columns,
+                    MAX_HEATMAP_COLUMNS,
+                )
+                notes.append(
+                    f"limited to the {MAX_HEATMAP_COLUMNS} out of {len(data.columns)} columns with the strongest spearman correlations"
+                )
+                data = data[selected]
+            columns = data.columns
+
+            def get_blocks():
+                return correlation_blocks(data, self.method)
+
+            def get_matrix(selected: List[str]) -> pd.DataFrame:
+                return correlation_matrix(data[selected], self.method)
+
+        if len(columns) < 2:
+            raise Exception(
+                "At least 2 numerical columns are required for the correlations!"
+            )
 
         #############################
         ##### from data to plot #####
         #############################
-        data_corr: pd.DataFrame = data.corr()
-        fig = go.Figure()
-        fig.add_trace(
-            go.Heatmap(
-                x=data_corr.columns,
-                y=data_corr.index,
-                z=np.array(data_corr),
-                colorscale=self.colorscale,  # Choose a color scale
-                colorbar=dict(
-                    title="Correlation"
-                ),  # Add a color bar with a title
-                zmax=1,
-                zmin=-1,
-            )
-        )
-        fig.update_layout(
-            title=f"Correlation Heatmap for {self.dataset_name}",
-            height=600,  # Adjust the height of the figure
-            width=600,  # Adjust the width of the figure
-            yaxis=dict(autorange="reversed"),
-        )
+        if self.top_k > 0:
+            pairs = strongest_pairs(get_blocks(), columns, self.top_k)
+            fig = self._get_pairs_plot(pairs)
+            text = f"The {len(pairs)} most correlated pairs of columns ({self.method}):\n\n{pairs.to_markdown(index=False)}"
+        else:
+            selected = list(columns)
+            if len(columns) > MAX_HEATMAP_COLUMNS:
+                selected = strongest_columns(
+                    get_blocks(), columns, MAX_HEATMAP_COLUMNS
+                )
+                notes.append(
+                    f"showing the {MAX_HEATMAP_COLUMNS} out of {len(columns)} columns with the strongest correlations, clustered"
+                )
+            data_corr = get_matrix(selected)
+            if self.cluster or len(columns) > MAX_HEATMAP_COLUMNS:
+                order = clustered_order(data_corr)
+                data_corr = data_corr.loc[order, order]
+            fig = self._get_heatmap_plot(data_corr)
+            text = None
         ########################################
 
         ########################################
@@ -174,11 +311,69 @@ class correlation_heatmap(DataAnalyser):
                 },
             )
         ]
+        if text is not None or notes:
+            message = "\n\n".join(
+                ([text] if text is not None else [])
+                + [f"Correlations {note}." for note in notes]
+            )
+            output += f" {message}"
+            frontend_values.append(
+                AssistantMessageValue(
+                    type=AssistantMessageType.Text,
+                    content={"message": message},
+                )
+            )
 
         print(f"[{self.__class__.__name__}] DONE")
 
         return output, frontend_values
 
+    def _get_heatmap_plot(self, data_corr: pd.DataFrame) -> go.Figure:
+        fig = go.Figure()
+        fig.add_trace(
+            go.Heatmap(
+                x=data_corr.columns,
+                y=data_corr.index,
+                z=np.array(data_corr),
+                colorscale=self.colorscale,  # Choose a color scale
+                colorbar=dict(
+                    title="Correlation"
+                ),  # Add a color bar with a title
+                zmax=1,
+                zmin=-1,
+            )
+        )
+        fig.update_layout(
+            title=f"Correlation Heatmap for {self.dataset_name}",
+            height=600,  # Adjust the height of the figure
+            width=600,  # Adjust the width of the figure
+            yaxis=dict(autorange="reversed"),
+        )
+        return fig
+
+    def _get_pairs_plot(self, pairs: pd.DataFrame) -> go.Figure:
+        fig = go.Figure()
+        fig.add_trace(
+            go.Bar(
+                x=pairs["column_1"] + " ~ " + pairs["column_2"],
+                y=pairs["correlation"],
+                marker=dict(
+                    color=pairs["correlation"],
+                    colorscale=self.colorscale,
+                    cmin=-1,
+                    cmax=1,
+                    colorbar=dict(title="Correlation"),
+                ),
+            )
+        )
+        fig.update_layout(
+            title=f"Most Correlated Pairs for {self.dataset_name}",
+            xaxis_title="Pair",
+            yaxis_title="Correlation",
+            yaxis=dict(range=[-1, 1]),
+        )
+        return fig
+
 
 class correlation_scatter_plot(DataAnalyser):
     """Call this function to give to the user a correlation scatter plot plot of the data available. Set exactly 2 target_columns."""
@@ -196,14 +391,18 @@ class correlation_scatter_plot(DataAnalyser):
         description="List of colors to use. Example: ['rgb(228,26,28)', 'rgb(55,126,184)', 'rgb(77,175,74)']. Applied in same order as target_columns List.",
     )
 
+    large_data_mode: str = Field(
+        default="density",
+        description=f"How to plot more than {MAX_SCATTER_POINTS} points: 'density' (2D histogram heatmap of all points) or 'sample' (uniform random sample of the points). The trendline always uses all points.",
+    )
+
     def run(
         self, tfr: IToolFactoryRepository, **args
     ) -> Tuple[str, List[AssistantMessageValue]]:
         print(f"[{self.__class__.__name__}] args={args}")
 
         # get data
-        data: pd.DataFrame = self.get_validated_dataset(tfr, self.dataset_name)
-        column_names = data.columns
+        data, column_names = self.get_validated_dataset(tfr, self.dataset_name)
 
         # set target_columns
         self.target_columns = self.get_validated_target_columns(
@@ -221,23 +420,24 @@ class correlation_scatter_plot(DataAnalyser):
         #############################
         ##### from data to plot #####
         #############################
+        data = data.dropna()
         fig = go.Figure()
         fig.add_trace(
-            go.Scatter(
+            self.get_scatter_trace(
                 x=data.iloc[:, 0],
                 y=data.iloc[:, 1],
-                mode="markers",
-                marker=dict(
-                    color=self.colors[0],  # Use another column for color
-                ),
+                mode=self.large_data_mode,
+                name="Data",
+                color=self.colors[0],
             )
         )
-        # Add trendline
+        # Add trendline: fitted on all the points, drawn between the extremes
+        trendline_x = np.array([data.iloc[:, 0].min(), data.iloc[:, 0].max()])
         fig.add_trace(
             go.Scatter(
-                x=data.iloc[:, 0],
+                x=trendline_x,
                 y=np.poly1d(np.polyfit(data.iloc[:, 0], data.iloc[:, 1], 1))(
-                    data.iloc[:, 0]
+                    trendline_x
                 ),
                 mode="lines",
                 line=dict(
@@ -1,10 +1,11 @@
 from typing import List, Tuple
 
-import pandas as pd
-
 from uaissistant.assistant.models import AssistantMessageValue
 from uaissistant.assistant.schemas import AssistantMessageType
-from uaissistant.tool_factory.repository import IToolFactoryRepository
+from uaissistant.tool_factory.repository import (
+    IToolFactoryRepository,
+    ISqlAggregateRepository,
+)
 
 from uaissistant.tool_factory.tools.data_analysis.data_analyser import (
     DataAnalyser,
@@ -19,25 +20,38 @@ class statistics(DataAnalyser):
     ) -> Tuple[str, List[AssistantMessageValue]]:
         print(f"[{self.__class__.__name__}] args={args}")
 
-        # get data
-        data: pd.DataFrame = self.get_validated_dataset(tfr, self.dataset_name)
-        column_names = data.columns
-
-        # set target_columns
-        self.target_columns = self.get_validated_target_columns(
-            good_columns=data.select_dtypes(include=["number"])
-        )
-
-        # get the data only for target columns
-        data = data[self.target_columns]
-
         ##############################
         ##### from data to stats #####
         ##############################
-        stats = data.describe().T  # .T to transpose for similar structure
-        stats["25%-quantile"] = data.quantile(0.25)
-        stats["median"] = data.quantile(0.5)  # Same as '50%'
-        stats["75%-quantile"] = data.quantile(0.75)
+        if isinstance(tfr, ISqlAggregateRepository):
+            # aggregate in the database: the data is not loaded
+            column_names = self.get_validated_columns(tfr, self.dataset_name)
+
+            if len(self.target_columns) == 0:
+                raise Exception(
+                    "There are no numerical columns to compute the statistics for!"
+                )
+
+            stats = tfr.get_statistics(self.dataset_name, self.target_columns)
+        else:
+            # get data
+            data, column_names = self.get_validated_dataset(
+                tfr, self.dataset_name
+            )
+
+            # set target_columns
+            self.target_columns = self.get_validated_target_columns(
+                good_columns=data.select_dtypes(include=["number"])
+            )
+
+            # get the data only for target columns
+            data = data[self.target_columns]
+
+            stats = data.describe().T  # .T to transpose for similar structure
+
+        stats["25%-quantile"] = stats["25%"]
+        stats["median"] = stats["50%"]
+        stats["75%-quantile"] = stats["75%"]
         #########################################
 
         #########################################
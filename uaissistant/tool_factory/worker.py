@@ -0,0 +1,130 @@
+import os
+import signal
+import threading
+import time
+from dataclasses import fields, replace
+from pathlib import Path
+from typing import Any, List, Tuple
+
+from pydantic.dataclasses import dataclass
+from sqlalchemy.orm import sessionmaker
+
+from uaissistant.assistant.models import AssistantMessageItem
+from uaissistant.connections.dbx import DbConfig, create_db_engine
+from uaissistant.figures.store import FileFigureStore
+from uaissistant.tool_factory.cache import DatasetCache, DatasetCacheStats
+from uaissistant.tool_factory.model_cache import ModelCache, ModelCacheStats
+from uaissistant.tool_factory.registry import ToolRegistry
+from uaissistant.tool_factory.repository import ToolFactoryRepository
+from uaissistant.tool_factory.service import ToolFactoryService
+from uaissistant.tool_factory.tools.data_analysis.modeling import set_jobs
+
+# tool-function service of the worker process, set by `init_worker`
+_service: ToolFactoryService | None = None
+_cache: DatasetCache | None = None
+_model_cache: ModelCache | None = None
+
+
+@dataclass
+class WorkerCacheStats:
+    dataset_cache: DatasetCacheStats
+    model_cache: ModelCacheStats
+
+
+def total_cache_stats(
+    stats: List[WorkerCacheStats],
+    workers: int,
+    cache_max_bytes: int,
+    model_cache_max_bytes: int,
+    model_cache_max_age: float,
+) -> WorkerCacheStats:
+    # counters and sizes summed over the workers; the budgets are the ones
+    # of all the workers, including those without a call yet
+    def total(cls, caches, **limits):
+        return cls(
+            **{
+                field.name: sum(getattr(cache, field.name) for cache in caches)
+                for field in fields(cls)
+                if field.name not in limits
+            },
+            **limits,
+        )
+
+    return WorkerCacheStats(
+        dataset_cache=total(
+            DatasetCacheStats,
+            [s.dataset_cache for s in stats],
+            max_bytes=cache_max_bytes * workers,
+        ),
+        model_cache=total(
+            ModelCacheStats,
+            [s.model_cache for s in stats],
+            max_bytes=model_cache_max_bytes * workers,
+            max_age=model_cache_max_age,
+        ),
+    )
+
+
+def init_worker(
+    db_config: DbConfig,
+    cache_max_bytes: int,
+    model_cache_max_bytes: int,
+    model_cache_max_age: float,
+    figure_store_root: Path,
+    jobs: int,
+) -> None:
+    # runs once in every worker process: the worker builds its own engine,
+    # caches and figure store, so the datasets are loaded from postgres by
+    # the worker and never sent through the pool
+    global _service, _cache, _model_cache
+
+    # forked workers inherit the signal handlers of the server, which would
+    # swallow SIGTERM; SIGINT (ctrl+c on the process group) is left to the
+    # server, which shuts the pool down
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # an idle worker does not notice the death of a killed server, and would
+    # keep its inherited listening socket open
+    threading.Thread(
+        target=_exit_with_parent, args=(os.getppid(),), daemon=True
+    ).start()
+
+    # the worker's share of the cores, for the CPU-bound tool-functions
+    set_jobs(jobs)
+
+    # the worker runs one call at a time
+    engine = create_db_engine(replace(db_config, pool_size=1, max_overflow=0))
+    _cache = DatasetCache(max_bytes=cache_max_bytes)
+    _model_cache = ModelCache(
+        max_bytes=model_cache_max_bytes, max_age=model_cache_max_age
+    )
+    _service = ToolFactoryService(
+        tfr=ToolFactoryRepository(
+            Session=sessionmaker(
+                autocommit=False, autoflush=False, bind=engine
+            ),
+            cache=_cache,
+            model_cache=_model_cache,
+        ),
+        registry=ToolRegistry(),
+        figure_store=FileFigureStore(root=figure_store_root),
+    )
+
+
+def _exit_with_parent(parent_pid: int) -> None:
+    while os.getppid() == parent_pid:
+        time.sleep(1)
+    os._exit(1)
+
+
+def call_tool_function(
+    function_name: str, args: dict[str, Any]
+) -> Tuple[str, List[AssistantMessageItem], int, WorkerCacheStats]:
+    # the cache counters of the worker are returned with the result
+    output, frontend_contents = _service.call_tool_function(
+        function_name=function_name, args=args
+    )
+    stats = WorkerCacheStats(
+        dataset_cache=_cache.stats(), model_cache=_model_cache.stats()
+    )
+    return output, frontend_contents, os.getpid(), stats